@@ -1,346 +1,246 @@
+import os
 import streamlit as st
 from datetime import datetime
-import pandas as pd
-import os
-import urllib.parse
-
-# Database of electrical services with pricing and descriptions
-services_db = {
-    'powerpoint_install': {
-        'name': 'Power Point Install',
-        'price': 165.00,
-        'description': 'Installation of a single standard power point (GPO) including all necessary wiring and testing.'
-    },
-    'ceiling_fan_fitoff': {
-        'name': 'Ceiling Fan Fit-off',
-        'price': 245.00,
-        'description': 'Supply and installation of a standard ceiling fan with light fitting including wiring and connection.'
-    },
-    'switchboard_upgrade': {
-        'name': 'Switchboard Upgrade',
-        'price': 2850.00,
-        'description': 'Complete switchboard replacement with new RCDs, circuit breakers and safety switches to current AS/NZS 3000 standards.'
-    },
-    'downlight_install': {
-        'name': 'Downlight Install',
-        'price': 95.00,
-        'description': 'Installation of a single LED downlight including cutout, wiring and IC-rated housing.'
-    },
-    'smoke_alarm_install': {
-        'name': 'Smoke Alarm Install',
-        'price': 185.00,
-        'description': 'Supply and installation of hardwired photoelectric smoke alarm with battery backup compliant with current regulations.'
-    },
-    'safety_switch_install': {
-        'name': 'Safety Switch Install',
-        'price': 320.00,
-        'description': 'Installation of RCD safety switch to existing switchboard providing protection against electric shock.'
-    },
-    'oven_cooktop_connection': {
-        'name': 'Oven/Cooktop Connection',
-        'price': 275.00,
-        'description': 'Electrical connection and isolation switch installation for electric oven or cooktop appliance.'
-    },
-    'light_fitting_replacement': {
-        'name': 'Light Fitting Replacement',
-        'price': 135.00,
-        'description': 'Removal of old light fitting and installation of new fitting including connection and testing.'
-    },
-    'data_point_install': {
-        'name': 'Data Point Install',
-        'price': 155.00,
-        'description': 'Installation of Category 6 data point including cable run up to 20 metres and wall plate.'
-    },
-    'hot_water_system_connection': {
-        'name': 'Hot Water System Connection',
-        'price': 385.00,
-        'description': 'Electrical connection of electric hot water system including isolation switch and compliance certification.'
-    }
+from quote_core import (
+    render_quote_letter, render_email_text, render_saved_letter, price_quote, quote_fields,
+    create_mailto_link, create_gmail_link, get_quote, get_quote_store, init_database, save_quote, update_quote_status,
+    update_quote_statuses
+)
+from quote_address import address_problem
+from quote_catalog import get_catalog, get_catalog_version
+from quote_customers import get_customer_registry
+from quote_export import EXPORT_FORMATS, export_file_name, export_quotes
+from quote_mailer import delivery_status, mail_enabled, queue_quote_emails
+from quote_metrics import APP_STAGE_METRIC, Timer, start_metrics_file, summary_rows
+from quote_pdf import get_pdf_renderer, render_quotes, zip_pdfs
+from quote_pricing import MAX_QUANTITY, gst_included, parse_items
+from quote_rollups import TREND_PERIODS, trend_frame
+from quote_templates import preload_templates
+
+# Quote history paging: only one page of quotes is rendered per rerun
+PAGE_SIZE_OPTIONS = [10, 25, 50, 100]
+DEFAULT_PAGE_SIZE = 25
+
+# Quote history sort orders: label -> (store sort field, descending)
+HISTORY_SORT_OPTIONS = {
+    'Newest first': ('created', True),
+    'Oldest first': ('created', False),
+    'Customer name (A-Z)': ('Customer_Name', False),
+    'Price (high to low)': ('Price', True),
+    'Price (low to high)': ('Price', False),
+    'Status': ('Status', False),
 }
 
-# CSV Database file path
-CSV_FILE = 'quotes_database.csv'
-
-# Function to validate Australian address
-def validate_australian_address(address):
-    """
-    Validates if the address appears to be an Australian address.
-    Checks for Australian state abbreviations and postcodes.
-    """
-    if not address:
-        return False
-    
-    # Convert address to uppercase for checking
-    address_upper = address.upper()
-    
-    # Australian state and territory abbreviations
-    aus_states = ['NSW', 'VIC', 'QLD', 'SA', 'WA', 'TAS', 'NT', 'ACT']
-    
-    # Check if any Australian state is mentioned
-    has_state = any(state in address_upper for state in aus_states)
-    
-    # Check if address contains a 4-digit postcode (Australian postcodes are 4 digits)
-    import re
-    has_postcode = bool(re.search(r'\b\d{4}\b', address))
-    
-    # Address should have at least a state or postcode to be considered Australian
-    if has_state or has_postcode:
-        return True
-    else:
-        return False
-
-# Function to initialize CSV database
-def init_database():
-    """
-    Creates the CSV file if it doesn't exist.
-    This ensures the app won't crash when trying to read quotes on first run.
-    """
-    if not os.path.exists(CSV_FILE):
-        # Create a new CSV with column headers
-        df = pd.DataFrame(columns=['Date', 'Time', 'Customer_Name', 'Customer_Email', 'Customer_Address', 'Service', 'Price', 'Status'])
-        df.to_csv(CSV_FILE, index=False)
-        
-# Function to save quote to CSV
-def save_quote(customer_name, customer_email, customer_address, service_name, price):
-    """
-    Appends a new quote record to the CSV database.
-    Each quote gets a timestamp and default status of 'Sent'.
-    """
-    # Get current date and time
-    now = datetime.now()
-    date_str = now.strftime("%d/%m/%Y")
-    time_str = now.strftime("%H:%M:%S")
-    
-    # Create new quote record
-    new_quote = {
-        'Date': date_str,
-        'Time': time_str,
-        'Customer_Name': customer_name,
-        'Customer_Email': customer_email if customer_email else '',
-        'Customer_Address': customer_address,
-        'Service': service_name,
-        'Price': price,
-        'Status': 'Sent'
-    }
-    
-    # Read existing data
-    df = pd.read_csv(CSV_FILE)
-    
-    # Append new quote using pd.concat
-    df = pd.concat([df, pd.DataFrame([new_quote])], ignore_index=True)
-    
-    # Save back to CSV
-    df.to_csv(CSV_FILE, index=False)
-
-# Function to load all quotes from CSV
-def load_quotes():
-    """
-    Reads all quotes from the CSV database.
-    Returns a pandas DataFrame for easy display and filtering.
-    """
-    if os.path.exists(CSV_FILE):
-        return pd.read_csv(CSV_FILE)
-    else:
-        return pd.DataFrame(columns=['Date', 'Time', 'Customer_Name', 'Customer_Email', 'Customer_Address', 'Service', 'Price', 'Status'])
-
-# Function to update quote status in CSV
-def update_quote_status(row_index, new_status):
-    """
-    Updates the status of a specific quote in the CSV database.
-    Uses the row index to identify which quote to update.
-    """
-    # Read existing data
-    df = pd.read_csv(CSV_FILE)
-    
-    # Update the status for the specified row
-    df.at[row_index, 'Status'] = new_status
-    
-    # Save back to CSV
-    df.to_csv(CSV_FILE, index=False)
-
-# Function to create mailto link (for desktop email apps)
-def create_mailto_link(customer_email, customer_name, service_name, price, description, today_date):
-    """
-    Creates a mailto URL that opens the user's default email client.
-    Pre-fills the recipient, subject, and body with quote details.
-    """
-    
-    # Email subject line
-    subject = f"Electrical Services Quotation - {service_name}"
-    
-    # Email body with Australian formatting
-    body = f"""G'day {customer_name},
-
-Thank you for your enquiry with Gold Coast Electrical Pros.
+# Quote statuses, in the order they are offered
+STATUS_OPTIONS = ['Sent', 'Approved', 'Won', 'Lost']
 
-We are pleased to provide you with the following quotation for electrical services at your property.
+# Most quotes bundled into one PDF download from the history tab
+MAX_BULK_PDFS = 2000
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Base URL of a running quote_api.py (e.g. http://localhost:8765); when set the
+# history offers exports streamed straight from the API as well
+QUOTE_API_URL = os.environ.get('QUOTE_API_URL', '').rstrip('/')
 
-QUOTATION DETAILS
+# Most quotes emailed at once from the history tab (only when QUOTE_SMTP_HOST is set)
+MAX_BULK_EMAILS = 1000
 
-Date: {today_date}
+# How each email delivery status is shown in the history
+DELIVERY_LABELS = {'queued': '⏳ queued', 'sending': '📤 sending', 'sent': '✅ sent', 'failed': '❌ failed'}
 
-Service Requested: {service_name}
+# Timing panel in the sidebar: add ?debug=1 to the URL or set QUOTE_DEBUG_PANEL=1
+DEBUG_PANEL = os.environ.get('QUOTE_DEBUG_PANEL') == '1'
 
-Description: {description}
+# Timers for this rerun's stages, recorded under quote_app_stage_seconds
+stage_timers = {}
 
-Quoted Amount: ${price:.2f} AUD (GST Included)
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Function to start timing one stage of this rerun
+def stage_timer(stage):
+    timer = Timer(APP_STAGE_METRIC, stage=stage)
+    stage_timers[stage] = timer
+    return timer
 
-TERMS & CONDITIONS
 
-- This quotation is valid for 30 days from the date above
-- Payment terms: 50% deposit required to book
-- All work will be completed to Australian Standards (AS/NZS 3000)
-- Certificate of compliance provided upon completion
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-NEXT STEPS
-
-To proceed with this quotation, simply reply 'YES' to this email or give us a call on 0412 345 678.
-
-Should you have any questions or require further information, please don't hesitate to contact us.
-
-Cheers,
-Gold Coast Electrical Pros Team
-
-Phone: 0412 345 678
-Email: info@gcelectricalpros.com.au
-Licence: #12345 | ABN: 12 345 678 901
-
-Servicing Gold Coast & Surrounds | Available 24/7 for Emergency Call-Outs
-"""
-    
-    # URL encode the subject and body
-    subject_encoded = urllib.parse.quote(subject)
-    body_encoded = urllib.parse.quote(body)
-    
-    # Build the complete mailto URL
-    mailto_url = f"mailto:{customer_email}?subject={subject_encoded}&body={body_encoded}"
-    
-    return mailto_url
-
-# Function to create Gmail direct link (for web-based Gmail)
-def create_gmail_link(customer_email, customer_name, service_name, price, description, today_date):
+# Function to read a rendered PDF when its download button is clicked
+def pdf_bytes(future):
     """
-    Creates a direct Gmail compose link that opens in browser with pre-filled content.
-    This works perfectly with web-based Gmail and bypasses mailto limitations.
+    Returns a callable for st.download_button: Streamlit calls it on its own
+    thread, so the page never waits for the background render.
     """
-    subject = f"Electrical Services Quotation - {service_name}"
-    
-    # Email body text
-    body = f"""G'day {customer_name},
-
-Thank you for your enquiry with Gold Coast Electrical Pros.
-
-We are pleased to provide you with the following quotation for electrical services at your property.
+    def read():
+        with open(future.result(), 'rb') as f:
+            return f.read()
+    return read
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-QUOTATION DETAILS
+# Function to render a saved quote's PDF when its download button is clicked
+def saved_pdf_bytes(quote):
+    def read():
+        return pdf_bytes(get_pdf_renderer().submit(render_saved_letter(quote), f"Quotation {quote['Quote_ID']}"))()
+    return read
 
-Date: {today_date}
 
-Service Requested: {service_name}
-
-Description: {description}
-
-Quoted Amount: ${price:.2f} AUD (GST Included)
+# Function to bundle the PDFs of a history selection when its download button is clicked
+def bulk_pdf_bytes(search_term, start, end, include_archived, statuses):
+    """
+    Returns a callable that renders the newest MAX_BULK_PDFS matching quotes
+    across a process pool (cached PDFs are reused) and zips them.
+    """
+    def build():
+        import io
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+        quotes = get_quote_store().query_quotes(search_term, start, end, include_archived, statuses).iloc[::-1][:MAX_BULK_PDFS]
+        buffer = io.BytesIO()
+        zip_pdfs(render_quotes(quotes), buffer)
+        return buffer.getvalue()
+    return build
 
-TERMS & CONDITIONS
 
-- This quotation is valid for 30 days from the date above
-- Payment terms: 50% deposit required to book
-- All work will be completed to Australian Standards (AS/NZS 3000)
-- Certificate of compliance provided upon completion
+# Function to describe a registered customer in one line
+def customer_label(customer):
+    return " - ".join(detail for detail in (customer['Name'], customer['Email'] or customer['Phone'], customer['Address']) if detail)
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-NEXT STEPS
+# Function to fill in the customer fields from the picked returning customer
+def fill_customer_fields():
+    """
+    on_change callback of the returning-customer picker. Runs before the
+    rerun, so the customer inputs can still be given new values.
+    """
+    customer = get_customer_registry().get(st.session_state.get('customer_pick') or '')
+    if customer:
+        st.session_state['customer_name'] = customer['Name']
+        st.session_state['customer_email'] = customer['Email']
+        st.session_state['customer_phone'] = customer['Phone']
+        st.session_state['customer_address'] = customer['Address']
 
-To proceed with this quotation, simply reply 'YES' to this email or give us a call on 0412 345 678.
 
-Should you have any questions or require further information, please don't hesitate to contact us.
+# Function to export a history selection when its download button is clicked
+def export_bytes(file_format, search_term, start, end, include_archived, statuses):
+    """
+    Returns a callable that writes the export chunk by chunk. Streamlit needs
+    the finished file, so the pieces are joined at the end; QUOTE_API_URL
+    offers the same export streamed without that.
+    """
+    def build():
+        return b''.join(export_quotes(get_quote_store(), file_format, search_term, start, end, include_archived, statuses))
+    return build
 
-Cheers,
-Gold Coast Electrical Pros Team
 
-Phone: 0412 345 678
-Email: info@gcelectricalpros.com.au
-Licence: #12345 | ABN: 12 345 678 901
+rerun_timer = stage_timer('rerun')
+init_timer = stage_timer('init')
 
-Servicing Gold Coast & Surrounds | Available 24/7 for Emergency Call-Outs
-"""
-    
-    # URL encode the subject and body
-    subject_encoded = urllib.parse.quote(subject)
-    body_encoded = urllib.parse.quote(body)
-    
-    # Gmail compose URL format
-    gmail_url = f"https://mail.google.com/mail/?view=cm&fs=1&to={customer_email}&su={subject_encoded}&body={body_encoded}"
-    
-    return gmail_url
+# Keep QUOTE_METRICS_FILE up to date, if set
+start_metrics_file()
 
 # Initialize the database on app start
 init_database()
 
+# Compile the quote letter and email templates once, up front
+preload_templates()
+
 # Set the page title
 st.title("⚡ Electrical Services Quote Generator")
 
+# Services catalog for this rerun (services.json is re-read when it changes)
+catalog = get_catalog()
+services = catalog.services
+init_timer.stop()
+
 # CREATE TABBED NAVIGATION
 tab1, tab2 = st.tabs(["📝 Generate Quote", "📊 Quote History"])
 
 # TAB 1: GENERATE QUOTE
 with tab1:
-    # SIDEBAR: Service selection dropdown
-    st.sidebar.header("Select Service")
-    selected_service_key = st.sidebar.selectbox(
-        "Service Type",
-        options=list(services_db.keys()),
-        format_func=lambda x: services_db[x]['name']
+    form_timer = stage_timer('quote_form')
+    # SIDEBAR: Service selection with a quantity for each chosen service
+    st.sidebar.header("Select Services")
+    selected_service_keys = st.sidebar.multiselect(
+        "Service Types",
+        options=list(services.keys()),
+        default=[next(iter(services))],
+        format_func=lambda x: services[x]['name']
     )
+    quote_items = [
+        (key, st.sidebar.number_input(f"{services[key]['name']} - quantity", min_value=1, max_value=MAX_QUANTITY, value=1, step=1, key=f"qty_{key}"))
+        for key in selected_service_keys
+    ]
 
-    # Get the selected service details from the database
-    selected_service = services_db[selected_service_key]
-
-    # MAIN SCREEN: Display service information in two columns
+    # MAIN SCREEN: Display the quote's services and pricing
     st.subheader("Selected Service Details")
 
-    # Create two columns for side-by-side layout
-    col1, col2 = st.columns(2)
+    if not quote_items:
+        st.warning("Select at least one service in the sidebar.")
+    else:
+        # Price every line, then the subtotal, GST and total, in one pass
+        priced_quote = price_quote(quote_items, catalog)
+        quote_details = quote_fields(priced_quote, catalog)
 
-    # Left column: Service name
-    with col1:
-        st.write("**Service:**")
-        st.write(selected_service['name'])
+        # Create two columns for side-by-side layout
+        col1, col2 = st.columns(2)
 
-    # Right column: Price
-    with col2:
-        st.write("**Price:**")
-        st.write(f"${selected_service['price']:.2f} AUD")
+        # Left column: Service name
+        with col1:
+            st.write("**Service:**")
+            st.write(quote_details['service_name'])
 
-    # Display service description below the columns
-    st.info(f"📋 {selected_service['description']}")
+        # Right column: Price
+        with col2:
+            st.write("**Price:**")
+            st.write(f"${priced_quote.total:.2f} AUD")
+
+        if len(priced_quote.lines) == 1 and priced_quote.lines[0].quantity == 1:
+            # Display service description below the columns
+            st.info(f"📋 {quote_details['description']}")
+        else:
+            # Display the line items with their totals
+            st.table([
+                {
+                    'Service': line.name,
+                    'Quantity': line.quantity,
+                    'Unit Price': f"${line.unit_price:,.2f}",
+                    'Line Total': f"${line.line_total:,.2f}",
+                }
+                for line in priced_quote.lines
+            ])
+            st.write(f"**Subtotal (ex GST):** ${priced_quote.subtotal:,.2f} | **GST:** ${priced_quote.gst:,.2f} | **Total:** ${priced_quote.total:,.2f} AUD")
 
     # Add spacing
     st.markdown("---")
 
     # INPUT FIELDS: Customer information
     st.subheader("Customer Information")
-    customer_name = st.text_input("Customer Name", placeholder="e.g., John Smith")
-    customer_email = st.text_input("Customer Email (Optional)", placeholder="e.g., john.smith@email.com")
-    customer_address = st.text_input("Customer Address", placeholder="e.g., 123 Main Street, Sydney NSW 2000")
+    # RETURNING CUSTOMERS: suggestions come from the customer registry's prefix index
+    customer_lookup = st.text_input("🔎 Returning customer", placeholder="Start typing a name, email or phone number...")
+    if customer_lookup.strip():
+        suggestions = {customer['Customer_ID']: customer for customer in get_customer_registry().suggest(customer_lookup)}
+        if suggestions:
+            st.selectbox(
+                "Fill in the details of:",
+                options=list(suggestions),
+                index=None,
+                placeholder=f"{len(suggestions)} matching customers",
+                format_func=lambda customer_id: customer_label(suggestions[customer_id]),
+                key="customer_pick",
+                on_change=fill_customer_fields
+            )
+        else:
+            st.caption("No returning customer matches that.")
+    customer_name = st.text_input("Customer Name", placeholder="e.g., John Smith", key="customer_name")
+    customer_email = st.text_input("Customer Email (Optional)", placeholder="e.g., john.smith@email.com", key="customer_email")
+    customer_phone = st.text_input("Customer Phone (Optional)", placeholder="e.g., 0412 345 678", key="customer_phone",
+                                   help="Kept in the customer registry so the customer can be found again")
+    customer_address = st.text_input("Customer Address", placeholder="e.g., 123 Main Street, Sydney NSW 2000", key="customer_address")
+    # Direct sending needs an SMTP server (QUOTE_SMTP_HOST); without one the email links below are used
+    send_email = mail_enabled() and st.checkbox("📨 Email the quote (with the PDF) to the customer", value=False)
 
     # Add spacing
     st.markdown("---")
 
     # ACTION BUTTON: Generate quote
-    if st.button("Generate Quote", type="primary"):
+    if st.button("Generate Quote", type="primary", disabled=not quote_items):
+        # Why the address isn't a valid Australian one (None if it is), checked once for the validations below
+        address_issue = address_problem(customer_address)
         # Validation 1: Check if customer name is empty
         if not customer_name and not customer_address:
             st.error("🚫 Please enter a customer name.")
@@ -351,73 +251,19 @@ with tab1:
         elif not customer_name and customer_address:
             st.error("🚫 Please enter a customer name.")
         # Validation 4: Check if the address is a valid Australian address
-        elif not validate_australian_address(customer_address):
-            st.error("🚫 Please enter a valid Australian address (must include state abbreviation like NSW, VIC, QLD, etc. or a 4-digit postcode).")
+        elif address_issue:
+            st.error(f"🚫 Please enter a valid Australian address (must include state abbreviation like NSW, VIC, QLD, etc. or a 4-digit postcode that matches it). {address_issue}.")
         else:
             # Get today's date and format it
             today_date = datetime.now().strftime("%d %B %Y")
             
             # All validations passed - OUTPUT: Display the professional quote letter
-            quote_letter = f"""⚡ GOLD COAST ELECTRICAL PROS
-Professional Electrical Services - Licensed & Insured
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-📄 OFFICIAL QUOTATION
-
-Date: {today_date}
-
-To:  
-{customer_name}  
-{customer_address}
-
-From:  
-Gold Coast Electrical Pros Pty Ltd  
-Licensed Electrician - Lic. #12345  
-ABN: 12 345 678 901
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Dear {customer_name},
-
-Thank you for your enquiry. We are pleased to provide you with the following 
-quotation for electrical services at your property.
-
-Service Requested: {selected_service['name']}
-
-Description:  
-{selected_service['description']}
-
-Quoted Amount: ${selected_service['price']:.2f} AUD (GST Included)
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-📋 TERMS & CONDITIONS
-
-Disclaimer: This quotation is valid for 30 days from the date above. 
-Payment terms: 50% deposit required to book.
-
-All work will be completed to Australian Standards (AS/NZS 3000) and includes 
-a certificate of compliance upon completion.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-✅ NEXT STEPS
-
-To proceed, reply 'YES' to this message.
-
-Should you have any questions or require further information, please don't 
-hesitate to contact us.
-
-Contact: 0412 345 678 | info@gcelectricalpros.com.au
-
-Regards,  
-Gold Coast Electrical Pros Team
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Servicing Gold Coast & Surrounds | Available 24/7 for Emergency Call-Outs
-"""
+            quote_letter = render_quote_letter(
+                customer_name=customer_name,
+                customer_address=customer_address,
+                today_date=today_date,
+                **quote_details
+            )
             
             # Display the quote in a success message
             st.success("✅ Quote Generated Successfully!")
@@ -426,16 +272,31 @@ Servicing Gold Coast & Surrounds | Available 24/7 for Emergency Call-Outs
             st.code(quote_letter, language=None)
             
             # SAVE QUOTE TO DATABASE
-            save_quote(
+            save_timer = stage_timer('save_quote')
+            quote_id = save_quote(
                 customer_name=customer_name,
                 customer_email=customer_email,
                 customer_address=customer_address,
-                service_name=selected_service['name'],
-                price=selected_service['price']
+                service_name=quote_details['service_name'],
+                price=priced_quote.total,
+                items=quote_items,
+                catalog=catalog,
+                customer_phone=customer_phone
             )
+            save_timer.stop()
             
             st.info("💾 Quote saved to database for tracking.")
             
+            # Queued in the outbox; the background mailer sends it (and retries if need be)
+            if send_email and customer_email and customer_email.strip():
+                queue_quote_emails([get_quote(quote_id)])
+                st.info(f"📨 Quote queued for emailing to {customer_email.strip()}. Its delivery status is shown in the Quote History.")
+            
+            # PDF COPY: rendered in the background (or taken from the PDF cache)
+            pdf_future = get_pdf_renderer().submit(quote_letter, f"Quotation {quote_id}")
+            st.download_button("📄 Download PDF", data=pdf_bytes(pdf_future), file_name=f"Quote_{quote_id}.pdf",
+                               mime="application/pdf", on_click="ignore")
+            
             # EMAIL BUTTON FUNCTIONALITY
             # Only show email buttons if customer provided an email address
             if customer_email and customer_email.strip():
@@ -454,10 +315,8 @@ Servicing Gold Coast & Surrounds | Available 24/7 for Emergency Call-Outs
                     gmail_link = create_gmail_link(
                         customer_email=customer_email,
                         customer_name=customer_name,
-                        service_name=selected_service['name'],
-                        price=selected_service['price'],
-                        description=selected_service['description'],
-                        today_date=today_date
+                        today_date=today_date,
+                        **quote_details
                     )
                     
                     # Gmail button
@@ -493,10 +352,8 @@ Servicing Gold Coast & Surrounds | Available 24/7 for Emergency Call-Outs
                     mailto_link = create_mailto_link(
                         customer_email=customer_email,
                         customer_name=customer_name,
-                        service_name=selected_service['name'],
-                        price=selected_service['price'],
-                        description=selected_service['description'],
-                        today_date=today_date
+                        today_date=today_date,
+                        **quote_details
                     )
                     
                     # Desktop app button
@@ -529,46 +386,12 @@ Servicing Gold Coast & Surrounds | Available 24/7 for Emergency Call-Outs
                     st.caption("*(Manual paste)*")
                     
                     # Create copyable email text
-                    email_content = f"""To: {customer_email}
-Subject: Electrical Services Quotation - {selected_service['name']}
-
-G'day {customer_name},
-
-Thank you for your enquiry with Gold Coast Electrical Pros.
-
-We are pleased to provide you with the following quotation for electrical services at your property.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-QUOTATION DETAILS
-
-Date: {today_date}
-Service Requested: {selected_service['name']}
-Description: {selected_service['description']}
-Quoted Amount: ${selected_service['price']:.2f} AUD (GST Included)
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-TERMS & CONDITIONS
-
-- This quotation is valid for 30 days from the date above
-- Payment terms: 50% deposit required to book
-- All work will be completed to Australian Standards (AS/NZS 3000)
-- Certificate of compliance provided upon completion
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-NEXT STEPS
-
-To proceed with this quotation, simply reply 'YES' to this email or give us a call on 0412 345 678.
-
-Cheers,
-Gold Coast Electrical Pros Team
-
-Phone: 0412 345 678
-Email: info@gcelectricalpros.com.au
-Licence: #12345 | ABN: 12 345 678 901
-"""
+                    email_content = render_email_text(
+                        customer_email=customer_email,
+                        customer_name=customer_name,
+                        today_date=today_date,
+                        **quote_details
+                    )
                     
                     # Copy button (shows content in expandable section)
                     with st.expander("📄 View Email"):
@@ -581,30 +404,79 @@ Licence: #12345 | ABN: 12 345 678 901
             else:
                 # Show helpful message if no email was provided
                 st.warning("💡 **Tip:** Add a customer email address above to enable the 'Send Email' buttons!")
+    form_timer.stop()
 
 # TAB 2: QUOTE HISTORY
 with tab2:
     st.header("📊 Quote History & Tracking")
     
-    # Load all quotes from database
-    quotes_df = load_quotes()
+    # Per-status counts and values come straight from the store
+    summary_timer = stage_timer('load_summary')
+    quote_store = get_quote_store()
+    status_summary = quote_store.status_summary()
+    summary_timer.stop()
+    total_quotes = sum(s['count'] for s in status_summary.values())
     
     # Check if there are any quotes in the database
-    if quotes_df.empty:
+    if total_quotes == 0:
         st.info("📭 No quotes generated yet. Go to the 'Generate Quote' tab to create your first quote!")
     else:
+        # DATE RANGE: narrows the quote list, the statistics and the trends below
+        date_range = st.date_input("📅 Created between", value=(), format="DD/MM/YYYY", help="Leave empty to include every quote")
+        range_start = date_range[0] if len(date_range) > 0 else None
+        range_end = date_range[1] if len(date_range) > 1 else range_start
+        if range_start:
+            # Totals for the range come from the daily rollups, not the quotes themselves
+            status_summary = quote_store.status_summary(range_start, range_end)
+            total_quotes = sum(s['count'] for s in status_summary.values())
+        
         # SEARCH FUNCTIONALITY
         st.subheader("🔍 Search Quotes")
-        search_term = st.text_input("Search by Customer Name", placeholder="Type customer name to filter...")
+        search_term = st.text_input("Search by Customer Name, Email or Address", placeholder="Type a name, email or address to filter...")
+        # Won/Lost quotes from earlier months are archived; only read them when asked
+        include_archived = st.checkbox("🗄️ Include archived quotes (all time)", value=False,
+                                       help="Won and Lost quotes from before this month are archived and hidden by default")
+        # No statuses picked means every status
+        status_filter = st.multiselect("Status", options=STATUS_OPTIONS, placeholder="All statuses")
+        statuses = status_filter or None
         
-        # Filter the dataframe based on search term
-        if search_term:
-            filtered_df = quotes_df[quotes_df['Customer_Name'].str.contains(search_term, case=False, na=False)]
-        else:
-            filtered_df = quotes_df
+        # SORTING AND PAGING
+        sort_col, size_col, page_col = st.columns(3)
+        
+        with sort_col:
+            sort_label = st.selectbox("Sort by", options=list(HISTORY_SORT_OPTIONS.keys()))
+        
+        with size_col:
+            page_size = st.selectbox("Quotes per page", options=PAGE_SIZE_OPTIONS, index=PAGE_SIZE_OPTIONS.index(DEFAULT_PAGE_SIZE))
+        
+        with page_col:
+            page_number = st.number_input("Page", min_value=1, value=1, step=1)
+        
+        # Only fetch the page of matching quotes that will actually be shown
+        search_timer = stage_timer('search')
+        sort_by, descending = HISTORY_SORT_OPTIONS[sort_label]
+        page_df, total_matching = quote_store.query_page(
+            search_term, sort_by=sort_by, descending=descending,
+            offset=(page_number - 1) * page_size, limit=page_size,
+            start=range_start, end=range_end, include_archived=include_archived, statuses=statuses
+        )
+        
+        # Jump back to the last page if the search left fewer pages than before
+        page_count = max(1, -(-total_matching // page_size))
+        if page_number > page_count:
+            page_number = page_count
+            page_df, total_matching = quote_store.query_page(
+                search_term, sort_by=sort_by, descending=descending,
+                offset=(page_number - 1) * page_size, limit=page_size,
+                start=range_start, end=range_end, include_archived=include_archived, statuses=statuses
+            )
+        search_timer.stop()
         
         # Display results count
-        st.write(f"**Showing {len(filtered_df)} of {len(quotes_df)} quotes**")
+        first_shown = (page_number - 1) * page_size + 1 if total_matching else 0
+        last_shown = (page_number - 1) * page_size + len(page_df)
+        st.write(f"**Showing {first_shown}-{last_shown} of {total_matching} matching quotes ({total_quotes} total)**")
+        st.caption(f"Page {page_number} of {page_count}")
         
         # Add spacing
         st.markdown("---")
@@ -612,20 +484,44 @@ with tab2:
         # DISPLAY QUOTE HISTORY TABLE WITH STATUS UPDATE
         st.subheader("All Quotes")
         
-        # Create a container for each quote row with status update capability
-        for idx, row in filtered_df.iterrows():
+        # Create a container for each quote on this page with status update capability
+        expander_timer = stage_timer('expander_loop')
+        # Email delivery status of every quote on this page, in one outbox query
+        page_deliveries = delivery_status(page_df['Quote_ID'].tolist())
+        for _, row in page_df.iterrows():
+            quote_id = row['Quote_ID']
+            
             # Create expandable section for each quote
             with st.expander(f"📋 {row['Date']} - {row['Customer_Name']} - {row['Service']} - ${row['Price']:.2f}", expanded=False):
                 # Display quote details
                 col1, col2 = st.columns([2, 1])
                 
                 with col1:
+                    st.write(f"**Quote ID:** {quote_id}")
                     st.write(f"**Customer:** {row['Customer_Name']}")
+                    if isinstance(row['Customer_ID'], str) and row['Customer_ID']:
+                        st.write(f"**Customer ID:** {row['Customer_ID']}")
                     st.write(f"**Email:** {row['Customer_Email'] if row['Customer_Email'] else 'Not provided'}")
                     st.write(f"**Address:** {row['Customer_Address']}")
                     st.write(f"**Service:** {row['Service']}")
+                    # Multi-line quotes list their items (quotes from before line items have none)
+                    quote_lines = parse_items(row['Items']) if isinstance(row['Items'], str) else []
+                    if len(quote_lines) > 1 or any(quantity > 1 for _, quantity in quote_lines):
+                        # Name the items from the catalog version the quote was priced with
+                        quote_version = row['Catalog_Version']
+                        quote_services = get_catalog_version(quote_version).services if isinstance(quote_version, str) and quote_version else services
+                        st.write("**Items:**")
+                        st.markdown('\n'.join(
+                            f"- {quantity} x {quote_services[key]['name'] if key in quote_services else key}"
+                            for key, quantity in quote_lines
+                        ))
                     st.write(f"**Price:** ${row['Price']:.2f} AUD")
                     st.write(f"**Date/Time:** {row['Date']} at {row['Time']}")
+                    delivery = page_deliveries.get(quote_id)
+                    if delivery:
+                        detail = delivery['sent_at'] if delivery['status'] == 'sent' else delivery['last_error']
+                        st.write(f"**Email:** {DELIVERY_LABELS.get(delivery['status'], delivery['status'])} "
+                                 f"to {delivery['recipient']} ({delivery['attempts']} attempt(s)){f' - {detail}' if detail else ''}")
                 
                 with col2:
                     st.write("**Current Status:**")
@@ -649,62 +545,184 @@ with tab2:
                         "Change to:",
                         options=['Sent', 'Approved', 'Won', 'Lost'],
                         index=['Sent', 'Approved', 'Won', 'Lost'].index(current_status),
-                        key=f"status_{idx}"
+                        key=f"status_{quote_id}"
                     )
                     
                     # Update button
-                    if st.button("💾 Update", key=f"update_{idx}"):
+                    if st.button("💾 Update", key=f"update_{quote_id}"):
                         if new_status != current_status:
-                            update_quote_status(idx, new_status)
+                            update_quote_status(quote_id, new_status)
                             st.success(f"✅ Status updated to '{new_status}'")
                             st.rerun()
                         else:
                             st.info("ℹ️ Status unchanged")
+                    
+                    # PDF of the quote letter, only rendered once the button is clicked
+                    st.download_button("📄 PDF", data=saved_pdf_bytes(row.to_dict()), file_name=f"Quote_{quote_id}.pdf",
+                                       mime="application/pdf", key=f"pdf_{quote_id}", on_click="ignore")
+                    
+                    # Send (or resend) the quote through the outbox
+                    if mail_enabled() and row['Customer_Email'] and st.button("📨 Email", key=f"email_{quote_id}"):
+                        queue_quote_emails([row.to_dict()])
+                        st.rerun()
+        expander_timer.stop()
+        
+        # BULK STATUS: set one status on a selection of quotes in a single write
+        if total_matching:
+            with st.form("bulk_status_form"):
+                st.write("**Set status for several quotes:**")
+                selected_ids = st.multiselect(
+                    "Quotes on this page",
+                    options=page_df['Quote_ID'].tolist(),
+                    format_func=dict(zip(page_df['Quote_ID'], page_df['Date'].astype(str) + ' - ' + page_df['Customer_Name'].astype(str) + ' - ' + page_df['Service'].astype(str))).get
+                )
+                select_all = st.checkbox(f"All {total_matching} matching quotes", help="Every quote matching the search and date range, on any page")
+                bulk_status = st.selectbox("Set status to:", options=STATUS_OPTIONS)
+                if st.form_submit_button("💾 Apply to selection"):
+                    if select_all:
+                        selected_ids = quote_store.query_quotes(search_term, range_start, range_end, include_archived, statuses)['Quote_ID'].tolist()
+                    if selected_ids:
+                        changed = update_quote_statuses(selected_ids, bulk_status)
+                        # The per-quote dropdowns would otherwise keep showing the old status
+                        for selected_id in selected_ids:
+                            st.session_state.pop(f"status_{selected_id}", None)
+                        unchanged = len(set(selected_ids)) - changed
+                        st.session_state['bulk_status_message'] = (f"✅ Set {changed} quotes to '{bulk_status}'"
+                                                                   + (f" ({unchanged} already had it)" if unchanged else ""))
+                        st.rerun()
+                    else:
+                        st.info("ℹ️ No quotes selected")
+            if 'bulk_status_message' in st.session_state:
+                st.success(st.session_state.pop('bulk_status_message'))
+        
+        # BULK PDFS: every quote matching the search and date range, in one zip
+        if total_matching:
+            st.download_button(
+                f"📦 Download PDFs of {min(total_matching, MAX_BULK_PDFS)} matching quotes",
+                data=bulk_pdf_bytes(search_term, range_start, range_end, include_archived, statuses),
+                file_name="quotes_pdf.zip", mime="application/zip", on_click="ignore",
+                help=f"Newest {MAX_BULK_PDFS} if more match" if total_matching > MAX_BULK_PDFS else None
+            )
+        
+        # BULK EMAIL: follow up every matching quote that has an email address
+        if total_matching and mail_enabled():
+            if st.button(f"📨 Email {min(total_matching, MAX_BULK_EMAILS)} matching quotes",
+                         help="Quotes without an email address are skipped"):
+                matching = quote_store.query_quotes(search_term, range_start, range_end, include_archived, statuses).iloc[::-1][:MAX_BULK_EMAILS]
+                queued, skipped = queue_quote_emails(matching.to_dict('records'))
+                st.success(f"📨 Queued {queued} emails ({skipped} quotes have no email address)")
+        
+        # EXPORT: every matching quote as a spreadsheet, oldest first
+        if total_matching:
+            export_format = st.radio("Export format", options=list(EXPORT_FORMATS), horizontal=True,
+                                     format_func=str.upper, key="export_format")
+            st.download_button(
+                f"⬇️ Export {total_matching} matching quotes as {export_format.upper()}",
+                data=export_bytes(export_format, search_term, range_start, range_end, include_archived, statuses),
+                file_name=export_file_name(export_format), mime=EXPORT_FORMATS[export_format][0], on_click="ignore"
+            )
+            if QUOTE_API_URL:
+                from urllib.parse import urlencode
+
+                export_query = urlencode({
+                    'format': export_format, 'search': search_term or '', 'archived': int(include_archived),
+                    'start': range_start.isoformat() if range_start else '', 'end': range_end.isoformat() if range_end else '',
+                    'status': ','.join(status_filter),
+                })
+                st.link_button("⬇️ Stream the export from the API (for very large exports)", f"{QUOTE_API_URL}/quotes/export?{export_query}")
         
         # SUMMARY STATISTICS
+        stats_timer = stage_timer('stats_block')
         st.markdown("---")
         st.subheader("📈 Summary Statistics")
         
+        # Helpers to read the per-status figures
+        def status_count(*statuses):
+            return sum(status_summary.get(status, {}).get('count', 0) for status in statuses)
+        
+        def status_value(*statuses):
+            return sum(status_summary.get(status, {}).get('value', 0.0) for status in statuses)
+        
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("Total Quotes", len(quotes_df))
+            st.metric("Total Quotes", total_quotes)
         
         with col2:
-            total_value = quotes_df['Price'].sum()
+            total_value = sum(s['value'] for s in status_summary.values())
             st.metric("Total Value", f"${total_value:,.2f}")
+            st.caption(f"incl. ${gst_included(total_value):,.2f} GST")
         
         with col3:
-            active_count = len(quotes_df[quotes_df['Status'].isin(['Sent', 'Approved'])])
+            active_count = status_count('Sent', 'Approved')
             st.metric("Active Quotes", active_count)
         
         with col4:
-            won_count = len(quotes_df[quotes_df['Status'] == 'Won'])
+            won_count = status_count('Won')
             st.metric("Won Jobs", won_count)
         
         # Additional analytics row
         col5, col6, col7, col8 = st.columns(4)
         
         with col5:
-            sent_count = len(quotes_df[quotes_df['Status'] == 'Sent'])
+            sent_count = status_count('Sent')
             st.metric("🟡 Sent", sent_count)
         
         with col6:
-            approved_count = len(quotes_df[quotes_df['Status'] == 'Approved'])
+            approved_count = status_count('Approved')
             st.metric("🔵 Approved", approved_count)
         
         with col7:
-            won_value = quotes_df[quotes_df['Status'] == 'Won']['Price'].sum()
+            won_value = status_value('Won')
             st.metric("🟢 Won Value", f"${won_value:,.2f}")
         
         with col8:
-            lost_count = len(quotes_df[quotes_df['Status'] == 'Lost'])
+            lost_count = status_count('Lost')
             st.metric("🔴 Lost", lost_count)
         
         # Win rate calculation
-        if len(quotes_df) > 0:
-            closed_quotes = len(quotes_df[quotes_df['Status'].isin(['Won', 'Lost'])])
+        if total_quotes > 0:
+            closed_quotes = status_count('Won', 'Lost')
             if closed_quotes > 0:
                 win_rate = (won_count / closed_quotes) * 100
                 st.markdown("---")
                 st.metric("🎯 Win Rate (Won / Closed)", f"{win_rate:.1f}%")
+        stats_timer.stop()
+        
+        # TRENDS: quoted and won value and win rate over time, from the daily rollups
+        trends_timer = stage_timer('trends')
+        st.markdown("---")
+        st.subheader("📆 Trends")
+        trend_period = st.radio("Group by", options=list(TREND_PERIODS), index=list(TREND_PERIODS).index('month'), format_func=str.capitalize, horizontal=True)
+        trends = trend_frame(quote_store.daily_summary(range_start, range_end), trend_period)
+        
+        if trends.empty:
+            st.info("No quotes were created in this date range.")
+        else:
+            trend_col1, trend_col2 = st.columns(2)
+            
+            with trend_col1:
+                st.write("**Quoted vs Won Value ($)**")
+                st.bar_chart(trends[['Quoted Value', 'Won Value']], stack=False)
+            
+            with trend_col2:
+                st.write("**Win Rate (Won / Closed, %)**")
+                st.line_chart(trends['Win Rate %'])
+            
+            with st.expander("📄 View trend table"):
+                st.dataframe(trends)
+        trends_timer.stop()
+
+rerun_timer.stop()
+
+# DEBUG PANEL: this rerun's stage timings and everything recorded since the app started
+if DEBUG_PANEL or st.query_params.get('debug') == '1':
+    with st.sidebar.expander("⏱️ Timings", expanded=True):
+        st.write("**This rerun:**")
+        st.table([
+            {'Stage': stage, 'ms': f"{timer.elapsed * 1000:.1f}"}
+            for stage, timer in stage_timers.items() if timer.elapsed is not None
+        ])
+        st.write("**Since the app started:**")
+        st.dataframe(summary_rows(), hide_index=True)
+
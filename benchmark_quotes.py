@@ -0,0 +1,388 @@
+"""
+Benchmarks how the quote engine holds up as the quote history grows.
+
+For each history size a synthetic quotes database is generated (realistic
+mix of services, multi-line quotes and statuses, spread over three years)
+and these are timed against it, through the same quote_core functions the
+app uses:
+
+    archive_closed (once), save_quote, load_quotes (cold from CSV, cold from
+    the Arrow snapshot, warm, hot quotes only), history pages with and
+    without archived quotes, update_quote_status, update_quote_statuses for fifty
+    quotes, get_quote, name search (first page and the
+    full result), the summary statistics block (stored totals and a full
+    recount), CSV and XLSX exports of every quote, and quote letter / Gmail /
+    mailto / email text rendering.
+
+Results go to a JSON file (milliseconds per call: min, median, p95, max,
+mean) together with the git commit and library versions. Compare two runs
+to spot regressions:
+
+    python benchmark_quotes.py --sizes 10000 100000 1000000 --out bench_new.json
+    python benchmark_quotes.py --sizes 10000 --compare bench_old.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import quote_core
+from quote_catalog import get_catalog
+from quote_export import EXPORT_FORMATS, export_quotes
+from quote_pricing import format_items, get_price_table
+from quote_rollups import trend_frame
+from quote_store import QUOTE_COLUMNS, STORE_BACKENDS, migrate_csv_to_sqlite
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Share of quotes in each status (most quotes are still waiting on the customer)
+STATUS_MIX = {'Sent': 0.45, 'Approved': 0.15, 'Won': 0.25, 'Lost': 0.15}
+
+# How often each service is quoted, relative to each other
+SERVICE_WEIGHTS = {
+    'powerpoint_install': 20,
+    'downlight_install': 18,
+    'light_fitting_replacement': 12,
+    'smoke_alarm_install': 12,
+    'ceiling_fan_fitoff': 10,
+    'safety_switch_install': 8,
+    'data_point_install': 7,
+    'oven_cooktop_connection': 6,
+    'hot_water_system_connection': 4,
+    'switchboard_upgrade': 3,
+}
+
+# Share of quotes with several lines, and how many lines those have
+MULTI_LINE_SHARE = 0.2
+MAX_LINES = 5
+
+FIRST_NAMES = ['Jack', 'Olivia', 'Noah', 'Charlotte', 'William', 'Amelia', 'Leo', 'Isla', 'Oliver', 'Mia',
+               'Henry', 'Ava', 'Thomas', 'Grace', 'Lucas', 'Chloe', 'James', 'Ruby', 'Ethan', 'Zoe']
+LAST_NAMES = ['Smith', 'Jones', 'Williams', 'Brown', 'Wilson', 'Taylor', 'Nguyen', 'Johnson', 'Martin', 'White',
+              'Anderson', 'Walker', 'Thompson', 'Kelly', 'Harris', 'Lee', 'Ryan', 'Robinson', 'King', 'Murphy']
+STREETS = ['Surf Parade', 'Gold Coast Hwy', 'Main Street', 'Marine Parade', 'Ocean Avenue', 'Ferry Road',
+           'Bundall Road', 'Nerang Street', 'Scarborough Street', 'Queen Street']
+SUBURBS = [('Broadbeach', 'QLD', 4218), ('Southport', 'QLD', 4215), ('Surfers Paradise', 'QLD', 4217),
+           ('Burleigh Heads', 'QLD', 4220), ('Robina', 'QLD', 4226), ('Coolangatta', 'QLD', 4225),
+           ('Tweed Heads', 'NSW', 2485), ('Brisbane', 'QLD', 4000), ('Sydney', 'NSW', 2000), ('Melbourne', 'VIC', 3000)]
+
+
+# Function to build a synthetic quote history
+def generate_quotes(count, seed=1):
+    """
+    Returns a DataFrame of count quotes in QUOTE_COLUMNS, oldest first, priced
+    with the current catalog. Line items are priced in one vectorized pass.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    catalog = get_catalog()
+    table = get_price_table(catalog)
+    keys = [key for key in SERVICE_WEIGHTS if key in catalog.services] or list(catalog.services)
+    weights = np.array([SERVICE_WEIGHTS.get(key, 1) for key in keys], dtype=float)
+
+    # Line items: most quotes have one line, some several; downlights and power points come in bulk
+    line_counts = np.where(rng.random(count) < MULTI_LINE_SHARE, rng.integers(2, MAX_LINES + 1, count), 1)
+    quote_index = np.repeat(np.arange(count), line_counts)
+    line_keys = rng.choice(len(keys), size=len(quote_index), p=weights / weights.sum())
+    quantities = np.where(rng.random(len(quote_index)) < 0.3, rng.integers(2, 13, len(quote_index)), 1)
+    codes = table.encode(keys)[line_keys]
+    totals = table.price_quotes(quote_index, codes, quantities, quote_count=count)['total'] / 100
+
+    # Group the lines back into quotes (repeated services on one quote are merged)
+    items, starts = [], np.concatenate([[0], np.cumsum(line_counts)])
+    key_list, quantity_list = line_keys.tolist(), quantities.tolist()
+    for q in range(count):
+        merged = {}
+        for line in range(starts[q], starts[q + 1]):
+            merged[keys[key_list[line]]] = merged.get(keys[key_list[line]], 0) + quantity_list[line]
+        items.append(list(merged.items()))
+    # Service summaries repeat a lot, so each distinct set of items is described once
+    fields, services = {}, []
+    for quote_items in items:
+        text = format_items(quote_items)
+        if text not in fields:
+            fields[text] = quote_core.quote_fields(table.price_items(quote_items), catalog)['service_name']
+        services.append(fields[text])
+
+    # Quotes spread over the last three years, in the order they were saved
+    now = datetime.now().replace(microsecond=0)
+    offsets = np.sort(rng.integers(0, 3 * 365 * 86400, count))[::-1]
+    stamps = pd.Timestamp(now) - pd.to_timedelta(offsets, unit='s')
+
+    first = np.array(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), count)]
+    last = np.array(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), count)]
+    names = pd.Series(first) + ' ' + pd.Series(last)
+    suburbs = np.array([f"{suburb} {state} {postcode:04d}" for suburb, state, postcode in SUBURBS], dtype=object)
+    addresses = (
+        pd.Series(rng.integers(1, 300, count)).astype(str) + ' '
+        + pd.Series(np.array(STREETS, dtype=object)[rng.integers(0, len(STREETS), count)]) + ', '
+        + pd.Series(suburbs[rng.integers(0, len(SUBURBS), count)])
+    )
+    has_email = rng.random(count) < 0.7
+    emails = (names.str.lower().str.replace(' ', '.') + pd.Series(np.arange(count)).astype(str) + '@example.com').where(has_email, '')
+
+    statuses = list(STATUS_MIX)
+    status = np.array(statuses, dtype=object)[rng.choice(len(statuses), size=count, p=list(STATUS_MIX.values()))]
+    single = [quote_items[0][0] if len(quote_items) == 1 else '' for quote_items in items]
+
+    return pd.DataFrame({
+        'Quote_ID': [f"B{n:011X}" for n in range(count)],
+        'Date': stamps.strftime('%d/%m/%Y'),
+        'Time': stamps.strftime('%H:%M:%S'),
+        'Customer_Name': names,
+        'Customer_Email': emails,
+        'Customer_Address': addresses,
+        'Service': services,
+        'Price': totals,
+        'Status': status,
+        'Items': [format_items(quote_items) for quote_items in items],
+        'Service_ID': single,
+        'Catalog_Version': str(catalog.version),
+        'Customer_ID': '',
+        'Customer_Version': '',
+    }, columns=QUOTE_COLUMNS)
+
+
+# Function to time repeated calls of one operation
+def time_calls(fn, runs):
+    """
+    Calls fn() runs times. Returns the elapsed milliseconds of each call.
+    """
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+# Function to summarize timings
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'runs': len(ordered),
+        'min_ms': round(ordered[0], 4),
+        'median_ms': round(ordered[len(ordered) // 2], 4),
+        'p95_ms': round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 4),
+        'max_ms': round(ordered[-1], 4),
+        'mean_ms': round(sum(ordered) / len(ordered), 4),
+    }
+
+
+# Function to run every benchmark against one history size
+def benchmark_size(size, backend, work_dir, runs, seed):
+    """
+    Generates a history of size quotes in work_dir and times each operation.
+    Returns {operation: summary}.
+    """
+    from quote_store import CSVQuoteStore
+
+    started = time.perf_counter()
+    csv_path = os.path.join(work_dir, f"quotes_{size}.csv")
+    generate_quotes(size, seed).to_csv(csv_path, index=False, lineterminator='\n')
+    path = csv_path
+    if backend == 'sqlite':
+        path = os.path.join(work_dir, f"quotes_{size}.db")
+        migrate_csv_to_sqlite(csv_path, path)
+    print(f"  generated {size:,} quotes in {time.perf_counter() - started:.1f}s", flush=True)
+
+    # Point the engine at the generated database, as if it were the app's own
+    quote_core.STORE_BACKEND = backend
+    quote_core.CSV_FILE, quote_core.DB_FILE = csv_path, path
+    quote_core.init_database()
+    store = quote_core.get_quote_store()
+    rng = random.Random(seed)
+    results = {}
+
+    def record(name, samples):
+        results[name] = summarize(samples)
+        print(f"  {name:<26} median {results[name]['median_ms']:10.3f} ms   p95 {results[name]['p95_ms']:10.3f} ms", flush=True)
+
+    # Closed quotes from earlier months move out of the hot data first, as in a running app
+    record('archive_closed', time_calls(store.archive_closed, 1))
+
+    # Cold loads: a fresh store with nothing cached, like a new server process
+    cold_runs = max(1, min(runs, 3))
+    def load_cold():
+        store = STORE_BACKENDS[backend](path)
+        # Parse the CSV itself, not a snapshot left by archive_closed or an earlier run
+        if backend == 'csv' and os.path.exists(store.snapshot_path):
+            os.remove(store.snapshot_path)
+        return store.load_quotes()
+
+    record('load_quotes_cold', time_calls(load_cold, cold_runs))
+    if backend == 'csv' and CSVQuoteStore(csv_path).write_snapshot():
+        record('load_quotes_cold_snapshot', time_calls(lambda: CSVQuoteStore(csv_path).load_quotes(), cold_runs))
+    quote_core.load_quotes()
+    record('load_quotes_warm', time_calls(quote_core.load_quotes, runs))
+    record('load_quotes_hot', time_calls(lambda: store.load_quotes(include_archived=False), runs))
+
+    # The history tab's first page: open quotes only (the default) and all time
+    store.query_page(include_archived=False)
+    record('history_page_hot', time_calls(lambda: store.query_page(limit=25, include_archived=False), runs))
+    record('history_page_all', time_calls(lambda: store.query_page(limit=25), runs))
+
+    ids = quote_core.load_quotes()['Quote_ID'].sample(n=min(runs, size), random_state=seed).tolist()
+    record('get_quote', time_calls(lambda: quote_core.get_quote(rng.choice(ids)), runs))
+
+    catalog = get_catalog()
+    keys = list(catalog.services)
+
+    def save():
+        items = [(rng.choice(keys), rng.randint(1, 4))]
+        priced = quote_core.price_quote(items, catalog)
+        quote_core.save_quote('Bench Customer', 'bench@example.com', '1 Surf Parade, Broadbeach QLD 4218',
+                              quote_core.quote_fields(priced, catalog)['service_name'], priced.total,
+                              items=items, catalog=catalog)
+
+    record('save_quote', time_calls(save, runs))
+    statuses = list(STATUS_MIX)
+    record('update_quote_status', time_calls(lambda: quote_core.update_quote_status(rng.choice(ids), rng.choice(statuses)), runs))
+    # Closing out a month: one status for fifty quotes in a single write
+    bulk_ids = quote_core.load_quotes()['Quote_ID'].sample(n=min(1000, size), random_state=seed).tolist()
+    record('update_quote_statuses_50', time_calls(
+        lambda: quote_core.update_quote_statuses(rng.sample(bulk_ids, min(50, len(bulk_ids))), rng.choice(statuses)), runs))
+
+    # Name search as the history tab runs it: one page, and the full result
+    store.query_page('warm up')
+    record('search_page', time_calls(lambda: store.query_page(f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", limit=25), runs))
+    record('search_all', time_calls(lambda: store.query_quotes(rng.choice(LAST_NAMES)), max(1, runs // 5)))
+
+    # The summary statistics block reads the stored per-status totals
+    def summary_block():
+        summary = store.status_summary()
+        total = sum(s['count'] for s in summary.values())
+        value = sum(s['value'] for s in summary.values())
+        won, lost = summary.get('Won', {}).get('count', 0), summary.get('Lost', {}).get('count', 0)
+        return total, value, won / max(won + lost, 1)
+
+    record('summary_stats', time_calls(summary_block, runs))
+    record('summary_stats_recount', time_calls(store.compute_status_summary, max(1, runs // 10)))
+
+    # Exports of the whole history, written out chunk by chunk
+    for file_format in EXPORT_FORMATS:
+        record(f'export_{file_format}', time_calls(lambda: sum(len(chunk) for chunk in export_quotes(store, file_format)),
+                                                   max(1, runs // 10)))
+
+    # Date-range filters and trends read the time index and the daily rollups
+    day = (datetime.now() - timedelta(days=2 * 365)).date()
+    month_start, month_end = day.replace(day=1), day.replace(day=28)
+    store.query_page(start=month_start, end=month_end)
+    record('range_page', time_calls(lambda: store.query_page(start=month_start, end=month_end, limit=25), runs))
+    record('range_summary_stats', time_calls(lambda: store.status_summary(month_start, month_end), runs))
+    record('monthly_trends', time_calls(lambda: trend_frame(store.daily_summary(), 'month'), runs))
+
+    # Rendering doesn't depend on the history size, but is timed alongside for completeness
+    details = dict(customer_name='Jane Citizen', today_date='01 January 2026',
+                   **quote_core.quote_fields(quote_core.price_quote('downlight_install*12;powerpoint_install*4', catalog), catalog))
+    record('render_letter', time_calls(lambda: quote_core.render_quote_letter(customer_address='1 Surf Parade, Broadbeach QLD 4218', **details), runs))
+    record('render_gmail_link', time_calls(lambda: quote_core.create_gmail_link(customer_email='jane@example.com', **details), runs))
+    record('render_mailto_link', time_calls(lambda: quote_core.create_mailto_link(customer_email='jane@example.com', **details), runs))
+    record('render_email_text', time_calls(lambda: quote_core.render_email_text(customer_email='jane@example.com', **details), runs))
+
+    # Release the files before the next size
+    from quote_writer import get_write_queue
+    get_write_queue(store).close()
+    return results
+
+
+# Function to describe the code and machine the results came from
+def environment():
+    import numpy
+    import pandas
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    try:
+        import pyarrow
+        pyarrow_version = pyarrow.__version__
+    except ImportError:
+        pyarrow_version = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit or None,
+        'python': platform.python_version(),
+        'pandas': pandas.__version__,
+        'numpy': numpy.__version__,
+        'pyarrow': pyarrow_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+# Function to compare two result files
+def compare(baseline, current, threshold, min_delta_ms):
+    """
+    Prints the median of every operation in both runs and returns the
+    (size, operation) pairs that got slower by more than threshold (e.g. 0.2 = 20%)
+    and by at least min_delta_ms (so timer noise on very fast calls isn't flagged).
+    """
+    regressions = []
+    print(f"\nCompared with {baseline['environment'].get('git_commit') or 'baseline'} "
+          f"({baseline['environment'].get('timestamp')}):")
+    for size, operations in current['results'].items():
+        for name, summary in operations.items():
+            before = baseline['results'].get(size, {}).get(name)
+            if not before:
+                continue
+            ratio = summary['median_ms'] / before['median_ms'] if before['median_ms'] else 1.0
+            flag = ''
+            if ratio > 1 + threshold and summary['median_ms'] - before['median_ms'] >= min_delta_ms:
+                flag = '  REGRESSION'
+                regressions.append((size, name))
+            print(f"  {int(size):>9,} {name:<26} {before['median_ms']:10.3f} -> {summary['median_ms']:10.3f} ms  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the quote engine against growing quote histories')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='History sizes to generate')
+    parser.add_argument('--backend', default='csv', choices=list(STORE_BACKENDS))
+    parser.add_argument('--runs', type=int, default=50, help='Timed calls per operation')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic data')
+    parser.add_argument('--out', default='benchmark_results.json', help='Results file (JSON)')
+    parser.add_argument('--compare', default=None, help='Earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Slowdown that counts as a regression (0.2 = 20%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help='Smallest slowdown (ms) that counts as a regression')
+    parser.add_argument('--keep', default=None, help='Keep the generated databases in this folder')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    work_dir = args.keep or tempfile.mkdtemp(prefix='quote_bench_')
+    os.makedirs(work_dir, exist_ok=True)
+    report = {'environment': environment(), 'backend': args.backend, 'runs': args.runs, 'seed': args.seed, 'results': {}}
+    try:
+        for size in args.sizes:
+            print(f"{size:,} quotes ({args.backend}):", flush=True)
+            report['results'][str(size)] = benchmark_size(size, args.backend, work_dir, args.runs, args.seed)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
+    print(f"\nWrote {args.out}")
+
+    if baseline is not None and compare(baseline, report, args.threshold, args.min_delta_ms):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Generate quotes in bulk from a CSV of enquiries.
+
+The input needs customer_name, customer_address and service_key columns;
+customer_email is optional. service_key is a service ID from services.json (e.g.
+powerpoint_install) or line items with quantities, e.g.
+downlight_install*12;powerpoint_install*4. Rows are validated (addresses a
+chunk at a time), priced (a whole chunk in one vectorized pass) and rendered
+across a process pool, valid quotes are saved to the quote database in
+batches, and the output folder gets:
+
+    results.csv        one row per input row: Quote ID or the reason it was skipped,
+                       plus the Gmail and mailto links
+    letters/<ID>.txt   the quote letter for every saved quote
+
+    python bulk_quotes.py enquiries.csv --out bulk_output --workers 8
+"""
+import argparse
+import csv
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from quote_address import validate_addresses
+from quote_catalog import get_catalog
+from quote_core import (
+    check_quote_request, new_quote_record, quote_fields,
+    render_quote_letter, create_gmail_link, create_mailto_link
+)
+from quote_pricing import get_price_table, normalize_items
+
+INPUT_COLUMNS = ['customer_name', 'customer_address', 'service_key']
+RESULT_COLUMNS = [
+    'Line', 'Result', 'Quote_ID', 'Customer_Name', 'Customer_Email', 'Service', 'Price',
+    'Error', 'Letter_File', 'Gmail_Link', 'Mailto_Link',
+]
+
+# Rows handed to a worker at a time, and chunks allowed in flight per worker.
+# Together they bound how much of the input is held in memory.
+CHUNK_SIZE = 200
+CHUNKS_PER_WORKER = 2
+
+
+# Function to stream the input CSV in chunks
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Yields lists of (line number, row) without reading the whole file.
+    Raises ValueError if a required column is missing.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        missing = [c for c in INPUT_COLUMNS if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path} is missing column(s): {', '.join(missing)}")
+
+        chunk = []
+        for row in reader:
+            chunk.append((reader.line_num, row))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+# Function run in the worker processes
+def render_chunk(rows, now, catalog):
+    """
+    Validates and prices a chunk of rows against catalog and renders their
+    letters and links. Returns one result dict per row, in order.
+    """
+    today_date = now.strftime("%d %B %Y")
+    # Check the whole chunk's addresses in one go
+    addresses_valid = validate_addresses([row.get('customer_address') for _, row in rows])['valid'].tolist()
+    results, valid = [], []
+    for (line, row), address_valid in zip(rows, addresses_valid):
+        items = (row.get('service_key') or '').strip()
+        error = check_quote_request(row.get('customer_name'), row.get('customer_address'), items, address_valid, catalog)
+        if error:
+            results.append({'Line': line, 'Result': 'skipped', 'Error': error,
+                            'Customer_Name': row.get('customer_name') or ''})
+        else:
+            results.append(None)
+            valid.append((len(results) - 1, line, row, normalize_items(items, catalog.services)))
+
+    # Price every valid row's line items together
+    prices = get_price_table(catalog).price_many([items for *_, items in valid])
+    for (index, line, row, items), priced in zip(valid, prices):
+        name = row['customer_name'].strip()
+        email = (row.get('customer_email') or '').strip()
+        address = row['customer_address'].strip()
+        details = dict(customer_name=name, today_date=today_date, **quote_fields(priced, catalog))
+
+        results[index] = {
+            'Line': line,
+            'record': new_quote_record(name, email, address, details['service_name'], priced.total,
+                                       now=now, items=items, catalog=catalog),
+            'letter': render_quote_letter(customer_address=address, **details),
+            'Gmail_Link': create_gmail_link(customer_email=email, **details) if email else '',
+            'Mailto_Link': create_mailto_link(customer_email=email, **details) if email else '',
+        }
+    return results
+
+
+# Function to save a rendered chunk and write its output
+def write_chunk(results, store, lock_path, letters_dir, writer):
+    """
+    Saves the chunk's quotes in one batch, then writes their letters and result rows.
+    Returns (saved, skipped).
+    """
+    from quote_store import new_quote_id
+    from quote_writer import file_lock
+
+    quoted = [r for r in results if 'record' in r]
+    for result in quoted:
+        result['record']['Quote_ID'] = new_quote_id()
+    if quoted:
+        with file_lock(lock_path):
+            outcomes = store.write_batch([('save', r['record']) for r in quoted])
+        for result, outcome in zip(quoted, outcomes):
+            if isinstance(outcome, Exception):
+                result['Result'], result['Error'] = 'failed', str(outcome)
+
+    saved = 0
+    for result in results:
+        record = result.pop('record', None)
+        letter = result.pop('letter', None)
+        if record is not None:
+            result.update({
+                'Customer_Name': record['Customer_Name'],
+                'Customer_Email': record['Customer_Email'],
+                'Service': record['Service'],
+                'Price': f"{record['Price']:.2f}",
+            })
+        if record is not None and 'Result' not in result:
+            result['Result'] = 'saved'
+            result['Quote_ID'] = record['Quote_ID']
+            letter_file = os.path.join(letters_dir, f"{record['Quote_ID']}.txt")
+            with open(letter_file, 'w', encoding='utf-8') as f:
+                f.write(letter)
+            result['Letter_File'] = os.path.relpath(letter_file, os.path.dirname(letters_dir))
+            saved += 1
+        writer.writerow(result)
+    return saved, len(results) - saved
+
+
+# Function to run a whole bulk job
+def generate_quotes(input_path, out_dir, store, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Quotes every row of input_path into store, writing results to out_dir.
+    workers=0 renders in this process (handy for debugging).
+    Returns (saved, skipped).
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    letters_dir = os.path.join(out_dir, 'letters')
+    os.makedirs(letters_dir, exist_ok=True)
+    lock_path = f"{store.path}.lock"
+    now = datetime.now()
+    # Every row of the job is priced with the same catalog version
+    catalog = get_catalog()
+    saved = skipped = 0
+
+    with open(os.path.join(out_dir, 'results.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+
+        def write(results):
+            nonlocal saved, skipped
+            counts = write_chunk(results, store, lock_path, letters_dir, writer)
+            saved, skipped = saved + counts[0], skipped + counts[1]
+
+        if workers == 0:
+            for chunk in read_chunks(input_path, chunk_size):
+                write(render_chunk(chunk, now, catalog))
+            return saved, skipped
+
+        with ProcessPoolExecutor(workers) as pool:
+            # Keep a bounded window of chunks in flight and write them back in input order
+            pending = deque()
+            for chunk in read_chunks(input_path, chunk_size):
+                pending.append(pool.submit(render_chunk, chunk, now, catalog))
+                if len(pending) >= workers * CHUNKS_PER_WORKER:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    return saved, skipped
+
+
+def main():
+    from quote_store import STORE_BACKENDS
+
+    parser = argparse.ArgumentParser(description='Generate quotes in bulk from a CSV of enquiries')
+    parser.add_argument('input', help='CSV with customer_name, customer_email, customer_address, service_key (or key*qty;key*qty items)')
+    parser.add_argument('--out', default='bulk_output', help='Folder for results.csv and the letters')
+    parser.add_argument('--workers', type=int, default=None, help='Rendering processes (default: one per CPU, 0: none)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per worker task')
+    parser.add_argument('--backend', default=os.environ.get('QUOTE_STORE_BACKEND', 'csv'), choices=list(STORE_BACKENDS))
+    parser.add_argument('--path', default=None, help='Database file (defaults to quotes_database.csv/.db)')
+    args = parser.parse_args()
+
+    path = args.path or ('quotes_database.db' if args.backend == 'sqlite' else 'quotes_database.csv')
+    store = STORE_BACKENDS[args.backend](path)
+    store.init()
+
+    started = time.perf_counter()
+    try:
+        saved, skipped = generate_quotes(args.input, args.out, store, args.workers, args.chunk_size)
+    except (OSError, ValueError) as e:
+        parser.exit(1, f"{e}\n")
+    elapsed = time.perf_counter() - started
+
+    print(f"Saved {saved} quotes to {path}, skipped {skipped} rows ({elapsed:.2f}s, {(saved + skipped) / elapsed:.0f} rows/s)")
+    print(f"Results in {os.path.join(args.out, 'results.csv')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Measures how quickly the headless quote engine starts and answers requests.
+
+Reports the import time of quote_core (and checks it doesn't pull in pandas),
+how long quote_api.py takes to come up, and latency percentiles for creating
+quotes, looking them up by ID and listing a page of them. Runs against a
+throwaway database in a temporary folder.
+
+    python measure_api.py --backend csv --requests 300
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_PROBE = (
+    "import sys, time; started = time.perf_counter(); import quote_core; "
+    "print((time.perf_counter() - started) * 1000, 'pandas' in sys.modules)"
+)
+
+
+# Function to time a cold import of the engine
+def measure_import(runs):
+    """
+    Returns (median import time in ms, whether pandas got imported).
+    """
+    times, pandas_loaded = [], False
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=HERE, capture_output=True, text=True, check=True)
+        ms, loaded = output.stdout.split()
+        times.append(float(ms))
+        pandas_loaded = pandas_loaded or loaded == 'True'
+    return statistics.median(times), pandas_loaded
+
+
+# Function to find a free local port for the server
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# Function to send one request and time it
+def timed_request(conn, method, path, payload=None):
+    """
+    Returns (elapsed ms, status, parsed JSON body).
+    """
+    body = json.dumps(payload).encode() if payload is not None else None
+    headers = {'Content-Type': 'application/json'} if body else {}
+    started = time.perf_counter()
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    data = json.loads(response.read())
+    return (time.perf_counter() - started) * 1000, response.status, data
+
+
+# Function to summarize a list of latencies
+def percentiles(samples):
+    ordered = sorted(samples)
+
+    def at(p):
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+    return f"p50 {at(0.50):6.2f} ms   p95 {at(0.95):6.2f} ms   p99 {at(0.99):6.2f} ms   max {ordered[-1]:6.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure quote engine cold start and API latency')
+    parser.add_argument('--backend', default='csv', choices=['csv', 'sqlite'])
+    parser.add_argument('--requests', type=int, default=300, help='Requests per endpoint')
+    parser.add_argument('--import-runs', type=int, default=5)
+    args = parser.parse_args()
+
+    import_ms, pandas_loaded = measure_import(args.import_runs)
+    print(f"import quote_core: {import_ms:.1f} ms (median of {args.import_runs}), pandas loaded: {pandas_loaded}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        env = dict(os.environ, QUOTE_STORE_BACKEND=args.backend)
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, 'quote_api.py'), '--port', str(port)],
+            cwd=tmp, env=env, stdout=subprocess.DEVNULL,
+        )
+        try:
+            # Poll until the server answers
+            while True:
+                try:
+                    conn = http.client.HTTPConnection('127.0.0.1', port)
+                    timed_request(conn, 'GET', '/health')
+                    break
+                except OSError:
+                    if server.poll() is not None:
+                        raise SystemExit('quote_api.py exited before it started listening')
+                    time.sleep(0.01)
+            print(f"server ready:      {(time.perf_counter() - started) * 1000:.1f} ms after launch ({args.backend})")
+
+            quote = {
+                'customer_name': 'Jane Citizen',
+                'customer_email': 'jane@example.com',
+                'customer_address': '1 Surf Parade, Broadbeach QLD 4218',
+                'service_key': 'ceiling_fan_fitoff',
+            }
+            created, ids = [], []
+            for _ in range(args.requests):
+                ms, status, data = timed_request(conn, 'POST', '/quotes', quote)
+                if status != 201:
+                    raise SystemExit(f"POST /quotes failed: {status} {data}")
+                created.append(ms)
+                ids.append(data['quote']['Quote_ID'])
+
+            lookups = []
+            for quote_id in ids:
+                ms, status, _ = timed_request(conn, 'GET', f'/quotes/{quote_id}')
+                if status != 200:
+                    raise SystemExit(f"GET /quotes/{quote_id} failed: {status}")
+                lookups.append(ms)
+
+            pages = [timed_request(conn, 'GET', '/quotes?search=jane&limit=25')[0] for _ in range(args.requests)]
+
+            print(f"POST /quotes       {percentiles(created)}   (first {created[0]:.2f} ms)")
+            print(f"GET  /quotes/<id>  {percentiles(lookups)}   (first {lookups[0]:.2f} ms)")
+            print(f"GET  /quotes?...   {percentiles(pages)}   (first {pages[0]:.2f} ms)")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
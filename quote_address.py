@@ -0,0 +1,208 @@
+"""
+Australian address checks, for one address (the quote form) or a whole
+column at once (bulk imports, re-checking the quote history).
+
+An address needs a state/territory abbreviation or a 4-digit postcode.
+When it has a postcode (a 4-digit number ending the address, before any
+', Australia', or next to the state), the postcode must be an
+Australian one, and if a state is given too (the last abbreviation) the
+postcode has to belong to it. Postcodes are looked
+up offline in POSTCODE_STATES, expanded into a 10,000-byte table.
+
+Re-check every saved quote's address with:
+
+    python quote_address.py revalidate --backend csv
+"""
+import re
+
+# State and territory abbreviations, in bit order for the postcode table
+STATES = ['NSW', 'VIC', 'QLD', 'SA', 'WA', 'TAS', 'NT', 'ACT']
+STATE_BITS = {state: 1 << i for i, state in enumerate(STATES)}
+
+# Postcode ranges (inclusive) allocated to each state and territory by Australia Post
+POSTCODE_STATES = {
+    'NSW': [(1000, 2599), (2619, 2899), (2921, 2999)],
+    'ACT': [(200, 299), (2600, 2618), (2900, 2920)],
+    'VIC': [(3000, 3999), (8000, 8999)],
+    'QLD': [(4000, 4999), (9000, 9999)],
+    'SA': [(5000, 5999)],
+    'WA': [(6000, 6999)],
+    'TAS': [(7000, 7999)],
+    'NT': [(800, 999)],
+}
+
+# Towns near a border that use the neighbouring state's postcode
+SHARED_POSTCODES = {
+    872: ['NT', 'SA', 'WA'],
+    2406: ['NSW', 'QLD'],
+    2540: ['NSW', 'ACT'],
+    2611: ['ACT', 'NSW'],
+    2620: ['ACT', 'NSW'],
+    3585: ['VIC', 'NSW'],
+    3586: ['VIC', 'NSW'],
+    3644: ['VIC', 'NSW'],
+    3691: ['VIC', 'NSW'],
+    3707: ['VIC', 'NSW'],
+    4375: ['QLD', 'NSW'],
+    4377: ['QLD', 'NSW'],
+    4380: ['QLD', 'NSW'],
+    4383: ['QLD', 'NSW'],
+    4385: ['QLD', 'NSW'],
+}
+
+# Whole-word matches only, so 'SA' doesn't match inside 'CAESAR'.
+# The greedy .* makes each pattern capture the last match in the address.
+LAST_STATE_PATTERN = re.compile(r'.*\b(' + '|'.join(STATES) + r')\b', re.DOTALL | re.IGNORECASE)
+# A postcode ends the address (before any ', Australia') or sits next to the
+# state, so a 4-digit street number ('1234 Gold Coast Hwy') isn't taken for one
+END_POSTCODE_PATTERN = re.compile(r'\b(\d{4})\s*(?:,?\s*australia)?[\s.]*$', re.IGNORECASE)
+STATE_POSTCODE_PATTERN = re.compile(
+    r'.*(?:\b(?:' + '|'.join(STATES) + r')[\s,]*(\d{4})\b|\b(\d{4})[\s,]*(?:' + '|'.join(STATES) + r')\b)',
+    re.DOTALL | re.IGNORECASE,
+)
+NOT_BLANK_PATTERN = re.compile(r'\S')
+
+# Reasons an address is rejected
+PROBLEM_MISSING = 'No address'
+PROBLEM_NO_STATE_OR_POSTCODE = 'No state or 4-digit postcode'
+PROBLEM_UNKNOWN_POSTCODE = 'Not an Australian postcode'
+PROBLEM_STATE_MISMATCH = "Postcode doesn't match the state"
+
+_postcode_table = None
+
+
+# Function to build the postcode -> states table
+def postcode_table():
+    """
+    Returns a 10,000-byte table indexed by postcode, each byte a bitmask of
+    the states (STATE_BITS) using that postcode; 0 means not Australian.
+    Built on first use and shared afterwards.
+    """
+    global _postcode_table
+    if _postcode_table is None:
+        table = bytearray(10000)
+        for state, ranges in POSTCODE_STATES.items():
+            for first, last in ranges:
+                table[first:last + 1] = bytes([STATE_BITS[state]]) * (last - first + 1)
+        for postcode, states in SHARED_POSTCODES.items():
+            table[postcode] = sum(STATE_BITS[state] for state in states)
+        _postcode_table = bytes(table)
+    return _postcode_table
+
+
+# Function to name the states in a bitmask
+def states_in(mask):
+    return [state for state in STATES if mask & STATE_BITS[state]]
+
+
+# Function to find the postcode of one address
+def find_postcode(address):
+    """
+    Returns the postcode (an int) at the end of address or next to its state,
+    or None if it has none.
+    """
+    match = END_POSTCODE_PATTERN.search(address) or STATE_POSTCODE_PATTERN.match(address)
+    if not match:
+        return None
+    return int(match.group(1) or match.group(2))
+
+
+# Function to check one address
+def address_problem(address):
+    """
+    Returns why address isn't a valid Australian address, or None if it is.
+    """
+    if not isinstance(address, str) or not address.strip():
+        return PROBLEM_MISSING
+    state = LAST_STATE_PATTERN.match(address)
+    state_mask = STATE_BITS[state.group(1).upper()] if state else 0
+    postcode = find_postcode(address)
+    if postcode is None:
+        return None if state_mask else PROBLEM_NO_STATE_OR_POSTCODE
+
+    postcode_mask = postcode_table()[postcode]
+    if not postcode_mask:
+        return PROBLEM_UNKNOWN_POSTCODE
+    if state_mask and not state_mask & postcode_mask:
+        return PROBLEM_STATE_MISMATCH
+    return None
+
+
+# Function to pull the last state and the postcode out of one address
+def _state_and_postcode(address):
+    state = LAST_STATE_PATTERN.match(address)
+    postcode = find_postcode(address)
+    return (
+        STATE_BITS[state.group(1).upper()] if state else 0,
+        postcode if postcode is not None else -1,
+    )
+
+
+# Function to check a whole column of addresses at once
+def validate_addresses(addresses):
+    """
+    Checks a pandas Series (or any sequence) of addresses in bulk. Each distinct
+    address is matched once with the precompiled patterns; the postcode lookup
+    and the rules themselves are NumPy array operations over the whole column.
+    Returns a DataFrame on the same index with columns:
+    valid (bool), postcode ('' if none) and problem ('' when valid).
+    """
+    import numpy as np
+    import pandas as pd
+
+    addresses = pd.Series(addresses, dtype=object)
+    text = addresses.where(addresses.map(lambda a: isinstance(a, str) and bool(NOT_BLANK_PATTERN.search(a))))
+    codes, uniques = pd.factorize(text)
+
+    found = np.array([_state_and_postcode(a) for a in uniques], dtype=np.int64).reshape(-1, 2)
+    state_mask = found[:, 0].astype(np.uint8)
+    postcode = found[:, 1]
+    has_postcode = postcode >= 0
+    table = np.frombuffer(postcode_table(), dtype=np.uint8)
+    postcode_mask = np.where(has_postcode, table[np.clip(postcode, 0, 9999)], 0).astype(np.uint8)
+
+    no_state_or_postcode = (state_mask == 0) & ~has_postcode
+    unknown_postcode = has_postcode & (postcode_mask == 0)
+    mismatch = has_postcode & ~unknown_postcode & (state_mask != 0) & ((state_mask & postcode_mask) == 0)
+    problems = np.select(
+        [no_state_or_postcode, unknown_postcode, mismatch],
+        [PROBLEM_NO_STATE_OR_POSTCODE, PROBLEM_UNKNOWN_POSTCODE, PROBLEM_STATE_MISMATCH],
+        default='',
+    ).astype(object)
+    postcodes = np.array([f"{p:04d}" if p >= 0 else '' for p in postcode], dtype=object)
+
+    # Blank or missing addresses have code -1; give them the extra last slot
+    problems = np.append(problems, PROBLEM_MISSING)[codes]
+    postcodes = np.append(postcodes, '')[codes]
+    return pd.DataFrame({'valid': problems == '', 'postcode': postcodes, 'problem': problems}, index=addresses.index)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from quote_store import STORE_BACKENDS
+
+    parser = argparse.ArgumentParser(description='Australian address checks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    revalidate_parser = subparsers.add_parser('revalidate', help='Re-check the address of every saved quote')
+    revalidate_parser.add_argument('--backend', default='csv', choices=list(STORE_BACKENDS), help='Storage backend')
+    revalidate_parser.add_argument('--path', default=None, help='Database file (defaults to quotes_database.csv/.db)')
+    revalidate_parser.add_argument('--report', default=None, help='Write the invalid quotes to this CSV file')
+    args = parser.parse_args()
+
+    path = args.path or ('quotes_database.db' if args.backend == 'sqlite' else 'quotes_database.csv')
+    store = STORE_BACKENDS[args.backend](path)
+    store.init()
+    df = store.load_quotes()
+    checked = validate_addresses(df['Customer_Address'])
+    is_invalid = ~checked['valid']
+    invalid = df.loc[is_invalid, ['Quote_ID', 'Customer_Name', 'Customer_Address']].assign(Problem=checked.loc[is_invalid, 'problem'])
+
+    print(f"Checked {len(df)} addresses in {path}: {len(invalid)} invalid")
+    for problem, count in invalid['Problem'].value_counts().items():
+        print(f"  {problem}: {count}")
+    if args.report:
+        invalid.to_csv(args.report, index=False)
+        print(f"Wrote {args.report}")
+    if len(invalid):
+        parser.exit(1)
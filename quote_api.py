@@ -0,0 +1,326 @@
+"""
+Local HTTP/JSON API over the quote engine, for other tools to create and look
+up quotes without going through the Streamlit form.
+
+    python quote_api.py --port 8765
+
+    GET  /health                liveness check
+    GET  /services              the services catalog {"version", "services": [{"id", ...}]}
+    POST /quotes                {"customer_name", "customer_email", "customer_address", "service_key"}
+                                or, for several services, "items" instead of "service_key":
+                                [{"service_key", "quantity"}, ...] or "key*qty;key*qty";
+                                optional "customer_phone" (kept in the customer registry)
+                                -> 201 {"quote", "letter", "gmail_link", "mailto_link"}
+    GET  /quotes/<quote_id>     one quote, or 404
+    GET  /quotes?search=&sort=created&descending=1&offset=0&limit=25&start=&end=&archived=1&status=
+                                -> {"total", "quotes"} (start/end: YYYY-MM-DD, inclusive;
+                                archived=0 leaves out archived Won/Lost quotes;
+                                status=Won,Lost keeps only those statuses)
+    GET  /quotes/export?format=csv&search=&start=&end=&archived=1&status=
+                                every matching quote as a CSV or XLSX download,
+                                streamed in chunks (Transfer-Encoding: chunked)
+    GET  /customers?q=smi&limit=8
+                                returning customers whose name, email or phone starts with q
+    GET  /customers/<customer_id>
+                                one customer, or 404
+    GET  /stats?start=&end=     per-status counts and values
+    GET  /trends?period=month&start=&end=
+                                quotes, quoted and won value and win rate per day/month/year
+    GET  /metrics               request, store and app timings as Prometheus text
+
+Uses the same storage backend and files as the app (QUOTE_STORE_BACKEND).
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import quote_core
+from quote_catalog import get_catalog
+from quote_customers import MAX_SUGGESTIONS, get_customer_registry
+from quote_export import EXPORT_FORMATS, export_file_name, export_quotes
+from quote_metrics import API_REQUEST_METRIC, render_prometheus, start_metrics_file, timed
+from quote_rollups import trend_frame
+from quote_store import QUOTE_COLUMNS
+from quote_templates import preload_templates
+
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = 64 * 1024
+MAX_PAGE_SIZE = 500
+
+# Paths timed under their own route label; anything else is 'other'
+KNOWN_ROUTES = {'health', 'services', 'stats', 'trends', 'metrics', 'quotes', 'customers'}
+
+# Most customers returned by one autocomplete request
+MAX_CUSTOMER_SUGGESTIONS = 50
+
+
+# Function to turn a page of quotes into JSON-ready dicts
+def _page_records(df):
+    records = []
+    for row in df[QUOTE_COLUMNS].itertuples(index=False):
+        record = {column: (value if isinstance(value, str) else '') for column, value in zip(QUOTE_COLUMNS, row)}
+        record['Price'] = float(row[QUOTE_COLUMNS.index('Price')])
+        records.append(record)
+    return records
+
+
+# Function to read one query string parameter
+def _param(query, name, default=None):
+    return query.get(name, [default])[0]
+
+
+# Function to read the status filter parameter
+def _statuses_param(query):
+    """
+    Returns the statuses named in status= (comma-separated or repeated), or None for no filter.
+    """
+    values = [status.strip() for value in query.get('status', []) for status in value.split(',') if status.strip()]
+    return values or None
+
+
+# Function to name the route of a request path for metrics labels
+def _route(path):
+    """
+    Returns e.g. '/quotes' or '/quotes/{id}', so per-quote paths share one label.
+    """
+    parts = [p for p in urlsplit(path).path.split('/') if p]
+    if not parts or parts[0] not in KNOWN_ROUTES or len(parts) > 2:
+        return 'other'
+    if parts == ['quotes', 'export']:
+        return '/quotes/export'
+    return f"/{parts[0]}" + ('/{id}' if len(parts) == 2 else '')
+
+
+class QuoteAPIHandler(BaseHTTPRequestHandler):
+    # Keep connections open between requests (every response sets Content-Length)
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without TCP_NODELAY every
+    # response would wait out the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+    server_version = 'QuoteAPI/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status, text, content_type='text/plain; charset=utf-8'):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, {'error': message})
+
+    def _read_json(self):
+        """
+        Returns the request body parsed as a JSON object, or None after sending a 400/413.
+        """
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._error(400, 'Invalid Content-Length')
+            return None
+        if length > MAX_BODY_BYTES:
+            self._error(413, f"Request body is larger than {MAX_BODY_BYTES} bytes")
+            return None
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._error(400, 'Request body is not valid JSON')
+            return None
+        if not isinstance(payload, dict):
+            self._error(400, 'Request body must be a JSON object')
+            return None
+        return payload
+
+    def do_GET(self):
+        with timed(API_REQUEST_METRIC, method='GET', route=_route(self.path)):
+            self._get()
+
+    def do_POST(self):
+        with timed(API_REQUEST_METRIC, method='POST', route=_route(self.path)):
+            self._post()
+
+    def _get(self):
+        url = urlsplit(self.path)
+        parts = [p for p in url.path.split('/') if p]
+
+        if parts == ['health']:
+            self._send(200, {'ok': True})
+        elif parts == ['services']:
+            self._send(200, get_catalog().to_json())
+        elif parts == ['metrics']:
+            self._send_text(200, render_prometheus(), 'text/plain; version=0.0.4; charset=utf-8')
+        elif parts == ['stats']:
+            query = parse_qs(url.query)
+            try:
+                summary = quote_core.get_quote_store().status_summary(_param(query, 'start'), _param(query, 'end'))
+            except ValueError as e:
+                self._error(400, str(e))
+                return
+            self._send(200, summary)
+        elif parts == ['trends']:
+            self._trends(parse_qs(url.query))
+        elif parts == ['quotes']:
+            self._list_quotes(parse_qs(url.query))
+        elif parts == ['quotes', 'export']:
+            self._export_quotes(parse_qs(url.query))
+        elif parts == ['customers']:
+            query = parse_qs(url.query)
+            try:
+                limit = min(max(int(_param(query, 'limit', MAX_SUGGESTIONS)), 1), MAX_CUSTOMER_SUGGESTIONS)
+            except ValueError as e:
+                self._error(400, str(e))
+                return
+            self._send(200, {'customers': get_customer_registry().suggest(_param(query, 'q', ''), limit)})
+        elif len(parts) == 2 and parts[0] == 'customers':
+            customer = get_customer_registry().get(parts[1])
+            if customer is None:
+                self._error(404, f"No customer with ID {parts[1]}")
+            else:
+                self._send(200, customer)
+        elif len(parts) == 2 and parts[0] == 'quotes':
+            quote = quote_core.get_quote(parts[1])
+            if quote is None:
+                self._error(404, f"No quote with ID {parts[1]}")
+            else:
+                self._send(200, quote)
+        else:
+            self._error(404, f"Unknown path {url.path}")
+
+    def _list_quotes(self, query):
+        try:
+            offset = max(int(_param(query, 'offset', 0)), 0)
+            limit = min(max(int(_param(query, 'limit', 25)), 1), MAX_PAGE_SIZE)
+            descending = _param(query, 'descending', '1') not in ('0', 'false', 'no')
+            include_archived = _param(query, 'archived', '1') not in ('0', 'false', 'no')
+            page, total = quote_core.get_quote_store().query_page(
+                _param(query, 'search', ''), _param(query, 'sort', 'created'), descending, offset, limit,
+                start=_param(query, 'start'), end=_param(query, 'end'), include_archived=include_archived,
+                statuses=_statuses_param(query),
+            )
+        except ValueError as e:
+            self._error(400, str(e))
+            return
+        self._send(200, {'total': total, 'offset': offset, 'quotes': _page_records(page)})
+
+    def _export_quotes(self, query):
+        """
+        Sends the export as it is written, one HTTP chunk per piece, so the
+        server never holds the whole file.
+        """
+        file_format = _param(query, 'format', 'csv')
+        try:
+            file_name = export_file_name(file_format)
+            chunks = export_quotes(
+                quote_core.get_quote_store(), file_format, _param(query, 'search', ''),
+                _param(query, 'start'), _param(query, 'end'),
+                include_archived=_param(query, 'archived', '1') not in ('0', 'false', 'no'),
+                statuses=_statuses_param(query),
+            )
+        except ValueError as e:
+            self._error(400, str(e))
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', EXPORT_FORMATS[file_format][0])
+        self.send_header('Content-Disposition', f'attachment; filename="{file_name}"')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        # A failure from here on drops the connection before the final empty
+        # chunk, which tells the client the download is incomplete
+        try:
+            for chunk in chunks:
+                if chunk:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+        except OSError:
+            # The client went away mid-download
+            self.close_connection = True
+
+    def _trends(self, query):
+        try:
+            daily = quote_core.get_quote_store().daily_summary(_param(query, 'start'), _param(query, 'end'))
+            trends = trend_frame(daily, _param(query, 'period', 'month'))
+        except ValueError as e:
+            self._error(400, str(e))
+            return
+        rows = [
+            {'period': period, **{column: (None if value != value else value) for column, value in row.items()}}
+            for period, row in zip(trends.index, trends.to_dict('records'))
+        ]
+        self._send(200, {'trends': rows})
+
+    def _post(self):
+        if urlsplit(self.path).path.rstrip('/') != '/quotes':
+            self._error(404, f"Unknown path {self.path}")
+            return
+        payload = self._read_json()
+        if payload is None:
+            return
+        try:
+            created = quote_core.create_quote(
+                payload.get('customer_name'),
+                payload.get('customer_email'),
+                payload.get('customer_address'),
+                payload['items'] if 'items' in payload else payload.get('service_key'),
+                customer_phone=payload.get('customer_phone') or '',
+            )
+        except ValueError as e:
+            self._error(400, str(e))
+            return
+        self._send(201, created)
+
+
+# Function to start the API server
+def make_server(host='127.0.0.1', port=8765, verbose=False):
+    """
+    Opens the database, loads the services catalog, compiles the templates
+    and returns a server ready for serve_forever(). Also starts writing the
+    metrics file if QUOTE_METRICS_FILE is set.
+    """
+    start_metrics_file()
+    quote_core.init_database()
+    get_catalog()
+    preload_templates()
+    server = ThreadingHTTPServer((host, port), QuoteAPIHandler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    return server
+
+
+def main():
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(description='Serve the quote engine as a local HTTP/JSON API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.verbose)
+    print(f"Quote API listening on http://{args.host}:{server.server_address[1]} "
+          f"(ready in {(time.perf_counter() - started) * 1000:.0f} ms)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Cold archive for closed quotes.
+
+Won and Lost quotes from before the current month are rarely looked at again,
+so the CSV backend moves them out of quotes_database.csv (the hot file the
+history tab reads on every rerun) into gzip-compressed monthly partitions:
+
+    quotes_database_archive/
+        2024-03.csv.gz      closed quotes created in March 2024
+        ...
+        manifest.json       {"archived_before": "2025-06", "partitions": {"2024-03": 812, ...}}
+
+The partitions are only read when something asks for archived quotes (the
+all-time history view, a recount, or a status change on an archived quote),
+and the parsed result is kept until a partition changes.
+"""
+import gzip
+import json
+import os
+import threading
+
+from quote_rollups import day_key
+
+# Statuses of closed quotes, which are moved to the archive
+ARCHIVE_STATUSES = ['Won', 'Lost']
+
+PARTITION_SUFFIX = '.csv.gz'
+MANIFEST_FILE = 'manifest.json'
+
+
+# Function to get the month key ('YYYY-MM') of each row's Date
+def month_keys(dates):
+    """
+    Returns a str Series of 'YYYY-MM' ('' for dates that don't parse).
+    Only the distinct dates are converted.
+    """
+    import numpy as np
+    import pandas as pd
+
+    dates = dates.astype('category')
+    months = np.array([day_key(d)[:7] for d in dates.cat.categories] + [''], dtype=object)
+    # Code -1 (a missing date) picks the trailing ''
+    return pd.Series(months[dates.cat.codes.to_numpy()], index=dates.index, dtype=str)
+
+
+# Monthly gzip partitions of archived quotes, loaded lazily
+class QuoteArchive:
+    """
+    Reads and writes the archive folder. frame() parses every partition once
+    and keeps the result (with a Quote_ID index for lookups) until one of the
+    partition files changes, so the hot path never pays for it.
+    """
+
+    def __init__(self, path, columns, read_kwargs=None, prepare=None):
+        self.path = path
+        self.columns = list(columns)
+        self.read_kwargs = read_kwargs or {}
+        self.prepare = prepare
+        self.lock = threading.Lock()
+        # Bumped whenever the loaded frame is replaced
+        self.generation = 0
+        self._key = None
+        self._frame = None
+        self._ids = None
+
+    def _partition_path(self, month):
+        return os.path.join(self.path, f"{month}{PARTITION_SUFFIX}")
+
+    def months(self):
+        """
+        Returns the months that have a partition, oldest first.
+        """
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len(PARTITION_SUFFIX)] for name in names if name.endswith(PARTITION_SUFFIX))
+
+    def manifest(self):
+        """
+        Returns {'archived_before': 'YYYY-MM' or '', 'partitions': {month: rows}}.
+        """
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILE), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            manifest = {}
+        return {'archived_before': manifest.get('archived_before', ''), 'partitions': manifest.get('partitions', {})}
+
+    def write_manifest(self, archived_before, partitions):
+        os.makedirs(self.path, exist_ok=True)
+        path = os.path.join(self.path, MANIFEST_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'archived_before': archived_before, 'partitions': dict(sorted(partitions.items()))}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def read_partition(self, month):
+        """
+        Returns one month's archived quotes as plain text columns (empty if none).
+        """
+        import pandas as pd
+
+        path = self._partition_path(month)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=self.columns)
+        df = pd.read_csv(path, compression='gzip', **self.read_kwargs)
+        return df.reindex(columns=self.columns)
+
+    def write_partition(self, month, df):
+        """
+        Atomically replaces one month's partition with df (removing it if df is empty).
+        """
+        path = self._partition_path(month)
+        if df.empty:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as raw:
+            # mtime=0 keeps the bytes the same for the same rows
+            with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                f.write(df.reindex(columns=self.columns).to_csv(index=False, lineterminator='\n').encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+
+    def _stat_key(self):
+        key = []
+        for month in self.months():
+            try:
+                stat = os.stat(self._partition_path(month))
+            except FileNotFoundError:
+                continue
+            key.append((month, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        return tuple(key)
+
+    def frame(self):
+        """
+        Returns (df, ids): every archived quote, oldest month first, and a
+        pandas Index of their Quote_IDs. Parsed on first use and again only
+        after a partition changed. Don't modify the returned frame.
+        """
+        import pandas as pd
+
+        from quote_snapshot import concat_frames
+
+        with self.lock:
+            key = self._stat_key()
+            if key != self._key or self._frame is None:
+                frames = []
+                for month, *_ in key:
+                    df = self.read_partition(month)
+                    frames.append(self.prepare(df) if self.prepare else df)
+                if frames:
+                    df = concat_frames(frames).reset_index(drop=True)
+                else:
+                    df = pd.DataFrame(columns=self.columns)
+                    df = self.prepare(df) if self.prepare else df
+                self._frame = df
+                self._ids = pd.Index(df['Quote_ID'].astype(str))
+                self._key = key
+                self.generation += 1
+            return self._frame, self._ids
+
+    def loaded(self):
+        """
+        Returns True if the archive has been parsed in this process.
+        """
+        return self._frame is not None
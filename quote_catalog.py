@@ -0,0 +1,304 @@
+"""
+The services catalog, loaded from services.json instead of being hard-coded.
+
+services.json holds a version number and the list of services, each with a
+permanent id (e.g. powerpoint_install), name, GST-inclusive price and
+description. Bump "version" whenever prices or services change: quotes
+record the catalog version they were priced with, and every version is kept
+in catalog_versions/ so an old quote's price can always be worked out again.
+
+The file is re-read when its mtime changes, so edits show up in a running
+app or API server without a restart. An edit that can't be loaded (bad JSON,
+or changed services under the same version) is logged and the last good
+catalog stays in use until the file is fixed.
+
+Check that every saved quote still reprices to its stored total with:
+
+    python quote_catalog.py verify --backend csv
+"""
+import json
+import logging
+import os
+import threading
+
+# The catalog file and the folder of every version it has had
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'services.json')
+CATALOG_VERSIONS_DIR = 'catalog_versions'
+
+SERVICE_FIELDS = ['name', 'price', 'description']
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogError(ValueError):
+    """
+    Raised when a catalog file is missing or malformed, or a version was
+    changed without bumping its number.
+    """
+
+
+# One version of the services catalog with its lookup indexes
+class ServiceCatalog:
+    """
+    services maps service ID -> {'name', 'price', 'description'} in file
+    order (the same shape the rest of the app uses), and by_name maps each
+    service name back to its ID. Both are built once per version, so finding
+    a stored quote's service is a dict lookup rather than a scan.
+    """
+
+    def __init__(self, version, services, path=None, mtime_ns=None):
+        self.version = version
+        self.services = services
+        self.by_name = {service['name']: service_id for service_id, service in services.items()}
+        self.path = path
+        self.mtime_ns = mtime_ns
+
+    def service(self, service_id):
+        """
+        Returns the service with this ID, or None.
+        """
+        return self.services.get(service_id)
+
+    def service_id_for_name(self, name):
+        """
+        Returns the ID of the service with this name (quotes saved before
+        they recorded IDs), or None.
+        """
+        return self.by_name.get(name)
+
+    def to_json(self):
+        return {
+            'version': self.version,
+            'services': [{'id': service_id, **service} for service_id, service in self.services.items()],
+        }
+
+
+# Function to check and index the contents of a catalog file
+def parse_catalog(data, path=None, mtime_ns=None):
+    """
+    Returns a ServiceCatalog for the parsed JSON data.
+    Raises CatalogError if anything is missing, duplicated or of the wrong type.
+    """
+    where = path or 'catalog'
+    if not isinstance(data, dict) or not isinstance(data.get('services'), list):
+        raise CatalogError(f"{where} needs a \"version\" and a list of \"services\"")
+    version = data.get('version')
+    if isinstance(version, bool) or not isinstance(version, int) or version < 1:
+        raise CatalogError(f"{where}: version must be a whole number from 1 up")
+
+    services, names = {}, set()
+    for entry in data['services']:
+        service_id = entry.get('id') if isinstance(entry, dict) else None
+        if not isinstance(service_id, str) or not service_id:
+            raise CatalogError(f"{where}: every service needs an \"id\"")
+        if service_id in services:
+            raise CatalogError(f"{where}: service id '{service_id}' is used twice")
+        missing = [field for field in SERVICE_FIELDS if field not in entry]
+        if missing:
+            raise CatalogError(f"{where}: service '{service_id}' is missing {', '.join(missing)}")
+        price = entry['price']
+        if isinstance(price, bool) or not isinstance(price, (int, float)) or price < 0:
+            raise CatalogError(f"{where}: price of '{service_id}' must be a number of dollars")
+        if entry['name'] in names:
+            raise CatalogError(f"{where}: service name '{entry['name']}' is used twice")
+        names.add(entry['name'])
+        services[service_id] = {'name': entry['name'], 'price': float(price), 'description': entry['description']}
+    if not services:
+        raise CatalogError(f"{where} has no services")
+    return ServiceCatalog(version, services, path, mtime_ns)
+
+
+# Function to read a catalog file
+def load_catalog(path=CATALOG_FILE):
+    """
+    Reads and checks a catalog file. Raises CatalogError if it can't be used.
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        raise CatalogError(f"Catalog file {path} not found") from None
+    except ValueError as e:
+        raise CatalogError(f"{path} is not valid JSON: {e}") from None
+    return parse_catalog(data, path, mtime_ns)
+
+
+# Function to find where a catalog version is kept
+def version_path(version, path=CATALOG_FILE):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(path), CATALOG_VERSIONS_DIR, f"{stem}_v{version}.json")
+
+
+# Function to keep a copy of every catalog version
+def _archive(catalog):
+    """
+    Writes catalog_versions/<name>_v<version>.json the first time a version is
+    loaded. Raises CatalogError if that version was archived with different
+    services, i.e. the catalog was edited without bumping its version.
+    """
+    archive_path = version_path(catalog.version, catalog.path)
+    try:
+        archived = load_catalog(archive_path)
+    except CatalogError:
+        if os.path.exists(archive_path):
+            raise
+        archived = None
+    if archived is not None:
+        if archived.services != catalog.services:
+            raise CatalogError(
+                f"{catalog.path} changed but is still version {catalog.version}; "
+                f"bump the version so quotes priced with the old one stay reproducible"
+            )
+        return
+
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    tmp_path = f"{archive_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog.to_json(), f, indent=4, ensure_ascii=False)
+        f.write('\n')
+    os.replace(tmp_path, archive_path)
+
+
+# The current catalog per file, and every version loaded so far
+_catalogs = {}
+_versions = {}
+# mtime of a file version that failed to load, so it isn't parsed again on every call
+_failed_mtimes = {}
+_catalogs_lock = threading.Lock()
+
+
+def _needs_load(path, catalog):
+    """
+    Returns True if there is no catalog yet, or the file changed since it
+    was loaded and the change isn't one that already failed to load.
+    """
+    if catalog is None:
+        return True
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime_ns = None
+    return mtime_ns != catalog.mtime_ns and mtime_ns != _failed_mtimes.get(path, catalog.mtime_ns)
+
+
+# Function to get the current catalog
+def get_catalog(path=CATALOG_FILE):
+    """
+    Returns the current catalog, loading it on first use and again whenever
+    the file's mtime changes. Callers should hold on to the returned object
+    for one request or rerun so everything in it uses the same version.
+    If a changed file can't be loaded, the error is logged and the last good
+    catalog is returned; CatalogError is only raised when there is none.
+    """
+    catalog = _catalogs.get(path)
+    if _needs_load(path, catalog):
+        with _catalogs_lock:
+            catalog = _catalogs.get(path)
+            if _needs_load(path, catalog):
+                try:
+                    mtime_ns = os.stat(path).st_mtime_ns
+                except FileNotFoundError:
+                    mtime_ns = None
+                try:
+                    loaded = load_catalog(path)
+                    _archive(loaded)
+                except CatalogError as e:
+                    if catalog is None:
+                        raise
+                    _failed_mtimes[path] = mtime_ns
+                    logger.error("Still using services catalog version %s: %s", catalog.version, e)
+                    return catalog
+                _failed_mtimes.pop(path, None)
+                catalog = _catalogs[path] = loaded
+                _versions[(path, catalog.version)] = catalog
+    return catalog
+
+
+# Function to get an earlier version of the catalog
+def get_catalog_version(version, path=CATALOG_FILE):
+    """
+    Returns the catalog as it was at the given version (kept in
+    catalog_versions/). Raises CatalogError if that version isn't known.
+    """
+    version = int(version)
+    key = (path, version)
+    catalog = _versions.get(key)
+    if catalog is None:
+        current = get_catalog(path)
+        if current.version == version:
+            return current
+        with _catalogs_lock:
+            catalog = _versions.get(key)
+            if catalog is None:
+                catalog = load_catalog(version_path(version, path))
+                if catalog.version != version:
+                    raise CatalogError(f"{catalog.path} holds version {catalog.version}, not {version}")
+                _versions[key] = catalog
+    return catalog
+
+
+# Function to work out which services and catalog version a stored quote used
+def quote_catalog(record, path=CATALOG_FILE):
+    """
+    Returns (catalog, items) for a stored quote: the catalog version it was
+    priced with and its (service ID, quantity) lines. Quotes saved before
+    line items or versions were recorded fall back to version 1 and a lookup
+    of their Service name. Returns (catalog, []) if the service is unknown.
+    """
+    from quote_pricing import parse_items
+
+    version = record.get('Catalog_Version') or 1
+    catalog = get_catalog_version(version, path)
+    items = parse_items(record.get('Items'))
+    if not items:
+        service_id = record.get('Service_ID') or catalog.service_id_for_name(record.get('Service'))
+        items = [(service_id, 1)] if service_id else []
+    return catalog, items
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from quote_pricing import get_price_table
+    from quote_store import STORE_BACKENDS, _row_to_record
+
+    parser = argparse.ArgumentParser(description='Services catalog tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('show', help='Print the current catalog version and services')
+    verify_parser = subparsers.add_parser('verify', help='Reprice every saved quote from its catalog version')
+    verify_parser.add_argument('--backend', default='csv', choices=list(STORE_BACKENDS), help='Storage backend')
+    verify_parser.add_argument('--path', default=None, help='Database file (defaults to quotes_database.csv/.db)')
+    args = parser.parse_args()
+
+    try:
+        current = get_catalog()
+    except CatalogError as e:
+        parser.exit(1, f"{e}\n")
+
+    if args.command == 'show':
+        print(f"Catalog version {current.version} ({len(current.services)} services)")
+        for service_id, service in current.services.items():
+            print(f"  {service_id:<30} ${service['price']:>9,.2f}  {service['name']}")
+    elif args.command == 'verify':
+        path = args.path or ('quotes_database.db' if args.backend == 'sqlite' else 'quotes_database.csv')
+        store = STORE_BACKENDS[args.backend](path)
+        store.init()
+        checked = mismatched = unknown = 0
+        for row in store.load_quotes().to_dict('records'):
+            record = _row_to_record(row)
+            checked += 1
+            try:
+                catalog, items = quote_catalog(record)
+                total = get_price_table(catalog).price_items(items).total if items else None
+            except (CatalogError, KeyError, ValueError):
+                total = None
+            if total is None:
+                unknown += 1
+                print(f"  {record['Quote_ID']}: can't find its services in the catalog")
+            elif abs(total - record['Price']) >= 0.005:
+                mismatched += 1
+                print(f"  {record['Quote_ID']}: stored ${record['Price']:,.2f}, reprices to ${total:,.2f}")
+        print(f"Checked {checked} quotes in {path}: {mismatched} priced differently, {unknown} unknown")
+        if mismatched or unknown:
+            parser.exit(1)
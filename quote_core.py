@@ -0,0 +1,348 @@
+"""
+The quote engine without the Streamlit UI: services (from services.json),
+validation, rendering and storage. Importing it is cheap and has no side effects; pandas is only
+loaded once quotes are actually read, and no file is touched until a
+function that needs one is called.
+"""
+from datetime import datetime
+import os
+
+from quote_address import address_problem
+from quote_catalog import get_catalog, quote_catalog
+from quote_customers import get_customer_registry
+from quote_pricing import format_items, get_price_table, normalize_items
+from quote_store import open_store
+from quote_templates import get_template
+from quote_writer import get_write_queue
+
+# Database file paths
+CSV_FILE = 'quotes_database.csv'
+DB_FILE = 'quotes_database.db'
+
+# Storage backend: 'csv' (quotes_database.csv) or 'sqlite' (indexed quotes_database.db)
+# Move existing CSV quotes into SQLite with: python quote_store.py migrate
+STORE_BACKEND = os.environ.get('QUOTE_STORE_BACKEND', 'csv')
+
+# Services named in a multi-line quote's summary before it says "N more"
+SUMMARY_SERVICES = 3
+
+# Function to get the services catalog
+def get_services(catalog=None):
+    """
+    Returns the electrical services with pricing and descriptions (prices
+    include GST) as {service ID: {'name', 'price', 'description'}}, from
+    services.json. Picks up edits to the file without a restart.
+    """
+    return (catalog or get_catalog()).services
+
+# Function to validate Australian address
+def validate_australian_address(address):
+    """
+    Validates if the address appears to be an Australian address.
+    Needs a state abbreviation or a 4-digit postcode; a postcode must be an
+    Australian one and belong to the state given (see quote_address).
+    """
+    return address_problem(address) is None
+
+# Function to build the record for a new quote
+def new_quote_record(customer_name, customer_email, customer_address, service_name, price, now=None, items=None, catalog=None,
+                     customer_id='', customer_version=''):
+    """
+    Returns the quote record as it is written to the quote database.
+    Each quote gets a timestamp and a default status of 'Sent'; the store
+    gives it a Quote ID if it doesn't already have one. items are the quote's
+    (service ID, quantity) lines, with price their GST-inclusive total from
+    catalog (the current one by default), whose version is recorded with them.
+    customer_id links the quote to the customer registry, and customer_version
+    (see CustomerRegistry.register_versioned) to the details it holds for them.
+    """
+    # Get current date and time
+    now = now or datetime.now()
+    if items:
+        catalog = catalog or get_catalog()
+    return {
+        'Date': now.strftime("%d/%m/%Y"),
+        'Time': now.strftime("%H:%M:%S"),
+        'Customer_Name': customer_name,
+        'Customer_Email': customer_email if customer_email else '',
+        'Customer_Address': customer_address,
+        'Service': service_name,
+        'Price': price,
+        'Status': 'Sent',
+        'Items': format_items(items) if items else '',
+        'Service_ID': items[0][0] if items and len(items) == 1 else '',
+        'Catalog_Version': str(catalog.version) if items else '',
+        'Customer_ID': customer_id or '',
+        'Customer_Version': customer_version if customer_id else ''
+    }
+
+# Function to get the configured quote store
+def get_quote_store():
+    """
+    Returns the shared store for the configured backend.
+    The same store object is reused across reruns and sessions.
+    """
+    path = DB_FILE if STORE_BACKEND == 'sqlite' else CSV_FILE
+    return open_store(STORE_BACKEND, path)
+
+# Function to initialize the quote database
+def init_database():
+    """
+    Creates the quote database if it doesn't exist.
+    This ensures the app won't crash when trying to read quotes on first run.
+    """
+    get_quote_store().init()
+        
+# Function to save quote to the database
+def save_quote(customer_name, customer_email, customer_address, service_name, price, items=None, catalog=None, customer_phone=''):
+    """
+    Appends a new quote record to the quote database.
+    Each quote gets a timestamp, a permanent Quote ID and default status of 'Sent'.
+    Only the new record is written, so saving stays fast as the history grows.
+    The customer is registered (or their details updated) in the customer
+    registry first, and the quote records their Customer_ID (and which
+    version of their details it was made with, see new_quote_record).
+    Goes through the shared write queue and returns once the quote is on disk.
+    Returns the new quote's ID.
+    """
+    customer_id, customer_version = get_customer_registry().register_versioned(customer_name, customer_email, customer_address,
+                                                                               customer_phone)
+    new_quote = new_quote_record(customer_name, customer_email, customer_address, service_name, price, items=items, catalog=catalog,
+                                 customer_id=customer_id, customer_version=customer_version)
+    return get_write_queue(get_quote_store()).save_quote(new_quote)
+
+# Function to load all quotes from the database
+def load_quotes():
+    """
+    Reads all quotes from the quote database.
+    Returns a pandas DataFrame for easy display and filtering. Every session
+    gets a view of the same shared frame, so changing it only copies what changes.
+    """
+    return get_quote_store().load_quotes()
+
+# Function to look up one quote
+def get_quote(quote_id):
+    """
+    Returns the quote with this Quote ID as a dict, or None if there isn't one.
+    """
+    return get_quote_store().get_quote(quote_id)
+
+# Function to price a quote's line items
+def price_quote(items, catalog=None):
+    """
+    Prices items (a service ID, 'id*qty;id*qty' text or a list of
+    (service ID, quantity) pairs) against catalog (the current one by default).
+    Returns a quote_pricing.QuotePrice; raises ValueError for bad items.
+    """
+    catalog = catalog or get_catalog()
+    return get_price_table(catalog).price_items(normalize_items(items, catalog.services))
+
+# Function to describe a priced quote for the letter and emails
+def quote_fields(priced, catalog=None):
+    """
+    Returns the service_name, price and description template fields for a
+    QuotePrice. A single service keeps its catalog name and description;
+    several lines (or a quantity above 1) get a summary name and an itemized
+    description ending with the subtotal and GST.
+    """
+    lines = priced.lines
+    if len(lines) == 1 and lines[0].quantity == 1:
+        service = get_services(catalog)[lines[0].service_key]
+        return dict(service_name=service['name'], price=priced.total, description=service['description'])
+
+    names = [line.name if line.quantity == 1 else f"{line.quantity} x {line.name}" for line in lines]
+    if len(names) > SUMMARY_SERVICES:
+        names = names[:SUMMARY_SERVICES] + [f"{len(lines) - SUMMARY_SERVICES} more"]
+    itemized = [
+        f"- {line.quantity} x {line.name} @ ${line.unit_price:,.2f} = ${line.line_total:,.2f}"
+        for line in lines
+    ]
+    itemized.append(f"Subtotal: ${priced.subtotal:,.2f} + GST ${priced.gst:,.2f}")
+    return dict(service_name=', '.join(names), price=priced.total, description='\n'.join(itemized))
+
+# Function to update quote status in the database
+def update_quote_status(quote_id, new_status):
+    """
+    Updates the status of a specific quote in the quote database.
+    Uses the quote's permanent Quote ID, so it always hits the right quote even
+    if other quotes were added in the meantime. Returns once the change is on disk.
+    """
+    get_write_queue(get_quote_store()).update_status(quote_id, new_status)
+
+# Function to set the same status on several quotes at once
+def update_quote_statuses(quote_ids, new_status):
+    """
+    Sets new_status on every quote in quote_ids as a single write, so either
+    all of them change or (if an ID is unknown) none do. Returns how many
+    quotes actually changed; ones that already had the status are skipped.
+    """
+    changes = [(quote_id, new_status) for quote_id in dict.fromkeys(quote_ids)]
+    if not changes:
+        return 0
+    return get_write_queue(get_quote_store()).update_statuses(changes)
+
+# Function to render the printable quote letter
+def render_quote_letter(customer_name, customer_address, service_name, price, description, today_date):
+    """
+    Returns the official quotation letter shown (and copied) after generating a quote.
+    """
+    return get_template('quote_letter').render(
+        customer_name=customer_name,
+        customer_address=customer_address,
+        service_name=service_name,
+        description=description,
+        price=price,
+        today_date=today_date
+    )
+
+# Function to get the letter and email fields of a saved quote
+def saved_quote_fields(quote):
+    """
+    Returns the customer_name, service_name, price, description and
+    today_date template fields for a saved quote (a dict with the
+    QUOTE_COLUMNS), dated the day it was created and described from the
+    catalog version it was priced with. Quotes whose services can't be
+    found get no description.
+    """
+    text = {key: (value if isinstance(value, str) else '') for key, value in quote.items()}
+    try:
+        today_date = datetime.strptime(text['Date'], "%d/%m/%Y").strftime("%d %B %Y")
+    except ValueError:
+        today_date = text['Date']
+    try:
+        catalog, items = quote_catalog(text)
+        description = quote_fields(price_quote(items, catalog), catalog)['description'] if items else ''
+    except (KeyError, ValueError):
+        description = ''
+    return dict(
+        customer_name=text['Customer_Name'],
+        service_name=text['Service'],
+        price=float(quote['Price']),
+        description=description,
+        today_date=today_date
+    )
+
+# Function to re-render the letter of a saved quote
+def render_saved_letter(quote):
+    """
+    Returns the quote letter for a saved quote, the same text the form showed
+    when it was generated.
+    """
+    address = quote['Customer_Address'] if isinstance(quote['Customer_Address'], str) else ''
+    return render_quote_letter(customer_address=address, **saved_quote_fields(quote))
+
+# Function to render the copy-and-paste email text
+def render_email_text(customer_email, customer_name, service_name, price, description, today_date):
+    """
+    Returns the email (with To: and Subject: lines) for pasting into any mail client.
+    """
+    return get_template('copy_text').render(
+        customer_email=customer_email,
+        customer_name=customer_name,
+        service_name=service_name,
+        description=description,
+        price=price,
+        today_date=today_date
+    )
+
+# Function to render the subject and body of the quote email
+def render_email(customer_name, service_name, price, description, today_date):
+    """
+    Returns (subject, body) as plain text, for sending the quote directly.
+    """
+    fields = dict(customer_name=customer_name, service_name=service_name, price=price, description=description, today_date=today_date)
+    return get_template('email_subject').render(**fields).strip(), get_template('email_body').render(**fields)
+
+# Function to create mailto link (for desktop email apps)
+def create_mailto_link(customer_email, customer_name, service_name, price, description, today_date):
+    """
+    Creates a mailto URL that opens the user's default email client.
+    Pre-fills the recipient, subject, and body with quote details.
+    """
+    fields = dict(customer_name=customer_name, service_name=service_name, price=price, description=description, today_date=today_date)
+
+    # Only the quote's own details get URL-encoded here; the templates'
+    # static text was encoded once when they were compiled
+    subject_encoded = get_template('email_subject').render_quoted(**fields)
+    body_encoded = get_template('email_body').render_quoted(**fields)
+    
+    # Build the complete mailto URL
+    mailto_url = f"mailto:{customer_email}?subject={subject_encoded}&body={body_encoded}"
+    
+    return mailto_url
+
+# Function to create Gmail direct link (for web-based Gmail)
+def create_gmail_link(customer_email, customer_name, service_name, price, description, today_date):
+    """
+    Creates a direct Gmail compose link that opens in browser with pre-filled content.
+    This works perfectly with web-based Gmail and bypasses mailto limitations.
+    """
+    fields = dict(customer_name=customer_name, service_name=service_name, price=price, description=description, today_date=today_date)
+    subject_encoded = get_template('email_subject').render_quoted(**fields)
+    body_encoded = get_template('email_body').render_quoted(**fields)
+    
+    # Gmail compose URL format
+    gmail_url = f"https://mail.google.com/mail/?view=cm&fs=1&to={customer_email}&su={subject_encoded}&body={body_encoded}"
+    
+    return gmail_url
+
+# Function to check a quote request before anything is rendered or saved
+def check_quote_request(customer_name, customer_address, items, address_valid=None, catalog=None):
+    """
+    Returns the reason a quote can't be made from these details, or None if they're fine.
+    items is a service key, 'key*qty;key*qty' text or a list of line items.
+    Applies the same rules as the quote form. Bulk callers that already checked
+    the addresses with quote_address.validate_addresses pass address_valid.
+    """
+    if not isinstance(customer_name, str) or not customer_name.strip():
+        return 'Please enter a customer name.'
+    if not isinstance(customer_address, str) or not customer_address.strip():
+        return 'Please enter a customer address.'
+    if address_valid is None:
+        address_valid = validate_australian_address(customer_address)
+    if not address_valid:
+        return 'Please enter a valid Australian address (must include state abbreviation like NSW, VIC, QLD, etc. or a 4-digit postcode that matches it).'
+    try:
+        normalize_items(items, get_services(catalog))
+    except ValueError as e:
+        return str(e)
+    return None
+
+# Function to create, save and render a quote in one step
+def create_quote(customer_name, customer_email, customer_address, items, customer_phone=''):
+    """
+    Validates the details, prices the line items from the services catalog,
+    saves the quote and renders its letter and email links. items is a service
+    ID, 'id*qty;id*qty' text or a list of (id, qty) pairs / {'service_key', 'quantity'} dicts.
+    The customer is registered in the customer registry (see save_quote).
+    Returns {'quote': record, 'letter': ..., 'gmail_link': ..., 'mailto_link': ...}
+    (the links are empty without an email address). Raises ValueError with a
+    readable message if the details aren't valid.
+    """
+    # Price, describe and record the quote with one version of the catalog
+    catalog = get_catalog()
+    problem = check_quote_request(customer_name, customer_address, items, catalog=catalog)
+    if problem:
+        raise ValueError(problem)
+
+    customer_name, customer_address = customer_name.strip(), customer_address.strip()
+    customer_email = customer_email.strip() if isinstance(customer_email, str) else ''
+    customer_phone = customer_phone.strip() if isinstance(customer_phone, str) else ''
+    priced = price_quote(items, catalog)
+    fields = quote_fields(priced, catalog)
+    now = datetime.now()
+
+    customer_id, customer_version = get_customer_registry().register_versioned(customer_name, customer_email, customer_address,
+                                                                               customer_phone)
+    record = new_quote_record(customer_name, customer_email, customer_address, fields['service_name'], priced.total,
+                              now=now, items=[(line.service_key, line.quantity) for line in priced.lines], catalog=catalog,
+                              customer_id=customer_id, customer_version=customer_version)
+    record['Quote_ID'] = get_write_queue(get_quote_store()).save_quote(record)
+
+    details = dict(customer_name=customer_name, today_date=now.strftime("%d %B %Y"), **fields)
+    return {
+        'quote': record,
+        'letter': render_quote_letter(customer_address=customer_address, **details),
+        'gmail_link': create_gmail_link(customer_email=customer_email, **details) if customer_email else '',
+        'mailto_link': create_mailto_link(customer_email=customer_email, **details) if customer_email else '',
+    }
@@ -0,0 +1,433 @@
+"""
+Customer registry.
+
+Every customer with an email address or phone number is stored once in
+customers.csv (QUOTE_CUSTOMERS) and every quote saved for them carries their
+Customer_ID, so returning customers don't have to be typed in again:
+
+    Customer_ID,Name,Email,Phone,Address,Updated_At
+    C3F9A0B21D7E,John Smith,john@example.com,0412345678,"1 Main St, Sydney NSW 2000",2025-06-30T09:12:44
+
+The file is append-only (through the same journal as the quotes CSV): a
+changed address or phone number is a new line for the same Customer_ID, and
+the last line wins. Earlier lines stay readable as numbered versions (1 for a
+customer's first line, 2 for the next, ...), so a quote can store just the
+Customer_ID and version of the details it was made for. Every process appends
+under the same file lock, after reading what the others appended, so version
+numbers mean the same everywhere. The file is read once into memory, with
+
+  - a dict from 'email:<address>' / 'phone:<digits>' to the customer, so
+    finding the customer behind an email or phone number is one hash lookup;
+  - a prefix index (every name word, the full name, email and phone as sorted
+    terms), so autocomplete suggestions are a binary search, not a scan.
+
+Lines appended by another process (the API) are picked up on the next call.
+
+    python quote_customers.py backfill      register the customers of existing quotes
+    python quote_customers.py find smi      show suggestions for a prefix
+"""
+import bisect
+import csv
+import io
+import os
+import re
+import threading
+import uuid
+
+from quote_search import normalize_search_text
+from quote_store import get_journal
+from quote_writer import file_lock
+
+CUSTOMER_COLUMNS = ['Customer_ID', 'Name', 'Email', 'Phone', 'Address', 'Updated_At']
+
+CUSTOMERS_PATH = os.environ.get('QUOTE_CUSTOMERS', 'customers.csv')
+
+# Suggestions offered while typing a returning customer's name
+MAX_SUGGESTIONS = 8
+
+# Past this many new or changed customers in one go, the prefix index is
+# rebuilt in one sort rather than kept sorted entry by entry
+REINDEX_BATCH = 200
+
+# Numbers shorter than this are too ambiguous to identify a customer by
+MIN_PHONE_DIGITS = 8
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+# Function to create a new customer ID
+def new_customer_id():
+    return 'C' + uuid.uuid4().hex[:11].upper()
+
+
+# Function to normalize an email address for lookups
+def normalize_email(email):
+    """
+    Returns the address trimmed and case-folded, or '' if it isn't one.
+    """
+    email = email.strip().casefold() if isinstance(email, str) else ''
+    return email if '@' in email else ''
+
+
+# Function to normalize a phone number for lookups
+def normalize_phone(phone):
+    """
+    Returns just the digits, with +61 numbers in their 0 form (so '+61 412 345 678'
+    and '0412 345 678' are the same customer), or '' if it is too short.
+    """
+    digits = _NON_DIGITS.sub('', phone) if isinstance(phone, str) else ''
+    if digits.startswith('61') and len(digits) == 11:
+        digits = '0' + digits[2:]
+    return digits if len(digits) >= MIN_PHONE_DIGITS else ''
+
+
+# Function to turn what's been typed of a phone number into an index prefix
+def _phone_prefix(text):
+    if not isinstance(text, str):
+        return ''
+    digits = _NON_DIGITS.sub('', text)
+    if text.strip().startswith('+') and digits.startswith('61'):
+        digits = '0' + digits[2:]
+    return digits
+
+
+# Function to get the lookup keys of a customer
+def customer_keys(email, phone):
+    """
+    Returns ['email:...', 'phone:...'] for whichever of the two are usable.
+    """
+    keys = []
+    if normalize_email(email):
+        keys.append(f"email:{normalize_email(email)}")
+    if normalize_phone(phone):
+        keys.append(f"phone:{normalize_phone(phone)}")
+    return keys
+
+
+# Function to get the autocomplete terms of a customer
+def customer_terms(customer):
+    """
+    Returns the normalized strings a prefix should match: the full name, each
+    word of it, the email address and the phone number.
+    """
+    name = normalize_search_text(customer.get('Name'))
+    terms = {name, *name.split(' '), normalize_email(customer.get('Email')), normalize_phone(customer.get('Phone'))}
+    terms.discard('')
+    return terms
+
+
+# Sorted (term, customer ID) pairs for prefix lookups
+class PrefixIndex:
+    """
+    Every term that starts with a prefix sits in one run of the sorted list,
+    found with a binary search; adding or removing a term keeps it sorted.
+    """
+
+    def __init__(self, entries=()):
+        self._entries = sorted(set(entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, term, customer_id):
+        entry = (term, customer_id)
+        position = bisect.bisect_left(self._entries, entry)
+        if position == len(self._entries) or self._entries[position] != entry:
+            self._entries.insert(position, entry)
+
+    def remove(self, term, customer_id):
+        entry = (term, customer_id)
+        position = bisect.bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            del self._entries[position]
+
+    def search(self, prefix, limit):
+        """
+        Returns up to limit distinct customer IDs with a term starting with prefix.
+        """
+        found = {}
+        position = bisect.bisect_left(self._entries, (prefix,))
+        while position < len(self._entries) and len(found) < limit:
+            term, customer_id = self._entries[position]
+            if not term.startswith(prefix):
+                break
+            found[customer_id] = None
+            position += 1
+        return list(found)
+
+
+# The customers file held in memory, with its hash and prefix indexes
+class CustomerRegistry:
+    """
+    Reads the customers file once and then only the lines appended after what
+    it has already read. register() is the one way customers are added or
+    changed, so every session and the API agree on who is who.
+    """
+
+    def __init__(self, path=CUSTOMERS_PATH):
+        self.path = path
+        self.journal = get_journal(path, CUSTOMER_COLUMNS)
+        self.lock = threading.RLock()
+        self._customers = {}
+        # Every line read for each Customer_ID, oldest first
+        self._versions = {}
+        self._by_key = {}
+        self._index = PrefixIndex()
+        # (inode, bytes read) of the file as loaded so far
+        self._inode = None
+        self._read_to = 0
+
+    def _forget(self, customer):
+        customer_id = customer['Customer_ID']
+        for key in customer_keys(customer['Email'], customer['Phone']):
+            if self._by_key.get(key) is customer:
+                del self._by_key[key]
+        for term in customer_terms(customer):
+            self._index.remove(term, customer_id)
+
+    def _apply(self, customer, index=True):
+        old = self._customers.get(customer['Customer_ID'])
+        if old is not None:
+            self._forget(old)
+        self._customers[customer['Customer_ID']] = customer
+        self._versions.setdefault(customer['Customer_ID'], []).append(customer)
+        for key in customer_keys(customer['Email'], customer['Phone']):
+            self._by_key[key] = customer
+        if index:
+            for term in customer_terms(customer):
+                self._index.add(term, customer['Customer_ID'])
+
+    def _index_customers(self, customers):
+        """
+        Adds the terms of customers applied with index=False.
+        """
+        if len(customers) > REINDEX_BATCH:
+            self._index = PrefixIndex(
+                (term, customer_id) for customer_id, customer in self._customers.items() for term in customer_terms(customer)
+            )
+            return
+        for customer in customers:
+            for term in customer_terms(customer):
+                self._index.add(term, customer['Customer_ID'])
+
+    def _refresh(self):
+        """
+        Applies lines appended since the last call, or reloads everything if
+        the file was replaced. Caller holds the lock.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self._inode or stat.st_size < self._read_to:
+            self._customers, self._versions, self._by_key, self._index = {}, {}, {}, PrefixIndex()
+            self._inode, self._read_to = (stat.st_ino if stat else None), 0
+        if stat is None or stat.st_size == self._read_to:
+            return
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._read_to)
+            data = f.read(stat.st_size - self._read_to)
+        # A line still being written by another process is picked up next time
+        data = data[:data.rfind(b'\n') + 1]
+        rows = csv.reader(io.StringIO(data.decode('utf-8'), newline=''))
+        if self._read_to == 0:
+            next(rows, None)
+        applied = []
+        for row in rows:
+            customer = dict(zip(CUSTOMER_COLUMNS, row + [''] * (len(CUSTOMER_COLUMNS) - len(row))))
+            if customer['Customer_ID']:
+                self._apply(customer, index=False)
+                applied.append(customer)
+        # Only the latest version of each customer is indexed
+        self._index_customers([c for c in applied if self._customers[c['Customer_ID']] is c])
+        self._read_to += len(data)
+
+    def __len__(self):
+        with self.lock:
+            self._refresh()
+            return len(self._customers)
+
+    def get(self, customer_id):
+        """
+        Returns the customer's details as a dict of CUSTOMER_COLUMNS, or None.
+        """
+        with self.lock:
+            self._refresh()
+            customer = self._customers.get(customer_id)
+            return dict(customer) if customer else None
+
+    def quoted_details(self, references):
+        """
+        Returns (Name, Email, Address) for each (Customer_ID, version) in
+        references, as that version of the customer had them, or None for a
+        version the file doesn't hold.
+        """
+        details = []
+        with self.lock:
+            self._refresh()
+            for customer_id, version in references:
+                versions = self._versions.get(customer_id, ())
+                number = int(version) if str(version).isdigit() else 0
+                customer = versions[number - 1] if 0 < number <= len(versions) else None
+                details.append((customer['Name'], customer['Email'], customer['Address']) if customer else None)
+        return details
+
+    def lookup(self, email=None, phone=None):
+        """
+        Returns the customer with this email address (or failing that, phone
+        number), or None.
+        """
+        with self.lock:
+            self._refresh()
+            for key in customer_keys(email, phone):
+                if key in self._by_key:
+                    return dict(self._by_key[key])
+        return None
+
+    def suggest(self, text, limit=MAX_SUGGESTIONS):
+        """
+        Returns up to limit customers whose name (or any word of it), email or
+        phone number starts with text, in name order.
+        """
+        prefixes = {normalize_search_text(text), _phone_prefix(text)}
+        prefixes.discard('')
+        with self.lock:
+            self._refresh()
+            found = {}
+            for prefix in prefixes:
+                found.update(dict.fromkeys(self._index.search(prefix, limit)))
+            customers = [dict(self._customers[customer_id]) for customer_id in found]
+        return sorted(customers, key=lambda c: normalize_search_text(c['Name']))[:limit]
+
+    def register(self, name, email='', address='', phone=''):
+        """
+        Returns the Customer_ID for these details: an existing customer's if the
+        email address or phone number is already known (updating their name,
+        address or contact details if those changed), otherwise a new one.
+        Returns '' when there is neither an email address nor a phone number to
+        recognise the customer by again.
+        """
+        return self.register_many([(name, email, address, phone)])[0]
+
+    def register_versioned(self, name, email='', address='', phone=''):
+        """
+        register() that also returns the version of the customer's details it
+        left current: (Customer_ID, version). The version is '' unless that
+        version's name, email address and address are exactly the ones given,
+        so a quote holding it can be shown with the details it was made with.
+        """
+        (customer_id, version), = self._register([(name, email, address, phone)])
+        if version:
+            details, = self.quoted_details([(customer_id, version)])
+            if details != (name or '', email or '', address or ''):
+                version = ''
+        return customer_id, version
+
+    def register_many(self, customers):
+        """
+        register() for a list of (name, email, address, phone), with one sync at the end.
+        """
+        return [customer_id for customer_id, _ in self._register(customers)]
+
+    def _register(self, customers):
+        """
+        Returns (Customer_ID, version) for each of customers, ('', '') for
+        those that can't be registered. Holds the file lock from reading the
+        file to the last append, so another process can't register the same
+        new customer (with a different ID) or number a version the same in between.
+        """
+        from datetime import datetime
+
+        ids = []
+        changed = []
+        with self.lock, self.journal.lock, file_lock(f"{self.path}.lock"):
+            self._refresh()
+            for name, email, address, phone in customers:
+                keys = customer_keys(email, phone)
+                if not keys:
+                    ids.append(('', ''))
+                    continue
+                existing = next((self._by_key[key] for key in keys if key in self._by_key), None)
+                customer = dict(existing) if existing else dict(dict.fromkeys(CUSTOMER_COLUMNS, ''), Customer_ID=new_customer_id())
+                customer['Name'] = (name or '').strip() or customer['Name']
+                customer['Address'] = (address or '').strip() or customer['Address']
+                # Details left blank keep what was known before
+                customer['Email'] = (email or '').strip() if normalize_email(email) else customer['Email']
+                customer['Phone'] = (phone or '').strip() if normalize_phone(phone) else customer['Phone']
+                if existing is None or any(customer[column] != existing[column] for column in CUSTOMER_COLUMNS[1:-1]):
+                    customer['Updated_At'] = datetime.now().isoformat(timespec='seconds')
+                    offset, line = self.journal.append(customer, defer_sync=True)
+                    if offset == self._read_to:
+                        self._apply(customer, index=False)
+                        changed.append(customer)
+                        self._read_to += len(line)
+                    else:
+                        # Someone else appended in between (or the file is new): read it all in order
+                        self._index_customers([c for c in changed if self._customers.get(c['Customer_ID']) is c])
+                        changed = []
+                        self._refresh()
+                ids.append((customer['Customer_ID'], str(len(self._versions[customer['Customer_ID']]))))
+            self._index_customers([c for c in changed if self._customers.get(c['Customer_ID']) is c])
+            self.journal.sync()
+        return ids
+
+
+# Registries are kept at module level so they survive Streamlit reruns
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+# Function to get the shared customer registry
+def get_customer_registry(path=CUSTOMERS_PATH):
+    key = os.path.abspath(path)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = CustomerRegistry(path)
+            _registries[key] = registry
+        return registry
+
+
+# Function to register the customers of quotes saved before the registry existed
+def backfill_customers(quotes, registry=None):
+    """
+    Registers the customer of every quote in the quotes DataFrame that has an
+    email address (older quotes have no phone number). Later quotes win, so
+    customers end up with their most recent name and address.
+    Returns how many customers the registry holds afterwards.
+    """
+    registry = registry or get_customer_registry()
+    columns = ['Customer_Name', 'Customer_Email', 'Customer_Address']
+    rows = quotes[columns].astype(object).where(quotes[columns].notna(), '').itertuples(index=False, name=None)
+    registry.register_many([(name, email, address, '') for name, email, address in rows])
+    return len(registry)
+
+
+def main():
+    import argparse
+    import time
+
+    import quote_core
+
+    parser = argparse.ArgumentParser(description='Customer registry commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('backfill', help='Register the customers of existing quotes')
+    find_parser = subparsers.add_parser('find', help='Show the autocomplete suggestions for a prefix')
+    find_parser.add_argument('prefix')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    registry = get_customer_registry()
+    if args.command == 'backfill':
+        quote_core.init_database()
+        count = backfill_customers(quote_core.load_quotes(), registry)
+        print(f"{count} customers registered in {CUSTOMERS_PATH} ({time.perf_counter() - started:.1f}s)")
+    elif args.command == 'find':
+        for customer in registry.suggest(args.prefix):
+            print(f"{customer['Customer_ID']}  {customer['Name']}  {customer['Email']}  {customer['Phone']}  {customer['Address']}")
+        print(f"({len(registry)} customers, {(time.perf_counter() - started) * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
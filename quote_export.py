@@ -0,0 +1,241 @@
+"""
+CSV and XLSX exports of the quote history.
+
+An export covers the same filter as the history tab (search term, statuses,
+date range, archived quotes or not). The store hands the matching quotes over
+a few thousand rows at a time (QuoteStore.iter_quotes) and each piece is
+written out and handed on as bytes before the next is read, so memory stays
+at about one chunk whatever the size of the export. The XLSX file is a zip
+written on the fly with the standard library (one worksheet of inline
+strings, continued on a new sheet past Excel's row limit); there is nothing
+extra to install.
+
+    python quote_export.py --format xlsx --status Won --start 2025-01-01 --out won.xlsx
+
+The API streams the same bytes from GET /quotes/export.
+"""
+import os
+import zipfile
+
+from quote_rollups import day_arg
+from quote_store import ITER_CHUNK_ROWS, QUOTE_COLUMNS
+
+# Rows read from the store per chunk
+EXPORT_CHUNK_ROWS = int(os.environ.get('QUOTE_EXPORT_CHUNK_ROWS', str(ITER_CHUNK_ROWS)))
+
+# Formats: (MIME type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+# Excel's row limit, header included; longer exports carry on in another sheet
+XLSX_MAX_ROWS = 1048576
+
+# Control characters XML 1.0 can't hold at all (a plain pattern, so pandas
+# runs it in the Arrow regex engine rather than calling re per value)
+INVALID_XML_CHARS = r'[\x00-\x08\x0b\x0c\x0e-\x1f]'
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '{sheets}'
+    '</Types>'
+)
+XLSX_SHEET_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>{sheets}</sheets></workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{sheets}</Relationships>'
+)
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+
+# Function to name an export file
+def export_file_name(file_format):
+    """
+    Returns e.g. 'quotes_2025-06-30.xlsx'. Raises ValueError for unknown formats.
+    """
+    from datetime import date
+
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{file_format}' (expected one of: {', '.join(EXPORT_FORMATS)})")
+    return f"quotes_{date.today().isoformat()}.{EXPORT_FORMATS[file_format][1]}"
+
+
+# Function to stream quotes as CSV
+def csv_chunks(frames):
+    """
+    Yields the CSV file as bytes: the header, then one piece per frame.
+    Starts with a UTF-8 byte order mark so Excel reads accented names correctly.
+    """
+    import pandas as pd
+
+    yield pd.DataFrame(columns=QUOTE_COLUMNS).to_csv(index=False, lineterminator='\n').encode('utf-8-sig')
+    for df in frames:
+        if len(df):
+            yield df.reindex(columns=QUOTE_COLUMNS).to_csv(index=False, header=False, lineterminator='\n').encode('utf-8')
+
+
+# Function to write spreadsheet rows
+def _xlsx_rows(df, first_row):
+    """
+    Returns the <row> elements for df's QUOTE_COLUMNS, numbered from first_row.
+    Built a column at a time with pandas string operations rather than cell
+    by cell. Cells leave out their reference, so empty ones are written as
+    <c/> to keep the rest in their columns.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rows = '<row r="' + pd.Series(np.arange(first_row, first_row + len(df)).astype(str), index=df.index) + '">'
+    for column in QUOTE_COLUMNS:
+        values = df[column]
+        if column == 'Price':
+            prices = pd.to_numeric(values, errors='coerce')
+            cells = ('<c><v>' + prices.astype(str) + '</v></c>').where(prices.notna(), '<c/>')
+        else:
+            text = values.astype(object).where(values.notna(), '').astype(str)
+            text = (text.str.replace(INVALID_XML_CHARS, '', regex=True).str.replace('&', '&amp;', regex=False)
+                    .str.replace('<', '&lt;', regex=False).str.replace('>', '&gt;', regex=False))
+            cells = ('<c t="inlineStr"><is><t xml:space="preserve">' + text + '</t></is></c>').where(text != '', '<c/>')
+        rows = rows + cells
+    return ''.join((rows + '</row>').tolist())
+
+
+# Write-only file object that hands on what was written to it
+class _ChunkBuffer:
+    """
+    zipfile writes the archive here; take() returns the bytes written since
+    the last call. It has no tell(), so zipfile streams (data descriptors
+    after each member) instead of seeking back.
+    """
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+# Function to stream quotes as an XLSX workbook
+def xlsx_chunks(frames):
+    """
+    Yields the XLSX file as bytes, one piece per frame plus the zip's
+    bookkeeping at the end. Prices are numbers, everything else text.
+    """
+    buffer = _ChunkBuffer()
+    header = '<row r="1">' + ''.join(f'<c t="inlineStr"><is><t>{column}</t></is></c>' for column in QUOTE_COLUMNS) + '</row>'
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+        sheets = 1
+        sheet = archive.open('xl/worksheets/sheet1.xml', 'w')
+        sheet.write((XLSX_SHEET_START + header).encode('utf-8'))
+        row_number = 2
+        for df in frames:
+            written = 0
+            while written < len(df):
+                if row_number > XLSX_MAX_ROWS:
+                    sheet.write(XLSX_SHEET_END.encode('utf-8'))
+                    sheet.close()
+                    sheets += 1
+                    sheet = archive.open(f'xl/worksheets/sheet{sheets}.xml', 'w')
+                    sheet.write((XLSX_SHEET_START + header).encode('utf-8'))
+                    row_number = 2
+                count = min(len(df) - written, XLSX_MAX_ROWS - row_number + 1)
+                sheet.write(_xlsx_rows(df.iloc[written:written + count], row_number).encode('utf-8'))
+                row_number += count
+                written += count
+            yield buffer.take()
+        sheet.write(XLSX_SHEET_END.encode('utf-8'))
+        sheet.close()
+
+        numbers = range(1, sheets + 1)
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES.format(
+            sheets=''.join(XLSX_SHEET_CONTENT_TYPE.format(n=n) for n in numbers)))
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(sheets=''.join(
+            f'<sheet name="Quotes{f" {n}" if n > 1 else ""}" sheetId="{n}" r:id="rId{n}"/>' for n in numbers)))
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS.format(sheets=''.join(
+            f'<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{n}.xml"/>' for n in numbers)))
+    yield buffer.take()
+
+
+# Function to stream an export of the quote history
+def export_quotes(store, file_format, search_term=None, start=None, end=None, include_archived=True, statuses=None,
+                  chunk_rows=None):
+    """
+    Returns an iterator of the export file's bytes for the quotes matching the
+    filter (see QuoteStore.query_quotes), oldest first.
+    Raises ValueError for an unknown format or bad dates before anything is read.
+    """
+    export_file_name(file_format)
+    # Bad dates should fail here, not halfway through a download
+    day_arg(start), day_arg(end)
+    frames = store.iter_quotes(search_term, start, end, include_archived, statuses, chunk_rows or EXPORT_CHUNK_ROWS)
+    return csv_chunks(frames) if file_format == 'csv' else xlsx_chunks(frames)
+
+
+def main():
+    import argparse
+    import time
+
+    import quote_core
+
+    parser = argparse.ArgumentParser(description='Export quotes matching a history filter as CSV or XLSX')
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--search', default='', help='Customer name, email or address to match')
+    parser.add_argument('--status', action='append', default=None, help='Only quotes in this status (repeatable)')
+    parser.add_argument('--start', default=None, help='Created on or after (YYYY-MM-DD)')
+    parser.add_argument('--end', default=None, help='Created on or before (YYYY-MM-DD)')
+    parser.add_argument('--hot', action='store_true', help='Leave out archived Won/Lost quotes')
+    parser.add_argument('--out', default=None, help='Output file (default: quotes_<date>.<format>)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    quote_core.init_database()
+    try:
+        chunks = export_quotes(quote_core.get_quote_store(), args.format, args.search, args.start, args.end,
+                               not args.hot, args.status)
+    except ValueError as e:
+        parser.exit(1, f"{e}\n")
+    out = args.out or export_file_name(args.format)
+    size = 0
+    with open(out, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+            size += len(chunk)
+    print(f"Wrote {size / 1e6:.1f} MB to {out} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
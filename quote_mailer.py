@@ -0,0 +1,773 @@
+"""
+Outbound email for quotes.
+
+Emails are first written to a durable outbox (a small SQLite file, separate
+from the quote database) and then sent by one background dispatcher per
+process: an asyncio loop that keeps a pool of open SMTP connections and
+reuses them from message to message, so a follow-up to hundreds of customers
+costs one connection setup per pooled connection rather than one per email.
+
+    queued -> sending -> sent
+                      -> queued again (temporary failure, retried with backoff)
+                      -> failed (rejected, or out of attempts)
+
+Every outbox row carries its Quote_ID, so the history tab can show each
+quote's delivery status. A crash can't lose a queued email: rows
+left in 'sending' by a dead process are queued again (so delivery is at
+least once).
+
+Configured from the environment; nothing is sent unless QUOTE_SMTP_HOST is set:
+
+    QUOTE_SMTP_HOST, QUOTE_SMTP_PORT (587), QUOTE_SMTP_USER, QUOTE_SMTP_PASSWORD,
+    QUOTE_SMTP_SECURITY (starttls, ssl or none), QUOTE_SMTP_FROM,
+    QUOTE_SMTP_POOL (connections, 4), QUOTE_OUTBOX (quotes_outbox.db)
+
+For trying it out (or load-testing) there is a local SMTP stand-in that
+accepts and keeps everything it is sent:
+
+    python quote_mailer.py standin --port 8025
+    QUOTE_SMTP_HOST=127.0.0.1 QUOTE_SMTP_PORT=8025 QUOTE_SMTP_SECURITY=none streamlit run app.py
+    python quote_mailer.py bench --count 500 --latency 0.05
+"""
+import asyncio
+import atexit
+import os
+import random
+import smtplib
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+SMTP_HOST = os.environ.get('QUOTE_SMTP_HOST', '')
+SMTP_PORT = int(os.environ.get('QUOTE_SMTP_PORT', '587'))
+SMTP_USER = os.environ.get('QUOTE_SMTP_USER', '')
+SMTP_PASSWORD = os.environ.get('QUOTE_SMTP_PASSWORD', '')
+SMTP_SECURITY = os.environ.get('QUOTE_SMTP_SECURITY', 'starttls')
+SMTP_FROM = os.environ.get('QUOTE_SMTP_FROM', 'Gold Coast Electrical Pros <info@gcelectricalpros.com.au>')
+SMTP_POOL_SIZE = int(os.environ.get('QUOTE_SMTP_POOL', '4'))
+SMTP_TIMEOUT = 30
+OUTBOX_FILE = os.environ.get('QUOTE_OUTBOX', 'quotes_outbox.db')
+
+# Retries: attempts in all, and the backoff before each retry (doubling, with jitter)
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+# A row still 'sending' after this long belongs to a process that died
+STALE_SENDING_SECONDS = 300
+# How often the dispatcher looks for emails queued by other processes
+POLL_SECONDS = 5
+
+DELIVERY_STATUSES = ['queued', 'sending', 'sent', 'failed']
+
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    quote_id TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    attachment TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    sent_at TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_outbox_quote ON outbox (quote_id, id);
+"""
+
+
+# Function to check whether sending email is configured
+def mail_enabled():
+    return bool(SMTP_HOST)
+
+
+# Function to read the SMTP settings from the environment
+def smtp_settings(**overrides):
+    """
+    Returns the connection settings as a dict; keyword arguments replace single values.
+    """
+    settings = {
+        'host': SMTP_HOST, 'port': SMTP_PORT, 'username': SMTP_USER, 'password': SMTP_PASSWORD,
+        'security': SMTP_SECURITY, 'sender': SMTP_FROM, 'timeout': SMTP_TIMEOUT,
+    }
+    settings.update(overrides)
+    if settings['security'] not in ('starttls', 'ssl', 'none'):
+        raise ValueError(f"Unknown SMTP security '{settings['security']}' (expected starttls, ssl or none)")
+    return settings
+
+
+# Durable queue of outgoing emails
+class Outbox:
+    """
+    One row per email in an SQLite file. Each thread gets its own
+    connection; rows are claimed in an IMMEDIATE transaction, so several
+    processes can send from the same outbox without sending a row twice.
+    """
+
+    def __init__(self, path=OUTBOX_FILE):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        import sqlite3
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(OUTBOX_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, emails):
+        """
+        Queues a list of {'quote_id', 'recipient', 'subject', 'body', 'attachment'}
+        in one transaction. Returns their outbox IDs.
+        """
+        now, created = time.time(), datetime.now().isoformat(timespec='seconds')
+        conn = self._connect()
+        ids = []
+        with conn:
+            for email in emails:
+                cursor = conn.execute(
+                    'INSERT INTO outbox (quote_id, recipient, subject, body, attachment, next_attempt_at, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (email['quote_id'], email['recipient'], email['subject'], email['body'],
+                     email.get('attachment') or '', now, created),
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def claim(self, limit):
+        """
+        Marks up to limit due emails as 'sending' and returns them as dicts
+        (attempts already counts this one).
+        """
+        if limit <= 0:
+            return []
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Emails a dead process was sending go back in the queue
+            conn.execute(
+                "UPDATE outbox SET status = 'queued' WHERE status = 'sending' AND claimed_at < ?",
+                (now - STALE_SENDING_SECONDS,),
+            )
+            rows = [dict(row) for row in conn.execute(
+                "SELECT * FROM outbox WHERE status = 'queued' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, id LIMIT ?", (now, limit),
+            )]
+            conn.executemany(
+                "UPDATE outbox SET status = 'sending', attempts = attempts + 1, claimed_at = ? WHERE id = ?",
+                [(now, row['id']) for row in rows],
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        for row in rows:
+            row['attempts'] += 1
+        return rows
+
+    def mark_sent(self, email_id):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'sent', sent_at = ?, last_error = '' WHERE id = ?",
+                (datetime.now().isoformat(timespec='seconds'), email_id),
+            )
+
+    def mark_retry(self, email_id, error, delay):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'queued', next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (time.time() + delay, error, email_id),
+            )
+
+    def mark_failed(self, email_id, error):
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE outbox SET status = 'failed', last_error = ? WHERE id = ?", (error, email_id))
+
+    def retry_failed(self):
+        """
+        Queues every failed email again with a fresh set of attempts. Returns how many.
+        """
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE outbox SET status = 'queued', attempts = 0, next_attempt_at = ? WHERE status = 'failed'",
+                (time.time(),),
+            )
+        return cursor.rowcount
+
+    def next_due(self):
+        """
+        Returns when the next queued email is due (epoch seconds), or None if none is queued.
+        """
+        row = self._connect().execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'queued'").fetchone()
+        return row[0]
+
+    def counts(self):
+        """
+        Returns {status: number of emails}.
+        """
+        rows = self._connect().execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def delivery_status(self, quote_ids):
+        """
+        Returns {quote_id: {'status', 'attempts', 'sent_at', 'last_error', 'recipient'}}
+        for the latest email of each quote that has one.
+        """
+        quote_ids = list(quote_ids)
+        statuses = {}
+        # SQLite allows 999 parameters per statement
+        for start in range(0, len(quote_ids), 900):
+            chunk = quote_ids[start:start + 900]
+            placeholders = ', '.join('?' for _ in chunk)
+            for row in self._connect().execute(
+                'SELECT quote_id, status, attempts, sent_at, last_error, recipient FROM outbox '
+                f'WHERE id IN (SELECT MAX(id) FROM outbox WHERE quote_id IN ({placeholders}) GROUP BY quote_id)',
+                chunk,
+            ):
+                statuses[row['quote_id']] = {key: row[key] for key in row.keys() if key != 'quote_id'}
+        return statuses
+
+
+# Function to build the email for an outbox row
+def build_message(row, sender):
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = row['recipient']
+    message['Subject'] = row['subject']
+    message['Date'] = formatdate(localtime=True)
+    message['Message-ID'] = make_msgid(domain='quotes.local')
+    message['X-Quote-ID'] = row['quote_id']
+    message.set_content(row['body'])
+    if row['attachment'] and os.path.exists(row['attachment']):
+        with open(row['attachment'], 'rb') as f:
+            message.add_attachment(f.read(), maintype='application', subtype='pdf',
+                                   filename=f"Quote_{row['quote_id']}.pdf")
+    return message
+
+
+# Function to tell temporary SMTP failures from permanent ones
+def is_transient(error):
+    """
+    Returns True for errors worth retrying: dropped connections, timeouts and
+    4xx replies. 5xx replies (e.g. an unknown mailbox) won't change on retry.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+# Function to work out how long to wait before retrying
+def retry_delay(attempts, base=RETRY_BASE_SECONDS):
+    """
+    Doubles with every attempt up to RETRY_MAX_SECONDS, with jitter so
+    emails that failed together don't all retry at the same moment.
+    """
+    return min(base * 2 ** (attempts - 1), RETRY_MAX_SECONDS) * random.uniform(0.5, 1.0)
+
+
+# One reusable SMTP session
+class SMTPConnection:
+    """
+    Opens on first use and stays open between emails. A connection the
+    server closed while it sat idle is reopened once, transparently.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._smtp = None
+
+    def _open(self):
+        s = self.settings
+        # Checks the server's certificate and hostname before the password goes over the wire
+        context = ssl.create_default_context()
+        if s['security'] == 'ssl':
+            smtp = smtplib.SMTP_SSL(s['host'], s['port'], timeout=s['timeout'], context=context)
+        else:
+            smtp = smtplib.SMTP(s['host'], s['port'], timeout=s['timeout'])
+        try:
+            smtp.ehlo()
+            if s['security'] == 'starttls':
+                smtp.starttls(context=context)
+                smtp.ehlo()
+            if s['username']:
+                smtp.login(s['username'], s['password'])
+        except BaseException:
+            smtp.close()
+            raise
+        self._smtp = smtp
+
+    def send(self, message):
+        reused = self._smtp is not None
+        if not reused:
+            self._open()
+        try:
+            self._smtp.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            if not reused:
+                raise
+            self._open()
+            self._smtp.send_message(message)
+        except smtplib.SMTPResponseException:
+            # The session is still usable; start the next email from a clean state
+            try:
+                self._smtp.rset()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+            raise
+        except (smtplib.SMTPException, OSError):
+            self.close()
+            raise
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+
+# Background sender for one outbox
+class MailDispatcher:
+    """
+    Runs an asyncio loop in a daemon thread. The loop claims due emails
+    from the outbox and hands each one to a free connection from the pool;
+    the blocking smtplib calls run on one worker thread per connection, so
+    pool_size emails are in flight at once. Failures are retried with
+    backoff or marked failed, and every outcome is written to the outbox.
+    Outbox reads and writes run on a thread of their own, so a locked
+    outbox database holds up the bookkeeping but never the loop.
+    """
+
+    def __init__(self, outbox, settings=None, pool_size=SMTP_POOL_SIZE, max_attempts=MAX_ATTEMPTS,
+                 retry_base=RETRY_BASE_SECONDS):
+        self.outbox = outbox
+        self.settings = settings or smtp_settings()
+        self.pool_size = max(pool_size, 1)
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self._loop = None
+        self._wake = None
+        self._outbox_executor = None
+        self._ready = threading.Event()
+        self._stopping = False
+
+        # Counters for the debug view and the benchmark
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+        self._thread = threading.Thread(target=self._run, name='quote-mailer', daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+
+    def wake(self):
+        """
+        Tells the dispatcher new emails were queued, instead of waiting for its next poll.
+        """
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _run(self):
+        asyncio.run(self._main())
+
+    async def _outbox_call(self, method, *args):
+        """
+        Runs an outbox method on the outbox thread and returns its result.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._outbox_executor, method, *args)
+        except RuntimeError:
+            # The interpreter is exiting and executors take no new work; finish the bookkeeping here
+            return method(*args)
+        return await future
+
+    async def _main(self):
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(self.pool_size, thread_name_prefix='quote-smtp')
+        loop.set_default_executor(executor)
+        self._outbox_executor = ThreadPoolExecutor(1, thread_name_prefix='quote-outbox')
+        self._loop, self._wake = loop, asyncio.Event()
+        connections = asyncio.Queue()
+        for _ in range(self.pool_size):
+            connections.put_nowait(SMTPConnection(self.settings))
+        in_flight = set()
+        self._ready.set()
+
+        while not self._stopping:
+            # Keep a second email waiting for every connection so none sits idle
+            rows = await self._outbox_call(self.outbox.claim, 2 * self.pool_size - len(in_flight))
+            for row in rows:
+                task = asyncio.create_task(self._deliver(row, connections))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+
+            # Sleep until a send finishes, new emails are queued or the next retry is due
+            due = await self._outbox_call(self.outbox.next_due)
+            timeout = POLL_SECONDS if due is None else min(max(due - time.time(), 0.05), POLL_SECONDS)
+            self._wake.clear()
+            waiter = asyncio.create_task(self._wake.wait())
+            await asyncio.wait(in_flight | {waiter}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+
+        if in_flight:
+            await asyncio.wait(in_flight)
+        # Closed here rather than on the executor, which may already be shut down at exit
+        while not connections.empty():
+            connections.get_nowait().close()
+        executor.shutdown(wait=True)
+        self._outbox_executor.shutdown(wait=True)
+
+    async def _deliver(self, row, connections):
+        connection = await connections.get()
+        try:
+            message = build_message(row, self.settings['sender'])
+            await asyncio.get_running_loop().run_in_executor(None, connection.send, message)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if self._stopping and isinstance(e, RuntimeError):
+                # The process is exiting; leave the email for the next dispatcher
+                await self._outbox_call(self.outbox.mark_retry, row['id'], error, 0)
+            elif is_transient(e) and row['attempts'] < self.max_attempts:
+                await self._outbox_call(self.outbox.mark_retry, row['id'], error, retry_delay(row['attempts'], self.retry_base))
+                self.retried += 1
+            else:
+                await self._outbox_call(self.outbox.mark_failed, row['id'], error)
+                self.failed += 1
+        else:
+            await self._outbox_call(self.outbox.mark_sent, row['id'])
+            self.sent += 1
+        finally:
+            connections.put_nowait(connection)
+
+    def close(self, timeout=30):
+        """
+        Finishes the emails in flight, closes the connections and stops the loop.
+        Emails still queued stay in the outbox for next time.
+        """
+        if self._stopping:
+            return
+        self._stopping = True
+        self.wake()
+        self._thread.join(timeout)
+
+
+# One outbox and one dispatcher per outbox file, shared by every session in this process
+_outboxes = {}
+_dispatchers = {}
+_dispatchers_lock = threading.Lock()
+
+
+# Function to get the shared outbox
+def get_outbox(path=OUTBOX_FILE):
+    """
+    Returns the process-wide Outbox for the file at path, so reruns reuse
+    its connections instead of opening a new one (and re-running the schema) each time.
+    """
+    key = os.path.abspath(path)
+    with _dispatchers_lock:
+        outbox = _outboxes.get(key)
+        if outbox is None:
+            outbox = _outboxes[key] = Outbox(path)
+        return outbox
+
+
+# Function to get the shared mail dispatcher
+def get_mail_dispatcher(path=OUTBOX_FILE):
+    """
+    Returns the process-wide dispatcher for the outbox at path, starting it on first use.
+    """
+    outbox = get_outbox(path)
+    key = os.path.abspath(path)
+    with _dispatchers_lock:
+        dispatcher = _dispatchers.get(key)
+        if dispatcher is None or dispatcher._stopping:
+            dispatcher = MailDispatcher(outbox)
+            _dispatchers[key] = dispatcher
+        return dispatcher
+
+
+# Finish the emails in flight when the server shuts down
+@atexit.register
+def _close_dispatchers():
+    for dispatcher in list(_dispatchers.values()):
+        dispatcher.close()
+
+
+# Function to queue the emails for a list of saved quotes
+def queue_quote_emails(quotes, attach_pdf=True, outbox=None):
+    """
+    Renders the email (and the PDF letter, unless attach_pdf is False) of
+    every quote dict that has a customer email, queues them all in one
+    transaction and wakes the dispatcher. Returns (queued, skipped).
+    """
+    from quote_core import render_email, render_saved_letter, saved_quote_fields
+    from quote_pdf import get_pdf_renderer
+
+    quotes = list(quotes)
+    with_email = [q for q in quotes if isinstance(q.get('Customer_Email'), str) and q['Customer_Email'].strip()]
+    attachments = [''] * len(with_email)
+    if attach_pdf and with_email:
+        letters = [(render_saved_letter(q), f"Quotation {q['Quote_ID']}") for q in with_email]
+        attachments = get_pdf_renderer().render_many(letters, workers=0 if len(letters) < 50 else None)
+
+    emails = []
+    for quote, attachment in zip(with_email, attachments):
+        subject, body = render_email(**saved_quote_fields(quote))
+        emails.append({'quote_id': quote['Quote_ID'], 'recipient': quote['Customer_Email'].strip(),
+                       'subject': subject, 'body': body, 'attachment': attachment})
+    if emails:
+        if outbox is None:
+            dispatcher = get_mail_dispatcher()
+            dispatcher.outbox.enqueue(emails)
+            dispatcher.wake()
+        else:
+            outbox.enqueue(emails)
+    return len(emails), len(quotes) - len(emails)
+
+
+# Function to look up the delivery status of quotes
+def delivery_status(quote_ids, path=OUTBOX_FILE):
+    """
+    Returns {quote_id: latest email status dict} for the quotes that have been emailed.
+    """
+    if not os.path.exists(path):
+        return {}
+    return get_outbox(path).delivery_status(quote_ids)
+
+
+# Local SMTP server for trying out and load-testing the mailer
+class SMTPStandIn:
+    """
+    Speaks just enough SMTP (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT)
+    to accept mail and keeps every message in self.messages as
+    (sender, recipients, raw bytes). latency delays every reply to DATA,
+    like a real server's processing time; fail_every makes every nth
+    message get a 451 (temporary) reply, to exercise the retries.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_every=0):
+        self.host, self.port = host, port
+        self.latency = latency
+        self.fail_every = fail_every
+        self.messages = []
+        self.connections = 0
+        self._received = 0
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts serving on a background thread and returns (host, port).
+        """
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), name='smtp-standin', daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        return self.host, self.port
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._session, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    async def _session(self, reader, writer):
+        self.connections += 1
+
+        async def reply(line):
+            writer.write(f"{line}\r\n".encode('ascii'))
+            await writer.drain()
+
+        sender, recipients = None, []
+        await reply('220 quote-mailer stand-in ready')
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode('utf-8', 'replace').strip()
+                verb = command[:4].upper()
+                if verb == 'EHLO':
+                    await reply('250-stand-in')
+                    await reply('250 8BITMIME')
+                elif verb == 'HELO':
+                    await reply('250 stand-in')
+                elif verb == 'MAIL':
+                    sender, recipients = command[10:].strip(), []
+                    await reply('250 OK')
+                elif verb == 'RCPT':
+                    recipients.append(command[8:].strip())
+                    await reply('250 OK')
+                elif verb == 'DATA':
+                    await reply('354 End data with <CR><LF>.<CR><LF>')
+                    data = bytearray()
+                    while True:
+                        chunk = await reader.readline()
+                        if chunk in (b'.\r\n', b'.\n', b''):
+                            break
+                        data += chunk[1:] if chunk.startswith(b'..') else chunk
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    self._received += 1
+                    if self.fail_every and self._received % self.fail_every == 0:
+                        await reply('451 Try again later')
+                    else:
+                        self.messages.append((sender, recipients, bytes(data)))
+                        await reply('250 OK queued')
+                    sender, recipients = None, []
+                elif verb == 'RSET':
+                    sender, recipients = None, []
+                    await reply('250 OK')
+                elif verb == 'NOOP':
+                    await reply('250 OK')
+                elif verb == 'QUIT':
+                    await reply('221 Bye')
+                    break
+                else:
+                    await reply('502 Command not implemented')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            for task in asyncio.all_tasks(self._loop):
+                self._loop.call_soon_threadsafe(task.cancel)
+            self._thread.join(5)
+
+
+# Function to wait until the outbox has nothing left to send
+def wait_for_outbox(outbox, timeout=None):
+    """
+    Returns True once no email is queued or sending, False on timeout.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        counts = outbox.counts()
+        if not counts.get('queued') and not counts.get('sending'):
+            return True
+        if deadline is not None and time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+
+
+def main():
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description='Quote email outbox tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('status', help='Count the outbox emails by status')
+    subparsers.add_parser('retry', help='Queue every failed email again')
+
+    send_parser = subparsers.add_parser('send', help='Email every saved quote matching a history filter')
+    send_parser.add_argument('--search', default='', help='Customer name, email or address to match')
+    send_parser.add_argument('--start', default=None, help='Created on or after (YYYY-MM-DD)')
+    send_parser.add_argument('--end', default=None, help='Created on or before (YYYY-MM-DD)')
+    send_parser.add_argument('--no-pdf', action='store_true', help="Don't attach the PDF letter")
+
+    standin_parser = subparsers.add_parser('standin', help='Run a local SMTP stand-in that accepts everything')
+    standin_parser.add_argument('--port', type=int, default=8025)
+    standin_parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before accepting each email')
+
+    bench_parser = subparsers.add_parser('bench', help='Send emails to an in-process stand-in and time them')
+    bench_parser.add_argument('--count', type=int, default=500)
+    bench_parser.add_argument('--pool', type=int, default=SMTP_POOL_SIZE, help='Pooled connections')
+    bench_parser.add_argument('--latency', type=float, default=0.05, help="Stand-in's seconds per email")
+    bench_parser.add_argument('--fail-every', type=int, default=0, help='Give every nth email a temporary failure')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        counts = Outbox().counts()
+        for status in DELIVERY_STATUSES:
+            print(f"  {status:<8} {counts.get(status, 0)}")
+    elif args.command == 'retry':
+        print(f"Queued {Outbox().retry_failed()} failed emails again")
+        if mail_enabled():
+            wait_for_outbox(get_mail_dispatcher().outbox)
+    elif args.command == 'send':
+        import quote_core
+
+        if not mail_enabled():
+            parser.exit(1, "Set QUOTE_SMTP_HOST (and the other QUOTE_SMTP_* settings) first\n")
+        quote_core.init_database()
+        try:
+            quotes = quote_core.get_quote_store().query_quotes(args.search, args.start, args.end)
+        except ValueError as e:
+            parser.exit(1, f"{e}\n")
+        started = time.perf_counter()
+        queued, skipped = queue_quote_emails(quotes.to_dict('records'), attach_pdf=not args.no_pdf)
+        dispatcher = get_mail_dispatcher()
+        wait_for_outbox(dispatcher.outbox)
+        print(f"Queued {queued} emails ({skipped} quotes have no email address); "
+              f"{dispatcher.sent} sent, {dispatcher.failed} failed in {time.perf_counter() - started:.1f}s")
+    elif args.command == 'standin':
+        standin = SMTPStandIn(port=args.port, latency=args.latency)
+        host, port = standin.start()
+        print(f"SMTP stand-in listening on {host}:{port} (Ctrl+C to stop)", flush=True)
+        try:
+            seen = 0
+            while True:
+                time.sleep(1)
+                if len(standin.messages) != seen:
+                    seen = len(standin.messages)
+                    print(f"  {seen} emails received over {standin.connections} connections", flush=True)
+        except KeyboardInterrupt:
+            standin.stop()
+    elif args.command == 'bench':
+        standin = SMTPStandIn(latency=args.latency, fail_every=args.fail_every)
+        host, port = standin.start()
+        with tempfile.TemporaryDirectory() as folder:
+            outbox = Outbox(os.path.join(folder, 'outbox.db'))
+            emails = [{'quote_id': f"B{n:011X}", 'recipient': f"customer{n}@example.com",
+                       'subject': 'Electrical Services Quotation', 'body': 'Quote body\n' * 40} for n in range(args.count)]
+            started = time.perf_counter()
+            outbox.enqueue(emails)
+            dispatcher = MailDispatcher(outbox, smtp_settings(host=host, port=port, security='none', username=''),
+                                        pool_size=args.pool, retry_base=0.1)
+            dispatcher.wake()
+            wait_for_outbox(outbox)
+            elapsed = time.perf_counter() - started
+            dispatcher.close()
+        standin.stop()
+        print(f"{len(standin.messages)} of {args.count} emails delivered in {elapsed:.2f}s "
+              f"({args.count / elapsed:.0f}/s) over {standin.connections} connections "
+              f"({dispatcher.retried} retries, {dispatcher.failed} failed)")
+
+
+if __name__ == '__main__':
+    main()
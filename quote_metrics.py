@@ -0,0 +1,261 @@
+"""
+Built-in timing instrumentation: histograms of how long each stage of a
+Streamlit rerun, each store operation and each API request takes.
+
+Everything is kept in memory in this process and can be read as
+Prometheus text (render_prometheus()):
+
+- quote_api.py serves it at GET /metrics
+- set QUOTE_METRICS_FILE=/path/quote_metrics.prom and the app (or any other
+  process using the engine) rewrites that file every QUOTE_METRICS_INTERVAL
+  seconds, e.g. for node_exporter's textfile collector
+- run the app with ?debug=1 in the URL (or QUOTE_DEBUG_PANEL=1) for a
+  timing panel in the sidebar
+
+Recording a timing is a perf_counter() call and a bisect, so it stays on all
+the time.
+"""
+import atexit
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Metric names and their help text
+APP_STAGE_METRIC = 'quote_app_stage_seconds'
+STORE_OPERATION_METRIC = 'quote_store_operation_seconds'
+API_REQUEST_METRIC = 'quote_api_request_seconds'
+METRIC_HELP = {
+    APP_STAGE_METRIC: 'Time spent in each stage of a Streamlit rerun.',
+    STORE_OPERATION_METRIC: 'Time spent in each quote store operation.',
+    API_REQUEST_METRIC: 'Time spent answering each kind of API request.',
+}
+
+# Optional metrics file, rewritten every QUOTE_METRICS_INTERVAL seconds
+METRICS_FILE = os.environ.get('QUOTE_METRICS_FILE') or None
+METRICS_FILE_INTERVAL = float(os.environ.get('QUOTE_METRICS_INTERVAL', 15))
+
+
+# Latency histogram with Prometheus-style cumulative buckets
+class Histogram:
+    """
+    Counts observations per bucket (non-cumulative internally), plus their
+    count, sum and maximum. Safe to observe from several threads.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self):
+        """
+        Returns (cumulative bucket counts, count, sum, max) read consistently.
+        """
+        with self.lock:
+            cumulative, total = [], 0
+            for n in self.counts:
+                total += n
+                cumulative.append(total)
+            return cumulative, self.count, self.sum, self.max
+
+    def quantile(self, q):
+        """
+        Estimates the q-quantile in seconds by interpolating inside its bucket.
+        """
+        cumulative, count, _, maximum = self.snapshot()
+        if not count:
+            return 0.0
+        rank = q * count
+        index = bisect.bisect_left(cumulative, rank)
+        if index >= len(self.buckets):
+            return maximum
+        lower = self.buckets[index - 1] if index else 0.0
+        below = cumulative[index - 1] if index else 0
+        in_bucket = cumulative[index] - below
+        estimate = lower + (self.buckets[index] - lower) * ((rank - below) / in_bucket if in_bucket else 1.0)
+        return min(estimate, maximum)
+
+
+# (metric, sorted label pairs) -> Histogram
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+# Function to get the histogram for one metric and label set
+def histogram(metric, **labels):
+    key = (metric, tuple(sorted(labels.items())))
+    found = _histograms.get(key)
+    if found is None:
+        with _histograms_lock:
+            found = _histograms.setdefault(key, Histogram())
+    return found
+
+
+# Function to record one timing
+def observe(metric, seconds, **labels):
+    histogram(metric, **labels).observe(seconds)
+
+
+# A running stopwatch for one stage
+class Timer:
+    """
+    Started on creation; stop() records the elapsed time once and returns it
+    in seconds. For stretches of a script that a with block would have to
+    re-indent (e.g. the history loop in app.py).
+    """
+
+    def __init__(self, metric, **labels):
+        self.metric = metric
+        self.labels = labels
+        self.started = time.perf_counter()
+        self.elapsed = None
+
+    def stop(self):
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self.started
+            observe(self.metric, self.elapsed, **self.labels)
+        return self.elapsed
+
+
+# Function to time a block of code
+@contextmanager
+def timed(metric, **labels):
+    """
+    with timed(STORE_OPERATION_METRIC, operation='load_quotes'): ...
+    Records the block's duration even if it raises.
+    """
+    timer = Timer(metric, **labels)
+    try:
+        yield timer
+    finally:
+        timer.stop()
+
+
+# Function to reset every histogram (benchmarks and tests)
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# Function to export every histogram in the Prometheus text format
+def render_prometheus():
+    """
+    Returns the histograms as Prometheus text exposition format (version 0.0.4).
+    """
+    with _histograms_lock:
+        items = sorted(_histograms.items())
+    lines, current = [], None
+    for (metric, labels), hist in items:
+        if metric != current:
+            current = metric
+            lines.append(f"# HELP {metric} {METRIC_HELP.get(metric, metric)}")
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative, count, total, _ = hist.snapshot()
+        for bound, n in zip(hist.buckets + ['+Inf'], cumulative):
+            le = bound if isinstance(bound, str) else _number(bound)
+            lines.append(f"{metric}_bucket{_label_text(labels, [('le', le)])} {n}")
+        lines.append(f"{metric}_sum{_label_text(labels)} {total!r}")
+        lines.append(f"{metric}_count{_label_text(labels)} {count}")
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+# Function to summarize the histograms for the debug panel
+def summary_rows():
+    """
+    Returns one dict per metric and label set with the call count and the
+    mean, estimated p50/p95 and maximum in milliseconds, slowest total first.
+    """
+    with _histograms_lock:
+        items = list(_histograms.items())
+    rows = []
+    for (metric, labels), hist in items:
+        _, count, total, maximum = hist.snapshot()
+        if not count:
+            continue
+        rows.append({
+            'Metric': metric.replace('quote_', '').replace('_seconds', ''),
+            'Labels': ', '.join(f"{name}={value}" for name, value in labels),
+            'Calls': count,
+            'Total ms': round(total * 1000, 1),
+            'Mean ms': round(total / count * 1000, 2),
+            'p50 ms': round(hist.quantile(0.5) * 1000, 2),
+            'p95 ms': round(hist.quantile(0.95) * 1000, 2),
+            'Max ms': round(maximum * 1000, 2),
+        })
+    rows.sort(key=lambda row: row['Total ms'], reverse=True)
+    return rows
+
+
+# Function to write the metrics to a file atomically
+def write_metrics_file(path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+_file_writer = None
+_file_writer_lock = threading.Lock()
+
+
+# Function to keep a metrics file up to date in the background
+def start_metrics_file(path=None, interval=None):
+    """
+    Starts (once per process) a daemon thread that rewrites path with the
+    current metrics every interval seconds, and once more at exit.
+    Defaults to QUOTE_METRICS_FILE; does nothing if no path is configured.
+    Returns the path being written, or None.
+    """
+    global _file_writer
+    path = path or METRICS_FILE
+    if not path:
+        return None
+    interval = interval or METRICS_FILE_INTERVAL
+    with _file_writer_lock:
+        if _file_writer is not None:
+            return _file_writer.name
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    write_metrics_file(path)
+                except OSError:
+                    pass
+
+        _file_writer = threading.Thread(target=run, name=path, daemon=True)
+        _file_writer.start()
+        atexit.register(write_metrics_file, path)
+    return path
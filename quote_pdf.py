@@ -0,0 +1,377 @@
+"""
+PDF copies of quote letters.
+
+Letters are laid out as text-only A4 pages in the PDF base fonts (Courier for
+the body, so the letter keeps the alignment it has on screen), written by
+hand with the standard library; there is nothing extra to install. Rendering
+runs off the Streamlit thread, on a small thread pool for single letters and
+a process pool for bulk jobs, and every PDF is cached on disk under the
+SHA-256 of its letter text, so a letter that was rendered before is never
+rendered again:
+
+    quote_pdfs/
+        3f/3f9a...e1.pdf
+
+    python quote_pdf.py --search smith --start 2025-01-01 --end 2025-06-30 --out pdfs --workers 4
+"""
+import atexit
+import hashlib
+import multiprocessing
+import os
+import shutil
+import threading
+import unicodedata
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+# Folder of cached PDFs, and threads rendering them in the background
+PDF_CACHE_DIR = os.environ.get('QUOTE_PDF_CACHE', 'quote_pdfs')
+PDF_WORKERS = int(os.environ.get('QUOTE_PDF_WORKERS', '2'))
+
+# Part of every cache key: bump it when the layout changes so old PDFs aren't reused
+PDF_LAYOUT_VERSION = '1'
+
+# A4 in points, and the text layout on it
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 56
+FONT_SIZE = 10
+HEADING_SIZE = 12
+LEADING = 14
+# Courier glyphs are 0.6 em wide, so this many characters fit across the page
+LINE_CHARS = int((PAGE_WIDTH - 2 * MARGIN) / (FONT_SIZE * 0.6))
+
+# Letter lines made only of these characters are drawn as a horizontal rule
+RULE_CHARS = set('━─═-_')
+
+
+# Function to get the cache key of a letter
+def content_key(letter, title='Quotation'):
+    """
+    Returns the hex SHA-256 of everything that goes into the PDF: the layout
+    version, the title and the letter text.
+    """
+    return hashlib.sha256(f"{PDF_LAYOUT_VERSION}\n{title}\n{letter}".encode('utf-8')).hexdigest()
+
+
+# Function to keep only the characters the PDF base fonts can draw
+def _pdf_text(line):
+    """
+    Returns (text, had_symbol): line encoded for WinAnsiEncoding, with emoji and
+    other symbols the base fonts lack dropped (accents are kept where cp1252 has them).
+    """
+    kept, had_symbol = [], False
+    for char in line:
+        try:
+            kept.append(char.encode('cp1252'))
+        except UnicodeEncodeError:
+            plain = unicodedata.normalize('NFKD', char).encode('cp1252', 'ignore')
+            had_symbol = had_symbol or not plain
+            kept.append(plain)
+    text = b''.join(kept).rstrip(b' ')
+    # Drop the space left behind by a leading emoji, but keep indentation
+    return (text.lstrip(b' ') if had_symbol else text), had_symbol
+
+
+# Function to wrap one line of text at the page width
+def _wrap(text, width=LINE_CHARS):
+    lines = []
+    while len(text) > width:
+        cut = text.rfind(b' ', 0, width + 1)
+        if cut <= 0:
+            cut = width
+        lines.append(text[:cut].rstrip(b' '))
+        text = text[cut:].lstrip(b' ')
+    lines.append(text)
+    return lines
+
+
+# Function to lay the letter out as styled lines
+def letter_lines(letter):
+    """
+    Returns a list of (style, text) with style 'heading', 'text' or 'rule'.
+    Lines that start with a symbol (the letter's section headings, e.g.
+    '📋 TERMS & CONDITIONS') become headings; long lines are wrapped.
+    """
+    lines = []
+    for raw in letter.splitlines():
+        raw = raw.rstrip()
+        if raw and set(raw) <= RULE_CHARS and len(raw) > 3:
+            lines.append(('rule', b''))
+            continue
+        text, had_symbol = _pdf_text(raw)
+        heading = had_symbol and bool(text) and not unicodedata.category(raw.lstrip()[0]).startswith('L')
+        for part in _wrap(text):
+            lines.append(('heading' if heading else 'text', part))
+    return lines
+
+
+# Function to escape text for a PDF string literal
+def _escape(text):
+    return text.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+# Function to draw one page's lines
+def _page_content(lines):
+    ops = []
+    y = PAGE_HEIGHT - MARGIN
+    for style, text in lines:
+        y -= LEADING
+        if style == 'rule':
+            ops.append(f"0.5 w {MARGIN} {y + 4} m {PAGE_WIDTH - MARGIN} {y + 4} l S".encode('ascii'))
+        elif text:
+            font, size = ('/F2', HEADING_SIZE) if style == 'heading' else ('/F1', FONT_SIZE)
+            ops.append(b'BT %s %d Tf %d %d Td (%s) Tj ET' % (font.encode('ascii'), size, MARGIN, y, _escape(text)))
+    return b'\n'.join(ops)
+
+
+# Function to render a letter as a PDF
+def render_pdf(letter, title='Quotation'):
+    """
+    Returns the PDF bytes for the letter text. The output only depends on
+    the text and title (no timestamps), so the same letter gives the same file.
+    """
+    lines = letter_lines(letter)
+    per_page = int((PAGE_HEIGHT - 2 * MARGIN) / LEADING)
+    pages = [lines[i:i + per_page] for i in range(0, len(lines), per_page)] or [[]]
+
+    # Objects 1-5 are fixed; each page adds a page object and its content stream
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>',
+        b'<< /Title (%s) /Producer (quote_pdf) >>' % _escape(_pdf_text(title)[0]),
+    ]
+    page_ids = []
+    for page in pages:
+        content = _page_content(page)
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R '
+            b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>' % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+        )
+        page_ids.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % page_id for page_id in page_ids), len(page_ids)
+    )
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R /Info 5 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+# PDFs on disk, named by the hash of their letter
+class PDFCache:
+    """
+    Files live in <folder>/<first two hex digits>/<key>.pdf and are written
+    atomically, so several processes can share the folder.
+    """
+
+    def __init__(self, folder=PDF_CACHE_DIR):
+        self.folder = folder
+
+    def path(self, key):
+        return os.path.join(self.folder, key[:2], f"{key}.pdf")
+
+    def get(self, key):
+        """
+        Returns the cached PDF's path, or None if it hasn't been rendered.
+        """
+        path = self.path(key)
+        return path if os.path.exists(path) else None
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+
+# Function run in the bulk worker processes
+def _render_to_cache(folder, letter, title):
+    cache = PDFCache(folder)
+    key = content_key(letter, title)
+    return cache.get(key) or cache.put(key, render_pdf(letter, title))
+
+
+# Background PDF rendering for one cache folder
+class PDFRenderer:
+    """
+    submit() returns a Future for the cached PDF's path straight away; a
+    cache hit is already resolved, and a letter that is already being
+    rendered shares the running job. Bulk jobs use a process pool.
+    """
+
+    def __init__(self, folder=PDF_CACHE_DIR, workers=PDF_WORKERS):
+        self.cache = PDFCache(folder)
+        self._pool = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='quote-pdf')
+        self._lock = threading.Lock()
+        # key -> Future of renders still running
+        self._pending = {}
+
+        # Counters for the debug view, updated from pool threads under _lock
+        self.rendered = 0
+        self.cache_hits = 0
+
+    def _render(self, key, letter, title):
+        try:
+            path = self.cache.get(key) or self.cache.put(key, render_pdf(letter, title))
+            with self._lock:
+                self.rendered += 1
+            return path
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def submit(self, letter, title='Quotation'):
+        """
+        Returns a Future that resolves to the path of the letter's PDF.
+        """
+        key = content_key(letter, title)
+        path = self.cache.get(key)
+        if path is not None:
+            with self._lock:
+                self.cache_hits += 1
+            future = Future()
+            future.set_result(path)
+            return future
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pool.submit(self._render, key, letter, title)
+                self._pending[key] = future
+            return future
+
+    def render_many(self, letters, workers=None):
+        """
+        Renders [(letter, title), ...] and returns their PDF paths in order.
+        Letters missing from the cache are rendered across a process pool
+        (workers=0 renders them in this process).
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        paths = [self.cache.get(content_key(letter, title)) for letter, title in letters]
+        # Identical letters are rendered once
+        missing = {}
+        for index, (item, path) in enumerate(zip(letters, paths)):
+            if path is None:
+                missing.setdefault(tuple(item), []).append(index)
+        with self._lock:
+            self.cache_hits += len(letters) - sum(len(indexes) for indexes in missing.values())
+
+        if workers == 0 or len(missing) < 2:
+            rendered = [_render_to_cache(self.cache.folder, letter, title) for letter, title in missing]
+        else:
+            # Spawned workers only import this module, and are safe to start from a server thread
+            with ProcessPoolExecutor(min(workers, len(missing)), mp_context=multiprocessing.get_context('spawn')) as pool:
+                rendered = list(pool.map(
+                    _render_to_cache, [self.cache.folder] * len(missing),
+                    [letter for letter, _ in missing], [title for _, title in missing], chunksize=16,
+                ))
+        for path, indexes in zip(rendered, missing.values()):
+            for index in indexes:
+                paths[index] = path
+        with self._lock:
+            self.rendered += len(missing)
+        return paths
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+# One renderer per cache folder, shared by every session in this process
+_renderers = {}
+_renderers_lock = threading.Lock()
+
+
+# Function to get the shared PDF renderer
+def get_pdf_renderer(folder=PDF_CACHE_DIR):
+    """
+    Returns the process-wide renderer for folder, starting its threads on first use.
+    """
+    key = os.path.abspath(folder)
+    with _renderers_lock:
+        renderer = _renderers.get(key)
+        if renderer is None:
+            renderer = PDFRenderer(folder)
+            _renderers[key] = renderer
+        return renderer
+
+
+# Finish any PDF still rendering when the server shuts down
+@atexit.register
+def _close_renderers():
+    for renderer in list(_renderers.values()):
+        renderer.close()
+
+
+# Function to bundle PDFs into one zip file
+def zip_pdfs(paths_by_name, out):
+    """
+    Writes {file name in the zip: PDF path} to out (a path or binary file).
+    The letters' content streams are plain text inside the PDFs, so they are deflated.
+    """
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, path in paths_by_name.items():
+            zf.write(path, name)
+
+
+# Function to render the PDFs of every quote matching a history filter
+def render_quotes(quotes, renderer=None, workers=None):
+    """
+    Re-renders the letters of a DataFrame of saved quotes and returns
+    {'<Quote_ID>.pdf': PDF path}, rendering the ones not cached yet in parallel.
+    """
+    from quote_core import render_saved_letter
+
+    renderer = renderer or get_pdf_renderer()
+    records = quotes.to_dict('records')
+    letters = [(render_saved_letter(record), f"Quotation {record['Quote_ID']}") for record in records]
+    paths = renderer.render_many(letters, workers)
+    return {f"{record['Quote_ID']}.pdf": path for record, path in zip(records, paths)}
+
+
+def main():
+    import argparse
+    import time
+
+    import quote_core
+
+    parser = argparse.ArgumentParser(description='Render PDFs of saved quotes matching a history filter')
+    parser.add_argument('--search', default='', help='Customer name, email or address to match')
+    parser.add_argument('--start', default=None, help='Created on or after (YYYY-MM-DD)')
+    parser.add_argument('--end', default=None, help='Created on or before (YYYY-MM-DD)')
+    parser.add_argument('--out', default='quote_pdfs_export', help='Folder (or .zip file) for the PDFs')
+    parser.add_argument('--workers', type=int, default=None, help='Rendering processes (default: one per CPU, 0: none)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    quote_core.init_database()
+    try:
+        quotes = quote_core.get_quote_store().query_quotes(args.search, args.start, args.end)
+    except ValueError as e:
+        parser.exit(1, f"{e}\n")
+    renderer = get_pdf_renderer()
+    pdfs = render_quotes(quotes, renderer, args.workers)
+    if args.out.endswith('.zip'):
+        zip_pdfs(pdfs, args.out)
+    else:
+        os.makedirs(args.out, exist_ok=True)
+        for name, path in pdfs.items():
+            shutil.copyfile(path, os.path.join(args.out, name))
+    print(f"Wrote {len(pdfs)} PDFs to {args.out} ({renderer.rendered} rendered, {renderer.cache_hits} from the cache) "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+Pricing for multi-line quotes.
+
+A quote is a list of line items, (service key, quantity) pairs such as
+[('downlight_install', 12), ('powerpoint_install', 4)]. Catalog prices
+include GST, so a quote's total is the sum of its lines and the GST in it
+is 1/11 of that. Everything is worked out in whole cents on NumPy arrays:
+one quote with hundreds of lines, or thousands of quotes at once, is a
+single pass of array operations.
+
+Stored quotes keep their items as text in the Items column,
+e.g. 'downlight_install*12;powerpoint_install*4'.
+"""
+import threading
+
+# Catalog prices include GST at this rate
+GST_PERCENT = 10
+
+ITEM_SEPARATOR = ';'
+QUANTITY_SEPARATOR = '*'
+
+# Largest quantity accepted on one line
+MAX_QUANTITY = 10000
+
+
+# Function to turn line items into the text stored with a quote
+def format_items(items):
+    """
+    Returns 'key*qty;key*qty' for a list of (service key, quantity) pairs.
+    """
+    return ITEM_SEPARATOR.join(f"{key}{QUANTITY_SEPARATOR}{int(quantity)}" for key, quantity in items)
+
+
+# Function to read line items back from their stored text
+def parse_items(text):
+    """
+    Returns [(service key, quantity), ...] from 'key*qty;key*qty'.
+    A bare key means a quantity of 1; empty text gives no items.
+    Raises ValueError on a malformed quantity.
+    """
+    items = []
+    for part in (text or '').split(ITEM_SEPARATOR):
+        part = part.strip()
+        if not part:
+            continue
+        key, _, quantity = part.partition(QUANTITY_SEPARATOR)
+        try:
+            items.append((key.strip(), int(quantity) if quantity.strip() else 1))
+        except ValueError:
+            raise ValueError(f"Invalid quantity in line item '{part}'") from None
+    return items
+
+
+# Function to tidy up line items from a form, API request or import
+def normalize_items(items, catalog):
+    """
+    Accepts a service key, 'key*qty;...' text, or a list of (key, qty) pairs
+    or {'service_key': ..., 'quantity': ...} dicts. Returns a list of
+    (key, qty) pairs with repeated services merged, in first-seen order.
+    Raises ValueError for unknown services, bad quantities or no items.
+    """
+    if isinstance(items, str):
+        items = parse_items(items)
+    elif not isinstance(items, (list, tuple)):
+        raise ValueError('Line items must be a list of services and quantities.')
+    merged = {}
+    for item in items:
+        if isinstance(item, dict):
+            key, quantity = item.get('service_key'), item.get('quantity', 1)
+        elif isinstance(item, (list, tuple)) and len(item) == 2:
+            key, quantity = item
+        else:
+            raise ValueError(f"Invalid line item {item!r} (expected a service key and quantity).")
+        if not isinstance(key, str) or key not in catalog:
+            raise ValueError(f"Unknown service '{key}' (expected one of: {', '.join(catalog)}).")
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or not 1 <= quantity <= MAX_QUANTITY:
+            raise ValueError(f"Quantity for '{key}' must be a whole number from 1 to {MAX_QUANTITY}.")
+        merged[key] = merged.get(key, 0) + quantity
+    if not merged:
+        raise ValueError('Please add at least one service to the quote.')
+    if any(quantity > MAX_QUANTITY for quantity in merged.values()):
+        raise ValueError(f"Quantity per service can't exceed {MAX_QUANTITY}.")
+    return list(merged.items())
+
+
+# Function to work out the GST inside a GST-inclusive amount
+def gst_included(amount):
+    """
+    Returns the GST part of a dollar amount that includes GST, to the cent.
+    """
+    return _gst_cents(round(amount * 100)) / 100
+
+
+# Function to work out the GST inside GST-inclusive cents (ints or NumPy arrays)
+def _gst_cents(cents):
+    # GST_PERCENT/(100 + GST_PERCENT) of the amount, rounded half up in integer maths
+    return (cents * GST_PERCENT * 2 + 100 + GST_PERCENT) // (2 * (100 + GST_PERCENT))
+
+
+# Unit prices of a catalog as an array indexed by service code
+class PriceTable:
+    """
+    Gives every service in the catalog an integer code (its position) and
+    keeps the GST-inclusive unit prices in cents in an int64 array, so a
+    batch of line items is priced with one fancy-indexing operation.
+    """
+
+    def __init__(self, catalog):
+        import numpy as np
+
+        self.catalog = catalog
+        self.keys = list(catalog)
+        self.codes = {key: code for code, key in enumerate(self.keys)}
+        self.unit_cents = np.array([round(catalog[key]['price'] * 100) for key in self.keys], dtype=np.int64)
+
+    def encode(self, keys):
+        """
+        Returns the service codes for a sequence of keys (KeyError if one is unknown).
+        """
+        import numpy as np
+
+        return np.fromiter((self.codes[key] for key in keys), dtype=np.int64, count=len(keys))
+
+    def price_quotes(self, quote_index, service_codes, quantities, quote_count=None):
+        """
+        Prices many quotes at once from flat line-item arrays: line i belongs to
+        quote quote_index[i] and is quantities[i] of service service_codes[i].
+        Returns a dict of int64 cent arrays with one entry per quote:
+        'total' (GST included), 'gst' and 'subtotal' (ex GST), plus
+        'line_totals' with one entry per line.
+        """
+        import numpy as np
+
+        quote_index = np.asarray(quote_index, dtype=np.int64)
+        quantities = np.asarray(quantities, dtype=np.int64)
+        if quote_count is None:
+            quote_count = int(quote_index.max()) + 1 if len(quote_index) else 0
+
+        line_totals = self.unit_cents[np.asarray(service_codes, dtype=np.int64)] * quantities
+        # Cents stay well inside float64's exact integer range, so bincount's sum is exact
+        totals = np.bincount(quote_index, weights=line_totals, minlength=quote_count).round().astype(np.int64)
+        gst = _gst_cents(totals)
+        return {'total': totals, 'gst': gst, 'subtotal': totals - gst, 'line_totals': line_totals}
+
+    def price_many(self, quotes):
+        """
+        Prices a list of quotes, each a list of normalized (key, quantity) items,
+        in one pass. Returns a QuotePrice (amounts in dollars) per quote.
+        """
+        keys = [key for items in quotes for key, _ in items]
+        quantities = [quantity for items in quotes for _, quantity in items]
+        quote_index = [i for i, items in enumerate(quotes) for _ in items]
+        priced = self.price_quotes(quote_index, self.encode(keys), quantities, quote_count=len(quotes))
+
+        line_totals = priced['line_totals'].tolist()
+        totals, gst, subtotals = priced['total'].tolist(), priced['gst'].tolist(), priced['subtotal'].tolist()
+        unit_cents = self.unit_cents.tolist()
+        results, line = [], 0
+        for i, items in enumerate(quotes):
+            lines = []
+            for key, quantity in items:
+                lines.append(PricedLine(key, self.catalog[key]['name'], quantity,
+                                        unit_cents[self.codes[key]] / 100, line_totals[line] / 100))
+                line += 1
+            results.append(QuotePrice(lines, subtotals[i] / 100, gst[i] / 100, totals[i] / 100))
+        return results
+
+    def price_items(self, items):
+        """
+        Prices one quote's normalized line items. Returns a QuotePrice.
+        """
+        return self.price_many([items])[0]
+
+
+# One priced line of a quote
+class PricedLine:
+    def __init__(self, service_key, name, quantity, unit_price, line_total):
+        self.service_key = service_key
+        self.name = name
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.line_total = line_total
+
+
+# A quote's lines with its subtotal (ex GST), GST and total, in dollars
+class QuotePrice:
+    def __init__(self, lines, subtotal, gst, total):
+        self.lines = lines
+        self.subtotal = float(subtotal)
+        self.gst = float(gst)
+        self.total = float(total)
+
+
+# Price tables of the catalog versions in use, keyed by (catalog path, version),
+# so re-pricing a saved quote with an older version doesn't evict the current one
+PRICE_TABLE_CACHE_SIZE = 8
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+# Function to get the price table for a catalog
+def get_price_table(catalog):
+    """
+    Returns the shared PriceTable for the services of catalog (a
+    quote_catalog.ServiceCatalog), building it on first use. A catalog that
+    wasn't loaded from a file only reuses a table built for that same
+    object, since its version says nothing about its contents.
+    """
+    key = (catalog.path, catalog.version)
+    with _tables_lock:
+        table = _tables.pop(key, None)
+        if table is None or (catalog.path is None and table.catalog is not catalog.services):
+            table = PriceTable(catalog.services)
+        # Most recently used last; the least recently used goes once the cache is full
+        _tables[key] = table
+        while len(_tables) > PRICE_TABLE_CACHE_SIZE:
+            del _tables[next(iter(_tables))]
+        return table
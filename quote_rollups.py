@@ -0,0 +1,268 @@
+"""
+Daily rollups of the quote history: for every day and status, how many quotes
+were created and what they were worth. They are adjusted on every save and
+status change, so revenue and win-rate trends and date-range totals are read
+from a few thousand small entries instead of rescanning every quote.
+
+Days are 'YYYY-MM-DD' strings (the day a quote was created), so they sort
+chronologically and the first seven characters are the month.
+"""
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+# Statuses that count towards the win rate (Won / Closed)
+WON_STATUS = 'Won'
+CLOSED_STATUSES = ['Won', 'Lost']
+
+# Trend periods: label -> number of leading characters of the day key
+TREND_PERIODS = {'day': 10, 'month': 7, 'year': 4}
+
+
+# Function to turn the app's dd/mm/YYYY date into a sortable day key
+def day_key(date_str):
+    """
+    Returns 'YYYY-MM-DD' for a 'dd/mm/YYYY' date, or '' if it isn't one.
+    """
+    if not isinstance(date_str, str) or len(date_str) != 10 or date_str[2] != '/' or date_str[5] != '/':
+        return ''
+    return f"{date_str[6:]}-{date_str[3:5]}-{date_str[:2]}"
+
+
+# Function to read a date-range bound given as a date or text
+def day_arg(value):
+    """
+    Returns the 'YYYY-MM-DD' key for a date, datetime or 'YYYY-MM-DD' string,
+    or None for no bound. Raises ValueError for anything else.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    try:
+        return date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}' (expected YYYY-MM-DD)") from None
+
+
+# Function to get the day after a day key (exclusive end of a range)
+def next_day(day):
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+
+# Function to keep the days between two bounds
+def days_between(daily, start=None, end=None):
+    """
+    Returns the entries of {day: ...} with start <= day <= end (either bound may be None).
+    """
+    if start is None and end is None:
+        return dict(daily)
+    return {
+        day: totals for day, totals in daily.items()
+        if day and (start is None or day >= start) and (end is None or day <= end)
+    }
+
+
+# Function to add up daily rollups into per-status totals
+def summarize_days(daily):
+    """
+    Returns {status: {'count': n, 'value': total price}} over every day in daily.
+    """
+    summary = {}
+    for statuses in daily.values():
+        for status, totals in statuses.items():
+            entry = summary.setdefault(status, {'count': 0, 'value': 0.0})
+            entry['count'] += totals['count']
+            entry['value'] += totals['value']
+    return {status: {'count': t['count'], 'value': round(t['value'], 2)} for status, t in summary.items() if t['count'] > 0}
+
+
+# Function to compare two sets of daily rollups to the cent
+def daily_mismatches(a, b):
+    """
+    Returns the sorted days on which the two rollups disagree.
+    """
+    empty = {'count': 0, 'value': 0.0}
+    mismatched = []
+    for day in sorted(set(a) | set(b)):
+        left, right = a.get(day, {}), b.get(day, {})
+        for status in set(left) | set(right):
+            x, y = left.get(status, empty), right.get(status, empty)
+            if x['count'] != y['count'] or round(x['value'], 2) != round(y['value'], 2):
+                mismatched.append(day)
+                break
+    return mismatched
+
+
+# Function to compute daily rollups from a frame of quotes
+def rollup_frame(df):
+    """
+    Returns {day: {status: {'count', 'value'}}} for a frame with Date, Status
+    and Price columns. Only the distinct dates are converted to day keys.
+    """
+    if df.empty:
+        return {}
+    dates = df['Date'].astype('category').cat.remove_unused_categories()
+    days = dates.cat.rename_categories([day_key(d) for d in dates.cat.categories]).astype(str)
+    grouped = df['Price'].groupby([days, df['Status'].astype(str)]).agg(['count', 'sum'])
+    daily = {}
+    for (day, status), row in grouped.iterrows():
+        daily.setdefault(day, {})[status] = {'count': int(row['count']), 'value': round(float(row['sum']), 2)}
+    return daily
+
+
+# Function to turn daily rollups into a trend table
+def trend_frame(daily, period='month'):
+    """
+    Returns a DataFrame with one row per day, month or year (oldest first) and
+    the columns Quotes, Quoted Value, Won, Won Value and Win Rate % (won out
+    of won + lost, None while nothing in the period has closed yet).
+    """
+    import pandas as pd
+
+    if period not in TREND_PERIODS:
+        raise ValueError(f"Unknown trend period '{period}' (expected one of: {', '.join(TREND_PERIODS)})")
+    width = TREND_PERIODS[period]
+
+    periods = {}
+    for day, statuses in daily.items():
+        if not day:
+            continue
+        row = periods.setdefault(day[:width], {'Quotes': 0, 'Quoted Value': 0.0, 'Won': 0, 'Won Value': 0.0, 'Closed': 0})
+        for status, totals in statuses.items():
+            row['Quotes'] += totals['count']
+            row['Quoted Value'] += totals['value']
+            if status == WON_STATUS:
+                row['Won'] += totals['count']
+                row['Won Value'] += totals['value']
+            if status in CLOSED_STATUSES:
+                row['Closed'] += totals['count']
+
+    columns = ['Quotes', 'Quoted Value', 'Won', 'Won Value', 'Win Rate %']
+    if not periods:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame.from_dict(periods, orient='index').sort_index()
+    df['Quoted Value'] = df['Quoted Value'].round(2)
+    df['Won Value'] = df['Won Value'].round(2)
+    df['Win Rate %'] = (df['Won'] / df['Closed'].where(df['Closed'] > 0) * 100).round(1)
+    df.index.name = period.capitalize()
+    return df[columns]
+
+
+# Materialized daily rollups for the CSV backend, one small JSON file per month
+class DailyRollups:
+    """
+    Keeps {day: {status: {'count': n, 'value': total price}}} in a folder of
+    'YYYY-MM.json' files. A write batch only rewrites the months it touched
+    (normally just the current one), so its cost doesn't grow with history,
+    and reads only re-load the files whose mtime changed.
+    Like StatusAggregates, rebuild it from the quotes if it ever drifts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # month -> (mtime_ns, {day: {status: totals}})
+        self._cached = {}
+
+    def exists(self):
+        return os.path.isdir(self.path)
+
+    def _month_path(self, month):
+        return os.path.join(self.path, f"{month}.json")
+
+    def _months(self):
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith('.json'))
+
+    def _read_month(self, month):
+        """
+        Returns one month's days, re-reading its file only when it changed.
+        Call with the lock held; don't modify the result.
+        """
+        path = self._month_path(month)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self._cached.pop(month, None)
+            return {}
+        cached = self._cached.get(month)
+        if cached is None or cached[0] != mtime_ns:
+            with open(path, encoding='utf-8') as f:
+                cached = (mtime_ns, json.load(f))
+            self._cached[month] = cached
+        return cached[1]
+
+    def read(self, start=None, end=None):
+        """
+        Returns the rollups for the days from start to end ('YYYY-MM-DD', inclusive).
+        Only the month files overlapping the range are read.
+        """
+        with self.lock:
+            daily = {}
+            for month in self._months():
+                if (start is not None and month < start[:7]) or (end is not None and month > end[:7]):
+                    continue
+                for day, statuses in self._read_month(month).items():
+                    daily[day] = {status: dict(totals) for status, totals in statuses.items()}
+        return days_between(daily, start, end)
+
+    def _write_month(self, month, days):
+        path = self._month_path(month)
+        if not days:
+            if os.path.exists(path):
+                os.remove(path)
+            self._cached.pop(month, None)
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(days, f, sort_keys=True, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def replace(self, daily):
+        """
+        Overwrites every stored day (used by rebuild).
+        """
+        months = {}
+        for day, statuses in daily.items():
+            months.setdefault(day[:7] if day else 'unknown', {})[day] = {
+                status: {'count': int(t['count']), 'value': round(float(t['value']), 2)}
+                for status, t in statuses.items()
+            }
+        with self.lock:
+            os.makedirs(self.path, exist_ok=True)
+            for month in set(self._months()) | set(months):
+                self._write_month(month, months.get(month, {}))
+
+    def apply(self, deltas):
+        """
+        Applies a list of (day, status, count_delta, value_delta) changes,
+        rewriting each touched month once.
+        """
+        by_month = {}
+        for delta in deltas:
+            by_month.setdefault(delta[0][:7] if delta[0] else 'unknown', []).append(delta)
+        with self.lock:
+            os.makedirs(self.path, exist_ok=True)
+            for month, changes in by_month.items():
+                days = {day: dict(statuses) for day, statuses in self._read_month(month).items()}
+                for day, status, count_delta, value_delta in changes:
+                    statuses = days.setdefault(day, {})
+                    totals = dict(statuses.get(status, {'count': 0, 'value': 0.0}))
+                    totals['count'] += count_delta
+                    totals['value'] = round(totals['value'] + value_delta, 2)
+                    if totals['count'] > 0:
+                        statuses[status] = totals
+                    else:
+                        statuses.pop(status, None)
+                        if not statuses:
+                            del days[day]
+                self._write_month(month, days)
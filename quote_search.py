@@ -0,0 +1,258 @@
+import re
+import threading
+
+# Runs of whitespace are treated as a single space when indexing and searching
+_WHITESPACE = re.compile(r'\s+')
+
+# The same runs for pandas' vectorized (Arrow) regex engine, whose \s only
+# matches ASCII whitespace: every character str.isspace() accepts, spelled out
+_WHITESPACE_RUN = '[\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]+'
+
+# Fields joined with a newline can't produce a match across two fields,
+# because a normalized search term never contains a newline
+FIELD_SEPARATOR = '\n'
+
+# Most documents a segment of the index holds; bigger ones are split into several
+SEGMENT_ROWS = 65536
+
+# Characters (rows x longest document) turned into trigram codes at a time while indexing
+_BUILD_BATCH_CHARS = 1 << 21
+
+
+# Function to normalize text for searching
+def normalize_search_text(text):
+    """
+    Lower-cases text and collapses whitespace so 'John  SMITH ' matches 'john smith'.
+    Missing values (None/NaN) become an empty string.
+    """
+    if not isinstance(text, str):
+        return ''
+    return _WHITESPACE.sub(' ', text).strip().casefold()
+
+
+# Function to normalize a whole column of text for searching
+def normalize_search_column(values):
+    """
+    Vectorized normalize_search_text(): returns a Series of str (0..n-1 index)
+    holding the normalized text of each value.
+    """
+    import pandas as pd
+
+    text = pd.Series(values).reset_index(drop=True)
+    if text.dtype != 'str':
+        text = text.where(text.map(lambda value: isinstance(value, str)), None).astype('str')
+    return text.fillna('').str.replace(_WHITESPACE_RUN, ' ', regex=True).str.strip(' ').str.casefold()
+
+
+# Function to get the distinct trigrams of a string
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+# Function to get the numeric codes of the distinct trigrams of a string
+def _trigram_codes(text):
+    """
+    Codes pack the three code points (each below 2**21) into one integer, the
+    same way _doc_trigram_codes() does for whole columns.
+    """
+    import numpy as np
+
+    return np.array(sorted({(ord(gram[0]) << 42) | (ord(gram[1]) << 21) | ord(gram[2]) for gram in trigrams(text)}),
+                    dtype=np.int64)
+
+
+# Function to list every trigram in a column of documents
+def _doc_trigram_codes(docs):
+    """
+    Returns (codes, rows): the code of every trigram occurrence in docs (a
+    Series of normalized text) and the row it occurs in. The documents become
+    a fixed-width UTF-32 matrix, so the codes come from three shifted column
+    slices. Rows are taken shortest first, in batches no bigger than
+    _BUILD_BATCH_CHARS cells, so one long address doesn't widen every row.
+    """
+    import numpy as np
+
+    lengths = docs.str.len().to_numpy()
+    order = np.argsort(lengths, kind='stable')
+    order = order[lengths[order] >= 3]
+    text = docs.to_numpy(dtype=object)
+    codes, rows = [], []
+    start = 0
+    while start < len(order):
+        size = min(_BUILD_BATCH_CHARS // lengths[order[start]], len(order) - start)
+        while size > 1 and size * lengths[order[start + size - 1]] > _BUILD_BATCH_CHARS:
+            size //= 2
+        batch = order[start:start + max(size, 1)]
+        start += len(batch)
+        chars = text[batch].astype(str)
+        width = chars.dtype.itemsize // 4
+        points = chars.view(np.uint32).reshape(len(batch), width).astype(np.int64)
+        # Padding past the end of a document is NUL, so a trigram ending in it isn't one
+        present = points[:, 2:] != 0
+        grams = (points[:, :-2] << 42) | (points[:, 1:-1] << 21) | points[:, 2:]
+        codes.append(grams[present])
+        rows.append(np.broadcast_to(batch[:, None], present.shape)[present])
+    if not codes:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    return np.concatenate(codes), np.concatenate(rows)
+
+
+# One immutable block of consecutively numbered documents
+class _Segment:
+    """
+    Postings in CSR form: codes is the sorted array of the distinct trigram
+    codes, and the rows (within the segment) containing codes[i] are
+    rows[starts[i]:starts[i + 1]], in ascending order.
+    """
+
+    __slots__ = ('first', 'docs', 'short', 'codes', 'starts', 'rows')
+
+    def __init__(self, first, docs):
+        import numpy as np
+
+        self.first = first
+        self.docs = docs
+        # Documents too short to hold a trigram
+        self.short = np.flatnonzero(docs.str.len().to_numpy() < 3)
+        codes, rows = _doc_trigram_codes(docs)
+        # Sorting and dropping repeats by hand: np.unique() is several times slower here
+        self.codes = np.sort(codes)
+        self.codes = self.codes[np.concatenate(([True], self.codes[1:] != self.codes[:-1]))]
+        # One sort of (code number, row) pairs orders each posting list, and repeats end up adjacent
+        stride = max(len(docs), 1)
+        pairs = np.sort(np.searchsorted(self.codes, codes) * stride + rows)
+        pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+        self.rows = (pairs % stride).astype(np.int32)
+        self.starts = np.zeros(len(self.codes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs // stride, minlength=len(self.codes)), out=self.starts[1:])
+
+    def __len__(self):
+        return len(self.docs)
+
+    def search(self, codes, term):
+        """
+        Returns the sorted rows (within the segment) whose document contains
+        term, whose distinct trigram codes are codes.
+        """
+        import numpy as np
+
+        found = np.minimum(np.searchsorted(self.codes, codes), len(self.codes) - 1)
+        if not len(self.codes) or (self.codes[found] != codes).any():
+            return np.array([], dtype=np.int32)
+        postings = sorted((self.rows[self.starts[i]:self.starts[i + 1]] for i in found), key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            if len(candidates) == 0:
+                break
+            # Binary-search the candidates in the (possibly much longer) sorted list
+            found = np.minimum(np.searchsorted(posting, candidates), len(posting) - 1)
+            candidates = candidates[posting[found] == candidates]
+
+        # Sharing every trigram doesn't guarantee the trigrams are adjacent
+        if len(term) > 3 and len(candidates):
+            candidates = candidates[self.docs.take(candidates).str.contains(term, regex=False).to_numpy()]
+        return candidates
+
+    def search_short(self, term):
+        """
+        Returns the sorted rows whose document contains term, of one or two
+        characters. Wherever it occurs in a document of three or more
+        characters, it is part of a trigram, so the rows are the union of the
+        postings of every trigram containing it; only shorter documents are checked.
+        """
+        import numpy as np
+
+        points = [ord(char) for char in term]
+        low = (1 << 21) - 1
+        if len(points) == 1:
+            wanted = ((self.codes >> 42) == points[0]) | (((self.codes >> 21) & low) == points[0]) | ((self.codes & low) == points[0])
+        else:
+            pair = (points[0] << 21) | points[1]
+            wanted = ((self.codes >> 21) == pair) | ((self.codes & ((1 << 42) - 1)) == pair)
+        hits = np.zeros(len(self.docs), dtype=bool)
+        selected = np.flatnonzero(wanted)
+        if len(selected):
+            hits[np.concatenate([self.rows[self.starts[i]:self.starts[i + 1]] for i in selected])] = True
+        if len(self.short):
+            hits[self.short[self.docs.take(self.short).str.contains(term, regex=False).to_numpy()]] = True
+        return np.flatnonzero(hits)
+
+
+# In-memory substring index over customer details
+class TrigramIndex:
+    """
+    Maps every 3-character sequence to the sorted list of documents containing it.
+    A search intersects the lists for the term's trigrams (smallest first) and
+    only checks the few remaining candidates, instead of scanning every quote.
+    Documents are numbered 0, 1, 2, ... in the order they are added, so new
+    quotes can be indexed as they are appended.
+
+    The lists live in immutable segments built with NumPy. Appended documents
+    start a new segment, and trailing segments no bigger than the new one are
+    rebuilt together with it (up to SEGMENT_ROWS documents), so saving quotes
+    one at a time leaves a handful of segments, not one per quote.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._segments = []
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, *fields):
+        """
+        Indexes one document made of the given fields and returns its number.
+        """
+        with self.lock:
+            doc_id = self._count
+            self._add_docs(self._join_fields([field] for field in fields))
+        return doc_id
+
+    def add_many(self, *columns):
+        """
+        Indexes one document per row of the given equal-length columns.
+        """
+        docs = self._join_fields(columns)
+        with self.lock:
+            self._add_docs(docs)
+
+    @staticmethod
+    def _join_fields(columns):
+        docs = None
+        for column in columns:
+            text = normalize_search_column(column)
+            docs = text if docs is None else docs + FIELD_SEPARATOR + text
+        return docs
+
+    def _add_docs(self, docs):
+        import pandas as pd
+
+        for start in range(0, len(docs), SEGMENT_ROWS):
+            chunk = docs.iloc[start:start + SEGMENT_ROWS].reset_index(drop=True)
+            segments = self._segments
+            while segments and len(segments[-1]) <= len(chunk) and len(segments[-1]) + len(chunk) <= SEGMENT_ROWS:
+                chunk = pd.concat([segments[-1].docs, chunk], ignore_index=True)
+                segments = segments[:-1]
+            first = segments[-1].first + len(segments[-1]) if segments else 0
+            # Searches read the list without the lock, so it is replaced rather than changed
+            self._segments = segments + [_Segment(first, chunk)]
+        self._count += len(docs)
+
+    def search(self, term):
+        """
+        Returns a sorted NumPy array of the documents containing term as a substring.
+        """
+        import numpy as np
+
+        term = normalize_search_text(term)
+        segments = self._segments
+        if not term:
+            return np.arange(sum(len(segment) for segment in segments))
+        if len(term) < 3:
+            matches = [segment.first + segment.search_short(term) for segment in segments]
+        else:
+            codes = _trigram_codes(term)
+            matches = [segment.first + segment.search(codes, term).astype(np.int64) for segment in segments]
+        return np.concatenate(matches) if matches else np.array([], dtype=np.int64)
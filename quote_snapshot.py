@@ -0,0 +1,193 @@
+import os
+
+# Columns with only a handful of distinct values, stored as categorical codes
+CATEGORY_COLUMNS = ['Service', 'Status', 'Service_ID', 'Catalog_Version']
+
+# Date and Time repeat heavily too (many quotes per day), so they are
+# categoricals as well, in memory and on disk
+DATETIME_COLUMNS = ['Date', 'Time']
+
+DATE_FORMAT = '%d/%m/%Y'
+TIME_FORMAT = '%H:%M:%S'
+SECONDS_PER_DAY = 86400
+
+# Metadata keys recording which part of the CSV a snapshot covers
+META_CSV_SIZE = b'csv_size'
+META_CSV_FINGERPRINT = b'csv_fingerprint'
+
+
+# Function to check whether snapshots can be used
+def snapshots_available():
+    """
+    Returns True if pyarrow (installed alongside Streamlit) can be imported.
+    Without it the store simply keeps reading the CSV.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Function to shrink a freshly parsed CSV chunk
+def categorize(df):
+    """
+    Converts the repetitive text columns to categoricals with sorted categories.
+    Applied to every parsed chunk so cached frames stay compact.
+    """
+    for column in CATEGORY_COLUMNS + DATETIME_COLUMNS:
+        if column in df.columns and df[column].dtype.name != 'category':
+            df[column] = df[column].astype('category')
+    if 'Price' in df.columns:
+        df['Price'] = df['Price'].astype('float64')
+    return df
+
+
+# Function to stack cached chunks without losing the categorical dtypes
+def concat_frames(frames):
+    """
+    Concatenates frames, merging categorical columns with union_categoricals
+    (a plain pd.concat would turn differing categoricals back into objects).
+    """
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+
+    non_empty = [f for f in frames if len(f)]
+    if len(non_empty) <= 1:
+        return non_empty[0] if non_empty else frames[0]
+    frames = non_empty
+
+    # Stack column by column so categoricals never get expanded to strings
+    merged = {}
+    for column in frames[0].columns:
+        parts = [f[column] for f in frames]
+        if all(p.dtype.name == 'category' for p in parts):
+            try:
+                merged[column] = union_categoricals(parts, sort_categories=True)
+            except TypeError:
+                # Categories of different types (e.g. numbers in one chunk only)
+                merged[column] = pd.concat([p.astype(object) for p in parts], ignore_index=True).astype('category')
+        else:
+            merged[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(merged)
+
+
+# Function to parse the distinct values of a text column
+def _parse_categories(series, fmt):
+    """
+    Returns (parsed categories, codes, valid) for series: valid is False for
+    rows that are missing or fail to parse.
+    """
+    import pandas as pd
+
+    series = series.astype('category').cat.remove_unused_categories()
+    parsed = pd.to_datetime(pd.Series(series.cat.categories), format=fmt, errors='coerce')
+    codes = series.cat.codes.to_numpy()
+    valid = codes >= 0
+    bad = parsed.isna().to_numpy()
+    if bad.any():
+        valid &= ~bad[codes]
+    return parsed, codes, valid
+
+
+# Function to turn Date/Time text into epoch seconds
+def to_epoch_seconds(date, time, invalid=None):
+    """
+    Returns int64 seconds since 1970-01-01 for the local wall-clock Date/Time.
+    Rows that can't be parsed get the value invalid, or if that is None the
+    whole call returns None. Only the distinct values are parsed and then
+    mapped through the category codes, so it stays fast on large frames.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if len(date) == 0:
+        return np.array([], dtype=np.int64)
+
+    dates = _parse_categories(date, DATE_FORMAT)
+    times = _parse_categories(time, TIME_FORMAT)
+    valid = dates[2] & times[2]
+    if invalid is None and not valid.all():
+        return None
+
+    epoch = pd.Timestamp('1970-01-01')
+    day_starts = ((dates[0] - epoch) // pd.Timedelta(seconds=1)).fillna(0).to_numpy(dtype=np.int64)
+    seconds = (times[0].dt.hour * 3600 + times[0].dt.minute * 60 + times[0].dt.second).fillna(0).to_numpy(dtype=np.int64)
+    timestamps = day_starts[dates[1]] + seconds[times[1]]
+    if not valid.all():
+        timestamps[~valid] = invalid
+    return timestamps
+
+
+# Function to write a columnar snapshot of the parsed CSV
+def write_snapshot(path, df, csv_size, csv_fingerprint):
+    """
+    Writes df (the first csv_size bytes of the CSV, already parsed) to an
+    uncompressed Arrow IPC file that can be memory-mapped on the next load.
+    Service, Status, Date and Time are dictionary-encoded, so they load
+    straight back as categoricals without parsing anything, and Price is
+    float64. Returns False (writing nothing) if pyarrow is missing.
+    """
+    if not snapshots_available():
+        return False
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    columns = {}
+    for column in df.columns:
+        if column in CATEGORY_COLUMNS + DATETIME_COLUMNS:
+            columns[column] = pa.array(df[column].astype('category')).cast(pa.dictionary(pa.int32(), pa.string()))
+        elif column == 'Price':
+            columns[column] = pa.array(df[column].to_numpy(dtype='float64'))
+        else:
+            columns[column] = pa.array(df[column].astype(object).where(df[column].notna(), None).tolist(), type=pa.string())
+
+    table = pa.table(columns).replace_schema_metadata({
+        META_CSV_SIZE: str(csv_size).encode(),
+        META_CSV_FINGERPRINT: csv_fingerprint.hex().encode(),
+    })
+
+    # Write next to the target and rename, so readers never see half a snapshot
+    tmp_path = f"{path}.tmp"
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+    return True
+
+
+# Function to load a snapshot if it still matches the CSV
+def read_snapshot(path, csv_file, columns):
+    """
+    Memory-maps the snapshot and returns (df, csv_size), where df holds the
+    first csv_size bytes of the open CSV file. Returns None when there is no
+    usable snapshot (missing, or not holding exactly these columns) or the
+    CSV no longer starts with the bytes it was taken from.
+    """
+    if not os.path.exists(path) or not snapshots_available():
+        return None
+    import pyarrow as pa
+
+    # The table's columns point straight into the mapped file (no copy); the
+    # mapping stays alive for as long as they do
+    try:
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+    metadata = table.schema.metadata or {}
+    try:
+        csv_size = int(metadata[META_CSV_SIZE])
+        fingerprint = bytes.fromhex(metadata[META_CSV_FINGERPRINT].decode())
+    except (KeyError, ValueError):
+        return None
+
+    csv_file.seek(0, os.SEEK_END)
+    if csv_file.tell() < csv_size:
+        return None
+    csv_file.seek(csv_size - len(fingerprint))
+    if csv_file.read(len(fingerprint)) != fingerprint:
+        return None
+    # A snapshot in any other layout is simply rebuilt from the CSV
+    if set(table.schema.names) != set(columns):
+        return None
+
+    return categorize(table.to_pandas().reindex(columns=columns)), csv_size
@@ -0,0 +1,2403 @@
+import atexit
+import csv
+import functools
+import io
+import os
+import threading
+import time
+import uuid
+
+from quote_archive import ARCHIVE_STATUSES, QuoteArchive, month_keys
+from quote_metrics import STORE_OPERATION_METRIC, timed
+from quote_rollups import (
+    DailyRollups, daily_mismatches, day_arg, day_key, days_between, next_day, rollup_frame, summarize_days,
+)
+from quote_search import TrigramIndex, normalize_search_text
+from quote_snapshot import SECONDS_PER_DAY, categorize, concat_frames, read_snapshot, to_epoch_seconds, write_snapshot
+
+# Column layout of the quotes database (shared by the app and the store)
+# Items lists a multi-line quote's services as 'key*qty;key*qty' (see quote_pricing);
+# Service is then a summary of them and Price the GST-inclusive total.
+# Service_ID is the catalog ID of a single-service quote and Catalog_Version
+# the services.json version it was priced with (see quote_catalog).
+# Customer_ID is the customer in the registry (see quote_customers), empty for
+# quotes saved before it or for customers with no email address or phone number.
+# Customer_Version is the version of the registry's details the quote was made
+# with; the CSV then leaves the customer fields empty and they are filled in
+# from the registry when read, as they were when the quote was made
+QUOTE_COLUMNS = [
+    'Quote_ID', 'Date', 'Time', 'Customer_Name', 'Customer_Email', 'Customer_Address', 'Service', 'Price', 'Status',
+    'Items', 'Service_ID', 'Catalog_Version', 'Customer_ID', 'Customer_Version',
+]
+
+# Customer fields a CSV row leaves to the registry when it has a Customer_Version
+REGISTRY_CUSTOMER_COLUMNS = ['Customer_Name', 'Customer_Email', 'Customer_Address']
+
+# Everything but the price is text (an all-digit Quote_ID must not become a number)
+QUOTE_DTYPES = {column: str for column in QUOTE_COLUMNS if column != 'Price'}
+
+# fsync is expensive, so bursts of saves share one sync.
+# A sync happens after this many appends, or once this many seconds have passed.
+FSYNC_BATCH_SIZE = 16
+FSYNC_INTERVAL = 0.5
+
+# Status changes are appended to a small log next to the CSV and folded in on read.
+# Once the log holds this many changes it is compacted back into the CSV.
+STATUS_LOG_COLUMNS = ['Quote_ID', 'Status', 'Changed_At']
+STATUS_LOG_COMPACT_THRESHOLD = 1000
+
+# Quotes saved since the quotes file was last read are looked up from memory;
+# after this many the next write batch re-reads the file instead
+RECENT_QUOTES_LIMIT = 5000
+
+
+# Customer fields covered by the history search box
+SEARCH_COLUMNS = ['Customer_Name', 'Customer_Email', 'Customer_Address']
+
+# A published frame with at least this many rows not yet in its search index
+# is indexed on a background thread; smaller gaps are filled by the next search
+SEARCH_PREBUILD_ROWS = 1000
+
+# Fields the history view can sort by ('created' is the order quotes were saved in)
+SORT_FIELDS = ['created', 'Customer_Name', 'Price', 'Status']
+
+# Rows per DataFrame handed out by iter_quotes()
+ITER_CHUNK_ROWS = 5000
+
+
+# Function to create a new quote ID
+def new_quote_id():
+    """
+    Returns a short random ID that identifies a quote for its whole lifetime.
+    Unlike a row number it never changes when other quotes are added or edited.
+    """
+    return uuid.uuid4().hex[:12].upper()
+
+
+# Append-only writer for the quotes CSV
+class QuoteJournal:
+    """
+    Appends quote records to the end of the CSV file one line at a time.
+    Saving a quote costs the same no matter how many quotes are already stored.
+    Each record is written with a single write() so a crash can only ever leave
+    a torn last line, which is trimmed off the next time the file is opened.
+    """
+
+    def __init__(self, path, columns=QUOTE_COLUMNS, fsync_batch_size=FSYNC_BATCH_SIZE, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.columns = list(columns)
+        self.fsync_batch_size = fsync_batch_size
+        self.fsync_interval = fsync_interval
+        # Held while writing; hold it yourself to keep appends out during a rewrite
+        self.lock = threading.RLock()
+        self._file = None
+        self._inode = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._timer = None
+
+    def _encode(self, record):
+        """
+        Turns a record dict into one CSV line in the database column order.
+        Uses the csv module so quoting matches what pandas writes.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(['' if record.get(col) is None else record.get(col) for col in self.columns])
+        return buffer.getvalue().encode('utf-8')
+
+    def _repair_tail(self, f):
+        """
+        Drops a partially written last line left behind by a crash.
+        Without this the next record would be glued onto the torn one.
+        """
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+
+        # Look backwards for the last newline, reading in small blocks
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+
+        pos = size
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step)
+            newline = block.rfind(b'\n')
+            if newline != -1:
+                f.truncate(pos + newline + 1)
+                return
+
+        # No complete line at all (not even the header) - start the file over
+        f.truncate(0)
+
+    def _open(self):
+        """
+        Opens the journal for appending, reopening it if the file was replaced.
+        Writes the header row when the file is new or empty.
+        """
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+
+        if self._file is not None and inode == self._inode:
+            return self._file
+
+        self._close()
+        f = open(self.path, 'a+b')
+        self._repair_tail(f)
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            header = io.StringIO()
+            csv.writer(header, lineterminator='\n').writerow(self.columns)
+            f.write(header.getvalue().encode('utf-8'))
+            f.flush()
+        self._file = f
+        self._inode = os.fstat(f.fileno()).st_ino
+        return f
+
+    def _close(self):
+        if self._file is not None:
+            try:
+                self._sync_locked()
+                self._file.close()
+            finally:
+                self._file = None
+                self._inode = None
+
+    def _sync_locked(self):
+        """
+        Forces pending appends to disk. Caller must hold the lock.
+        """
+        if self._file is not None and self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _timer_sync(self):
+        with self.lock:
+            self._timer = None
+            self._sync_locked()
+
+    def append(self, record, defer_sync=False):
+        """
+        Appends one quote record to the journal.
+        The line reaches the OS immediately; the fsync is batched with other saves.
+        With defer_sync the caller takes care of calling sync() itself (group commit).
+        Returns (offset, line): where the record starts in the file and its bytes.
+        """
+        line = self._encode(record)
+        with self.lock:
+            f = self._open()
+            f.write(line)
+            f.flush()
+            offset = f.tell() - len(line)
+            self._pending += 1
+
+            if defer_sync:
+                pass
+            elif self._pending >= self.fsync_batch_size or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+            elif self._timer is None:
+                # Make sure the tail of a burst still gets synced shortly after
+                self._timer = threading.Timer(self.fsync_interval, self._timer_sync)
+                self._timer.daemon = True
+                self._timer.start()
+        return offset, line
+
+    def sync(self):
+        """
+        Flushes and fsyncs everything appended so far.
+        """
+        with self.lock:
+            self._sync_locked()
+
+    def rewrite(self, write):
+        """
+        Atomically replaces the whole file with what write(f) puts into a text file.
+        The new contents are fsynced to a temp file first and then renamed over the
+        old one, so readers see either the old file or the new one, never a mix.
+        """
+        with self.lock:
+            self._close()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def close(self):
+        """
+        Syncs and closes the underlying file handle.
+        """
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._close()
+
+
+# Journals are kept at module level so they survive Streamlit reruns
+_journals = {}
+_registry_lock = threading.Lock()
+
+
+# Function to get the shared journal for a CSV file
+def get_journal(path, columns=QUOTE_COLUMNS):
+    """
+    Returns the process-wide journal for the given CSV path.
+    All sessions share one writer so their fsyncs can be batched together.
+    """
+    key = os.path.abspath(path)
+    with _registry_lock:
+        journal = _journals.get(key)
+        if journal is None:
+            journal = QuoteJournal(path, columns)
+            _journals[key] = journal
+        return journal
+
+
+# Make sure nothing is left unsynced when the server shuts down
+@atexit.register
+def _close_journals():
+    for journal in list(_journals.values()):
+        journal.close()
+
+
+# How many bytes before the cached end are compared to spot in-place edits
+CACHE_FINGERPRINT_BYTES = 4096
+
+# The columnar snapshot is refreshed once this many rows were appended after it
+SNAPSHOT_REFRESH_ROWS = 10000
+
+
+# Parsed-CSV cache that survives reruns and only re-reads what changed
+class CSVFileCache:
+    """
+    Keeps the parsed DataFrame of one CSV file in memory.
+    The cache is keyed on the file's identity (device + inode), size and mtime.
+    If the file only grew, just the new tail is parsed and added to the cached
+    frame; any other change (rewrite, rename, edit) triggers a full re-parse.
+    """
+
+    def __init__(self, path, columns, read_kwargs=None, prepare=None, load_base=None):
+        """
+        prepare(df) post-processes every parsed chunk (e.g. dtype conversion).
+        load_base(f) may return (df, size) with the first size bytes of the open
+        file already parsed (e.g. from a snapshot); only the rest is then parsed.
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.read_kwargs = read_kwargs or {}
+        self.prepare = prepare
+        self.load_base = load_base
+        # Reentrant so read_versioned() can hold it across read()
+        self.lock = threading.RLock()
+        self.generation = 0
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forgets the cached frame so the next read parses the whole file.
+        """
+        self._identity = None
+        self._size = 0
+        self._mtime_ns = None
+        self._fingerprint = b''
+        self._chunks = []
+        # Lines we appended ourselves, parsed together on the next read
+        self._unparsed = []
+        # Rows that came from load_base rather than from parsing CSV text
+        self.base_rows = 0
+        # Bumped whenever cached rows may have changed rather than just grown
+        self.generation += 1
+
+    def _parse(self, data, header):
+        import pandas as pd
+
+        if header:
+            df = pd.read_csv(io.BytesIO(data), **self.read_kwargs)
+        else:
+            df = pd.read_csv(io.BytesIO(data), header=None, names=self.columns, **self.read_kwargs)
+        return self.prepare(df) if self.prepare else df
+
+    def _empty_frame(self):
+        import pandas as pd
+
+        df = pd.DataFrame(columns=self.columns)
+        return self.prepare(df) if self.prepare else df
+
+    def _take_complete_lines(self, data):
+        """
+        Cuts off a half-written last line; it is picked up on a later read.
+        """
+        end = data.rfind(b'\n') + 1
+        return data[:end]
+
+    def _remember(self, stat, size, f_tail):
+        self._identity = (stat.st_dev, stat.st_ino)
+        self._size = size
+        self._mtime_ns = stat.st_mtime_ns
+        self._fingerprint = f_tail
+
+    def _frame(self):
+        """
+        Returns the cached frame, merging appended chunks into one first.
+        """
+        if self._unparsed:
+            self._chunks.append(self._parse(b''.join(self._unparsed), header=False))
+            self._unparsed = []
+        if len(self._chunks) > 1:
+            self._chunks = [concat_frames(self._chunks)]
+        return self._chunks[0]
+
+    def read(self):
+        """
+        Returns the parsed file, re-reading only as much as changed since last time.
+        Returns None if the file doesn't exist. Don't modify the returned frame.
+        """
+        with self.lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self.invalidate()
+                return None
+
+            identity = (stat.st_dev, stat.st_ino)
+            unchanged = (identity == self._identity and stat.st_size == self._size and stat.st_mtime_ns == self._mtime_ns)
+            if unchanged and self._chunks:
+                return self._frame()
+
+            with open(self.path, 'rb') as f:
+                appended = identity == self._identity and stat.st_size > self._size and self._chunks
+                if appended:
+                    # Make sure the part we already parsed is still what's on disk
+                    start = max(0, self._size - len(self._fingerprint))
+                    f.seek(start)
+                    appended = f.read(self._size - start) == self._fingerprint
+
+                if appended:
+                    data = self._take_complete_lines(f.read(stat.st_size - self._size))
+                    if data:
+                        self._chunks.append(self._parse(data, header=False))
+                    size = self._size + len(data)
+                else:
+                    self.generation += 1
+                    base = self.load_base(f) if self.load_base else None
+                    if base is not None:
+                        # Start from the pre-parsed rows and parse only what follows them
+                        df, size = base
+                        self.base_rows = len(df)
+                        self._chunks = [df]
+                        f.seek(size)
+                        data = self._take_complete_lines(f.read(stat.st_size - size))
+                        if data:
+                            self._chunks.append(self._parse(data, header=False))
+                        size += len(data)
+                    else:
+                        f.seek(0)
+                        self.base_rows = 0
+                        data = self._take_complete_lines(f.read(stat.st_size))
+                        self._chunks = [self._parse(data, header=True) if data else self._empty_frame()]
+                        size = len(data)
+
+                start = max(0, size - CACHE_FINGERPRINT_BYTES)
+                f.seek(start)
+                tail = f.read(size - start)
+
+            self._remember(stat, size, tail)
+            return self._frame()
+
+    def read_versioned(self):
+        """
+        Returns (generation, frame): read() together with the generation the
+        frame belongs to, which another thread's read() may move on from right after.
+        """
+        with self.lock:
+            df = self.read()
+            return self.generation, df
+
+    def apply_append(self, offset, line):
+        """
+        Patches the cache with a line we just appended at the given offset.
+        Saves re-reading the file; if the cache isn't exactly at that offset
+        (someone else wrote too) it is simply left for read() to catch up.
+        The line is only parsed on the next read, together with any others
+        appended in the meantime.
+        """
+        with self.lock:
+            if not self._chunks or offset != self._size:
+                return
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self.invalidate()
+                return
+            if (stat.st_dev, stat.st_ino) != self._identity or stat.st_size != offset + len(line):
+                return
+            self._unparsed.append(line)
+            tail = (self._fingerprint + line)[-CACHE_FINGERPRINT_BYTES:]
+            self._remember(stat, offset + len(line), tail)
+
+    def is_current(self):
+        """
+        Returns True if the file hasn't changed since it was read, apart from
+        lines added through apply_append().
+        """
+        with self.lock:
+            if not self._chunks:
+                return False
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return False
+            return ((stat.st_dev, stat.st_ino) == self._identity and stat.st_size == self._size
+                    and stat.st_mtime_ns == self._mtime_ns)
+
+    def state(self):
+        """
+        Returns (df, size, fingerprint) for the cached part of the file, or None.
+        """
+        with self.lock:
+            if not self._chunks:
+                return None
+            return self._frame(), self._size, self._fingerprint
+
+
+# Time index value for rows whose Date/Time can't be parsed (sorts before every real time)
+INVALID_TIME = -2 ** 63
+
+
+# Function to turn a day key into epoch seconds at its midnight (the time index's clock)
+def _day_start_seconds(day):
+    from datetime import date
+
+    return (date.fromisoformat(day) - date(1970, 1, 1)).days * SECONDS_PER_DAY
+
+
+# Sorted index of when each cached row was created
+class TimeIndex:
+    """
+    Holds the creation time of every cached row (epoch seconds of its Date and
+    Time) sorted, with the row position of each, so picking out a date range
+    is two binary searches instead of parsing every row's Date.
+    Rows are numbered in file order and added as they are appended. Quotes are
+    normally saved in time order, so new rows go on the end without a re-sort;
+    anything out of order (e.g. an import of old quotes) triggers one.
+    """
+
+    def __init__(self):
+        import numpy as np
+
+        self.times = np.empty(0, dtype=np.int64)
+        self.order = np.empty(0, dtype=np.int64)
+        # True while row positions are already in time order (order is 0, 1, 2, ...)
+        self.in_order = True
+
+    def __len__(self):
+        return len(self.times)
+
+    def add(self, timestamps):
+        """
+        Adds the times of the next rows in file order.
+        """
+        import numpy as np
+
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if not len(timestamps):
+            return
+        count = len(self.times)
+        if (self.in_order and (count == 0 or timestamps[0] >= self.times[-1])
+                and (len(timestamps) < 2 or bool((timestamps[1:] >= timestamps[:-1]).all()))):
+            self.times = np.concatenate([self.times, timestamps])
+            self.order = np.arange(len(self.times), dtype=np.int64)
+            return
+        all_times = np.empty(count + len(timestamps), dtype=np.int64)
+        all_times[self.order] = self.times
+        all_times[count:] = timestamps
+        self.order = np.argsort(all_times, kind='stable')
+        self.times = all_times[self.order]
+        self.in_order = False
+
+    def between(self, start=None, end=None):
+        """
+        Returns the rows created from start up to (not including) end, both in
+        epoch seconds and either None: a slice when rows are in time order,
+        otherwise a sorted array of positions. Rows without a valid time are
+        never included.
+        """
+        import numpy as np
+
+        lo = int(np.searchsorted(self.times, INVALID_TIME + 1 if start is None else start, 'left'))
+        hi = len(self.times) if end is None else int(np.searchsorted(self.times, end, 'left'))
+        hi = max(lo, hi)
+        if self.in_order:
+            return slice(lo, hi)
+        return np.sort(self.order[lo:hi])
+
+    def at(self, positions):
+        """
+        Returns the times of the rows at positions (a slice or an array).
+        """
+        import numpy as np
+
+        if self.in_order:
+            return self.times[positions]
+        by_position = np.empty_like(self.times)
+        by_position[self.order] = self.times
+        return by_position[positions]
+
+
+# Function to keep only the positions that fall inside a TimeIndex selection
+def _restrict_positions(positions, selection):
+    """
+    positions must be sorted; selection is what TimeIndex.between() returned.
+    """
+    import numpy as np
+
+    if isinstance(selection, slice):
+        return positions[(positions >= selection.start) & (positions < selection.stop)]
+    if not len(selection):
+        return selection
+    found = np.searchsorted(selection, positions)
+    found[found >= len(selection)] = len(selection) - 1
+    return positions[selection[found] == positions]
+
+
+# Search and time indexes over the rows of one frame of quotes
+class FrameIndexes:
+    """
+    A TrigramIndex over the customer fields and a TimeIndex over Date/Time,
+    both numbered by row position. Each is built the first time a query needs
+    it (or, for the search index, by prepare() when the frame is published)
+    and extended as rows are appended to the frame; a new FrameIndexes is
+    started whenever the frame is replaced (its key changes).
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.lock = threading.Lock()
+        self._search = None
+        self._time = None
+        self._prepare_lock = threading.Lock()
+        self._preparing = False
+
+    def prepare(self, df):
+        """
+        Starts indexing the customer fields of df on a background thread when
+        at least SEARCH_PREBUILD_ROWS rows aren't indexed yet, so the first
+        search keystroke doesn't pay for the whole build. A search arriving
+        meanwhile waits for the build to finish.
+        """
+        if len(df) - (len(self._search) if self._search is not None else 0) < SEARCH_PREBUILD_ROWS:
+            return
+        with self._prepare_lock:
+            if self._preparing:
+                return
+            self._preparing = True
+        threading.Thread(target=self._prepare, args=(df,), name='quote-search-index', daemon=True).start()
+
+    def _prepare(self, df):
+        try:
+            self._search_index(df)
+        finally:
+            with self._prepare_lock:
+                self._preparing = False
+
+    def _search_index(self, df):
+        with self.lock:
+            if self._search is None:
+                self._search = TrigramIndex()
+            if len(self._search) < len(df):
+                tail = df.iloc[len(self._search):]
+                self._search.add_many(*(tail[column] for column in SEARCH_COLUMNS))
+            return self._search
+
+    def _time_index(self, df):
+        with self.lock:
+            if self._time is None:
+                self._time = TimeIndex()
+            if len(self._time) < len(df):
+                tail = df.iloc[len(self._time):]
+                self._time.add(to_epoch_seconds(tail['Date'], tail['Time'], invalid=INVALID_TIME))
+            return self._time
+
+    def positions(self, df, search_term=None, start=None, end=None):
+        """
+        Returns the positions of the rows of df whose customer fields contain
+        search_term and that were created between the day keys start and end:
+        None for every row, a slice, or a sorted array.
+        """
+        searching = bool(normalize_search_text(search_term))
+        if not searching and not (start or end):
+            return None
+
+        selection = None
+        if start or end:
+            selection = self._time_index(df).between(
+                _day_start_seconds(start) if start else None,
+                _day_start_seconds(next_day(end)) if end else None,
+            )
+            if not searching:
+                return selection
+
+        positions = self._search_index(df).search(search_term)
+        positions = positions[positions < len(df)]
+        if selection is not None:
+            positions = _restrict_positions(positions, selection)
+        return positions
+
+    def times(self, df, positions):
+        """
+        Returns the creation times (as in TimeIndex) of the rows of df at positions.
+        """
+        return self._time_index(df).at(positions)
+
+
+# Function to put quotes from the hot file and the archive into creation order
+def _in_created_order(df):
+    """
+    Returns df sorted by Date/Time (stable, so quotes saved in the same second
+    keep their order), with a fresh 0..n-1 index.
+    """
+    import numpy as np
+
+    timestamps = to_epoch_seconds(df['Date'], df['Time'], invalid=INVALID_TIME)
+    if len(timestamps) < 2 or bool((timestamps[1:] >= timestamps[:-1]).all()):
+        return df.reset_index(drop=True)
+    return df.iloc[np.argsort(timestamps, kind='stable')].reset_index(drop=True)
+
+
+# Function to drop the categories a few picked-out rows no longer use
+def _trim_categories(df):
+    """
+    Returns df with each categorical column limited to the categories its
+    rows use, so merging a page's worth of matches doesn't union (and sort)
+    every Date and Time of the frames they were picked from.
+    """
+    df = df.copy(deep=False)
+    for column in df.columns:
+        if df[column].dtype.name == 'category':
+            df[column] = df[column].cat.remove_unused_categories()
+    return df
+
+
+# Function to get the month key of today, the first month that isn't archived yet
+def _current_month():
+    from datetime import date
+
+    return date.today().isoformat()[:7]
+
+
+# Function to read a date range given as dates or 'YYYY-MM-DD' text
+def _date_range(start, end):
+    """
+    Returns (start, end) as day keys or None. Raises ValueError for bad dates.
+    """
+    return day_arg(start), day_arg(end)
+
+
+# Materialized per-status totals kept next to the quote data
+class StatusAggregates:
+    """
+    Keeps {status: {'count': n, 'value': total price}} in a small JSON file.
+    Saves and status changes adjust it by a delta instead of rescanning every
+    quote, so the dashboard can read its figures straight from here.
+    If the file and the quotes ever disagree (e.g. after a crash between the
+    two writes or a hand edit), rebuild it from the quotes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._cached = None
+        self._cached_mtime_ns = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def read(self):
+        """
+        Returns the stored totals, re-reading the file only when it changed.
+        """
+        import json
+
+        with self.lock:
+            try:
+                mtime_ns = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                return {}
+            if mtime_ns != self._cached_mtime_ns:
+                with open(self.path, encoding='utf-8') as f:
+                    self._cached = json.load(f)
+                self._cached_mtime_ns = mtime_ns
+            return {status: dict(totals) for status, totals in self._cached.items()}
+
+    def _write(self, summary):
+        import json
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def replace(self, summary):
+        """
+        Overwrites the stored totals (used by rebuild).
+        """
+        summary = {status: {'count': int(t['count']), 'value': round(float(t['value']), 2)} for status, t in summary.items()}
+        self._write(summary)
+
+    def apply(self, deltas):
+        """
+        Applies a list of (status, count_delta, value_delta) changes in one write.
+        """
+        summary = self.read()
+        for status, count_delta, value_delta in deltas:
+            totals = summary.setdefault(status, {'count': 0, 'value': 0.0})
+            totals['count'] += count_delta
+            totals['value'] = round(totals['value'] + value_delta, 2)
+            if totals['count'] <= 0:
+                del summary[status]
+        self._write(summary)
+
+
+# Function to compare two status summaries to the cent
+def summaries_match(a, b):
+    """
+    Returns True if both summaries have the same counts and values (to the cent).
+    """
+    statuses = set(a) | set(b)
+    empty = {'count': 0, 'value': 0.0}
+    return all(
+        a.get(s, empty)['count'] == b.get(s, empty)['count']
+        and round(a.get(s, empty)['value'], 2) == round(b.get(s, empty)['value'], 2)
+        for s in statuses
+    )
+
+
+# Decorator that records how long a store method takes
+def _timed_operation(operation):
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with timed(STORE_OPERATION_METRIC, backend=self.backend, operation=operation):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# The latest quotes of one store, built once and shared read-only by every session
+class PublishedQuotes:
+    """
+    Keeps one frame of quotes per include_archived setting, each tagged with
+    the key of the data it was built from (file generations and row counts,
+    or the database's data version). A frame is built only when its key
+    changes, and is then published under the next version number and never
+    modified again: a write leads to a new frame on the next read, and a
+    session still holding the old one keeps an unchanged copy.
+    Readers get shallow copies. With pandas copy-on-write these share the
+    published columns, and a reader that changes one only copies that column.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+        # include_archived -> (key, version, frame)
+        self._frames = {}
+
+    def get(self, include_archived, key, build):
+        """
+        Returns (version, frame) for key, calling build() for a new frame if
+        the published one is for another key. Concurrent readers wait for one
+        build rather than each building their own.
+        """
+        with self.lock:
+            published = self._frames.get(include_archived)
+            if published is None or published[0] != key:
+                frame = build()
+                self.version += 1
+                published = (key, self.version, frame)
+                self._frames[include_archived] = published
+        return published[1], published[2].copy(deep=False)
+
+
+# Base class for quote storage backends
+class QuoteStore:
+    """
+    Interface shared by every quote storage backend.
+    The app only talks to these methods, so backends can be swapped freely.
+    Subclasses must implement save_quote, load_quotes and update_status; the
+    query helpers fall back to filtering load_quotes() in pandas.
+    Date ranges (start/end) are inclusive days, as dates or 'YYYY-MM-DD' text.
+    Reads cover archived quotes too unless include_archived is False.
+    Each operation's duration is recorded under quote_store_operation_seconds.
+    """
+
+    # Backend name used in metrics labels
+    backend = 'base'
+
+    def init(self):
+        """
+        Creates the underlying storage if it doesn't exist yet.
+        """
+
+    def save_quote(self, record):
+        """
+        Stores a new quote and returns its Quote_ID.
+        A Quote_ID is generated when the record doesn't already have one.
+        """
+        raise NotImplementedError
+
+    def load_quotes(self, include_archived=True):
+        raise NotImplementedError
+
+    def load_versioned(self, include_archived=True):
+        """
+        Returns (version, quotes): load_quotes() plus a number that changes
+        whenever the quotes do, or None if the backend doesn't keep one.
+        Backends that share one published frame between sessions override this.
+        """
+        return None, self.load_quotes(include_archived)
+
+    def update_status(self, quote_id, new_status):
+        raise NotImplementedError
+
+    @_timed_operation('update_statuses')
+    def update_statuses(self, changes):
+        """
+        Applies a list of (quote_id, new_status) changes as one write and
+        returns how many quotes actually changed. Either every change is
+        applied or, if any Quote_ID is unknown, none is (KeyError).
+        """
+        return _single_result(self.write_batch([('statuses', list(changes))]))
+
+    def write_batch(self, operations):
+        """
+        Applies a list of write operations and returns one result per operation:
+        ('save', record) gives the new Quote_ID, ('status', quote_id, new_status)
+        gives None and ('statuses', [(quote_id, new_status), ...]) gives the
+        number of quotes changed. A failing operation's exception is returned in
+        its place instead of being raised, so one bad write doesn't sink the others.
+        Backends override this to commit the whole batch with a single sync.
+        """
+        results = []
+        for operation in operations:
+            try:
+                if operation[0] == 'save':
+                    results.append(self.save_quote(operation[1]))
+                elif operation[0] == 'status':
+                    results.append(self.update_status(operation[1], operation[2]))
+                elif operation[0] == 'statuses':
+                    changes = list(operation[1])
+                    _raise_if_missing([quote_id for quote_id, _ in changes if self.get_quote(quote_id) is None])
+                    changed = 0
+                    for quote_id, new_status in changes:
+                        changed += self.get_quote(quote_id)['Status'] != new_status
+                        self.update_status(quote_id, new_status)
+                    results.append(changed)
+                else:
+                    raise ValueError(f"Unknown write operation '{operation[0]}'")
+            except Exception as e:
+                results.append(e)
+        return results
+
+    @_timed_operation('get_quote')
+    def get_quote(self, quote_id):
+        """
+        Returns one quote as a dict of QUOTE_COLUMNS, or None if there's no such quote.
+        """
+        df = self.load_quotes()
+        rows = df[df['Quote_ID'] == quote_id]
+        return _row_to_record(rows.iloc[0]) if len(rows) else None
+
+    @_timed_operation('query_quotes')
+    def query_quotes(self, search_term=None, start=None, end=None, include_archived=True, statuses=None):
+        """
+        Returns the quotes whose customer name, email or address contains search_term,
+        that were created between start and end and (if statuses is given) whose
+        status is one of statuses.
+        Case and repeated whitespace are ignored. Returns every quote when no
+        search term, dates or statuses are given.
+        """
+        start, end = _date_range(start, end)
+        df = _with_statuses(self.load_quotes(include_archived), statuses)
+        term = normalize_search_text(search_term)
+        if term:
+            mask = False
+            for column in SEARCH_COLUMNS:
+                normalized = df[column].fillna('').str.replace(r'\s+', ' ', regex=True).str.strip().str.casefold()
+                mask = mask | normalized.str.contains(term, regex=False)
+            df = df[mask]
+        if start or end:
+            days = df['Date'].map(day_key).astype(str)
+            df = df[(days != '') & (days >= (start or '')) & (days <= (end or '9999-12-31'))]
+        return df
+
+    @_timed_operation('query_page')
+    def query_page(self, search_term=None, sort_by='created', descending=True, offset=0, limit=25, start=None, end=None,
+                   include_archived=True, statuses=None):
+        """
+        Returns (page, total): one page of matching quotes and how many match in all.
+        sort_by is one of SORT_FIELDS; only the requested slice is returned.
+        """
+        if sort_by not in SORT_FIELDS:
+            raise ValueError(f"Can't sort quotes by '{sort_by}' (expected one of: {', '.join(SORT_FIELDS)})")
+
+        df, positions = self._query_rows(search_term, start, end, include_archived)
+        return _page_rows(df, positions, statuses, sort_by, descending, offset, limit)
+
+    def _query_rows(self, search_term, start, end, include_archived):
+        """
+        Returns (df, positions): the quotes matching everything but statuses
+        are the rows of df at positions (a slice or an array of row positions
+        in creation order), or all of df when positions is None. Backends
+        that index the quotes override this so a page is picked out of their
+        shared frame instead of a copy of every match.
+        """
+        return self.query_quotes(search_term, start, end, include_archived), None
+
+    def iter_quotes(self, search_term=None, start=None, end=None, include_archived=True, statuses=None,
+                    chunk_rows=ITER_CHUNK_ROWS):
+        """
+        Yields the quotes query_quotes() would return, in creation order, as
+        DataFrames of at most chunk_rows rows, for exports that write them out
+        one piece at a time. Backends that can read in pieces override this.
+        """
+        df = self.query_quotes(search_term, start, end, include_archived, statuses)
+        for offset in range(0, len(df), chunk_rows):
+            yield df.iloc[offset:offset + chunk_rows]
+
+    def status_summary(self, start=None, end=None):
+        """
+        Returns {status: {'count': n, 'value': total price}} over all quotes, or
+        over the quotes created between start and end.
+        Backends that keep materialized totals return those directly.
+        """
+        start, end = _date_range(start, end)
+        if start or end:
+            return summarize_days(self.daily_summary(start, end))
+        return self.compute_status_summary()
+
+    def daily_summary(self, start=None, end=None):
+        """
+        Returns {day: {status: {'count': n, 'value': total price}}} for the
+        quotes created on each day ('YYYY-MM-DD') between start and end.
+        Backends that keep materialized rollups return those directly.
+        """
+        start, end = _date_range(start, end)
+        return days_between(self.compute_daily_summary(), start, end)
+
+    @_timed_operation('compute_status_summary')
+    def compute_status_summary(self):
+        """
+        Recomputes the per-status totals from the raw quotes.
+        """
+        df = self.load_quotes()
+        summary = {}
+        if not df.empty:
+            grouped = df.groupby('Status', observed=True)['Price'].agg(['count', 'sum'])
+            for status, row in grouped.iterrows():
+                summary[status] = {'count': int(row['count']), 'value': float(row['sum'])}
+        return summary
+
+    @_timed_operation('compute_daily_summary')
+    def compute_daily_summary(self):
+        """
+        Recomputes the daily rollups from the raw quotes.
+        """
+        return rollup_frame(self.load_quotes())
+
+    def rebuild_status_summary(self):
+        """
+        Replaces any materialized totals and daily rollups with ones recomputed
+        from the raw quotes.
+        """
+
+    def archive_closed(self):
+        """
+        Moves closed (Won/Lost) quotes created before the current month out of
+        the hot data the default history view reads. Returns how many moved.
+        """
+        return 0
+
+    def verify_status_summary(self):
+        """
+        Returns (ok, stored, actual) comparing the stored totals with a recount.
+        """
+        stored = self.status_summary()
+        actual = self.compute_status_summary()
+        return summaries_match(stored, actual), stored, actual
+
+    def verify_daily_summary(self):
+        """
+        Returns the days whose stored rollups differ from a recount (empty if all match).
+        """
+        return daily_mismatches(self.daily_summary(), self.compute_daily_summary())
+
+
+# Function to drop the customer details a CSV row can leave to the registry
+def _csv_record(record):
+    """
+    Returns the record as written to the CSV: without the customer name,
+    email and address when it has a Customer_Version to find them by.
+    """
+    if not record.get('Customer_Version'):
+        return record
+    return dict(record, **dict.fromkeys(REGISTRY_CUSTOMER_COLUMNS, ''))
+
+
+# Function to fill in the customer details CSV rows left to the registry
+def _with_customer_details(df):
+    """
+    Fills the customer fields of the rows of a freshly parsed frame that have
+    a Customer_Version from that version in the customer registry. A version
+    the registry doesn't hold (customers.csv lost) leaves the fields empty.
+    """
+    import pandas as pd
+
+    from quote_customers import get_customer_registry
+
+    if 'Customer_Version' not in df.columns:
+        return df
+    linked = df['Customer_Version'].notna() & (df['Customer_Version'] != '')
+    if not linked.any():
+        return df
+    details = get_customer_registry().quoted_details(zip(df['Customer_ID'][linked], df['Customer_Version'][linked]))
+    found = pd.Series([fields is not None for fields in details], index=df.index[linked])
+    df = df.copy()
+    # Empty fields are missing values, as the CSV parser would have left them
+    df.loc[found.index[found], REGISTRY_CUSTOMER_COLUMNS] = [
+        [value or None for value in fields] for fields in details if fields is not None
+    ]
+    return df
+
+
+# Function to post-process the quotes parsed from the CSV or the archive
+def _prepare_quotes(df):
+    return categorize(_with_customer_details(df))
+
+
+# Function to turn one DataFrame row into a plain quote dict
+def _row_to_record(row):
+    """
+    Returns {column: value} for QUOTE_COLUMNS with missing text as '' and Price as a float.
+    """
+    record = {}
+    for column in QUOTE_COLUMNS:
+        value = row.get(column)
+        if column == 'Price':
+            record[column] = float(value)
+        else:
+            record[column] = value if isinstance(value, str) else ''
+    return record
+
+
+# CSV backend (the original quotes_database.csv file)
+class CSVQuoteStore(QuoteStore):
+    """
+    Stores quotes in a plain CSV file with the QUOTE_COLUMNS header.
+    New quotes are appended through the shared QuoteJournal. Status changes are
+    appended to a separate status log and folded in on read, so an update costs
+    the same whether there are 100 quotes or a million.
+    Closed quotes from earlier months are moved to a compressed monthly
+    archive (see quote_archive) when the status log is compacted, which
+    happens at least once a month.
+    """
+
+    backend = 'csv'
+
+    def __init__(self, path, compact_threshold=STATUS_LOG_COMPACT_THRESHOLD):
+        self.path = path
+        self.status_log_path = f"{os.path.splitext(path)[0]}_status_log.csv"
+        self.compact_threshold = compact_threshold
+
+        # Columnar copy of the CSV, memory-mapped instead of re-parsing on a cold start
+        self.snapshot_path = f"{os.path.splitext(path)[0]}.arrow"
+
+        # Parsed copies of both files, shared by every session using this store
+        self._quotes_cache = CSVFileCache(
+            path, QUOTE_COLUMNS, {'dtype': QUOTE_DTYPES}, prepare=_prepare_quotes,
+            load_base=lambda f: read_snapshot(self.snapshot_path, f, QUOTE_COLUMNS),
+        )
+        self._status_log_cache = CSVFileCache(self.status_log_path, STATUS_LOG_COLUMNS, {'dtype': str})
+
+        # Per-status totals and per-day rollups, adjusted on every save and status change
+        self.aggregates = StatusAggregates(f"{os.path.splitext(path)[0]}_stats.json")
+        self.daily = DailyRollups(f"{os.path.splitext(path)[0]}_daily")
+
+        # Quote_ID -> row position in the cached frame, extended as rows are appended
+        self._positions = {}
+        self._positions_generation = None
+        self._positions_frame = None
+        # (status, price, day) of quotes saved since the position map was last extended
+        self._recent_quotes = {}
+        # Quote_ID -> latest status in the status log
+        self._logged_status = {}
+        self._logged_status_key = (None, 0)
+
+        # Closed quotes from earlier months, parsed only when asked for
+        self.archive = QuoteArchive(
+            f"{os.path.splitext(path)[0]}_archive", QUOTE_COLUMNS, {'dtype': QUOTE_DTYPES}, prepare=_prepare_quotes,
+        )
+
+        # Search and time indexes over the hot rows and over the archive, built on first use
+        self._hot_indexes = None
+        self._archive_indexes = None
+        # (key, hot rows checked, archived quotes not also in the hot file)
+        self._archive_view = (None, 0, None)
+        # Month up to which closed quotes have been archived, as last seen
+        self._archived_before = None
+        # (key, rows of the hot frame included, hot and archived quotes in creation order)
+        self._merged = (None, 0, None)
+        # Quotes with the status log folded in, as handed to every session
+        self._published = PublishedQuotes()
+
+    def init(self):
+        if not os.path.exists(self.path):
+            with open(self.path, 'w', newline='') as f:
+                csv.writer(f, lineterminator='\n').writerow(QUOTE_COLUMNS)
+            # A new database has no quotes; don't keep totals left over from an old one
+            self.aggregates.replace({})
+            self.daily.replace({})
+        else:
+            self._add_missing_columns()
+        if not (self.aggregates.exists() and self.daily.exists()):
+            self.rebuild_status_summary()
+
+    def _add_missing_columns(self):
+        """
+        Upgrades a CSV written by an older version to the current QUOTE_COLUMNS:
+        rows written before quotes had IDs each get one, and columns added
+        since (e.g. Items, Service_ID) are left empty. Runs once; later calls see the
+        full header and return straight away.
+        """
+        with open(self.path, newline='', encoding='utf-8') as f:
+            header = next(csv.reader(f), [])
+        if all(column in header for column in QUOTE_COLUMNS):
+            return
+
+        import pandas as pd
+
+        def write(f):
+            df = pd.read_csv(self.path, dtype=QUOTE_DTYPES)
+            if 'Quote_ID' not in df.columns:
+                df.insert(0, 'Quote_ID', [new_quote_id() for _ in range(len(df))])
+            df.reindex(columns=QUOTE_COLUMNS, fill_value='').to_csv(f, index=False, lineterminator='\n')
+
+        get_journal(self.path).rewrite(write)
+        self._quotes_cache.invalidate()
+
+    def _status_log(self):
+        return get_journal(self.status_log_path, STATUS_LOG_COLUMNS)
+
+    @_timed_operation('save_quote')
+    def save_quote(self, record):
+        return _single_result(self.write_batch([('save', record)]))
+
+    def _refresh_lookup(self):
+        """
+        Brings the Quote_ID lookups up to date with the files on disk.
+        Called once per write batch (under the file lock), after which the
+        batch keeps them current itself without touching pandas.
+        """
+        # Quotes we saved ourselves since the last read are already in
+        # _recent_quotes, so the frame (a concat of every row) is only re-read
+        # when another process changed the file or enough saves piled up
+        up_to_date = (
+            self._positions_frame is not None
+            and self._positions_generation == self._quotes_cache.generation
+            and len(self._recent_quotes) < RECENT_QUOTES_LIMIT
+            and self._quotes_cache.is_current()
+        )
+        if not up_to_date:
+            df = self._quotes_cache.read()
+            with self._quotes_cache.lock:
+                self._extend_positions(df)
+                self._positions_frame = df
+                self._recent_quotes = {}
+
+        log = self._read_status_log()
+        generation, seen = self._logged_status_key
+        if generation != self._status_log_cache.generation:
+            self._logged_status = {}
+            seen = 0
+        if len(log) > seen:
+            new_rows = log.iloc[seen:]
+            self._logged_status.update(zip(new_rows['Quote_ID'], new_rows['Status']))
+        self._logged_status_key = (self._status_log_cache.generation, len(log))
+
+    def _extend_positions(self, df):
+        """
+        Adds rows appended since the last call to the Quote_ID -> position map
+        (starting over after a full re-parse). Call with the cache lock held.
+        """
+        if self._positions_generation != self._quotes_cache.generation:
+            self._positions = {}
+            self._positions_generation = self._quotes_cache.generation
+        if df is not None and len(self._positions) < len(df):
+            new_ids = df['Quote_ID'].iloc[len(self._positions):]
+            self._positions.update(zip(new_ids, range(len(self._positions), len(df))))
+
+    @_timed_operation('get_quote')
+    def get_quote(self, quote_id):
+        """
+        Finds the quote through the position map instead of scanning the rows.
+        """
+        df = self._quotes_cache.read()
+        if df is None:
+            return None
+        with self._quotes_cache.lock:
+            self._extend_positions(df)
+            position = self._positions.get(quote_id)
+        if position is None or position >= len(df):
+            df, ids = self.archive.frame()
+            position = ids.get_indexer([quote_id])[0] if len(ids) else -1
+            if position < 0:
+                return None
+        quote = _row_to_record(df.iloc[position])
+
+        log = self._read_status_log()
+        logged = log['Status'][log['Quote_ID'] == quote_id]
+        if len(logged):
+            quote['Status'] = logged.iloc[-1]
+        return quote
+
+    def _lookup(self, quote_id):
+        """
+        Returns (status, price, day created) for a quote, or None if there's no such quote.
+        Uses the position map and logged statuses, so no rows are scanned.
+        Only a quote that isn't in the hot file loads the archive.
+        """
+        if quote_id in self._recent_quotes:
+            status, price, day = self._recent_quotes[quote_id]
+        else:
+            position = self._positions.get(quote_id)
+            if position is not None:
+                df = self._positions_frame
+            else:
+                df, ids = self.archive.frame()
+                position = ids.get_indexer([quote_id])[0] if len(ids) else -1
+                if position < 0:
+                    return None
+            status, price = df['Status'].iat[position], float(df['Price'].iat[position])
+            day = day_key(df['Date'].iat[position])
+        return self._logged_status.get(quote_id, status), price, day
+
+    def _read_status_log(self):
+        import pandas as pd
+
+        log = self._status_log_cache.read()
+        if log is None:
+            return pd.DataFrame(columns=STATUS_LOG_COLUMNS)
+        return log
+
+    def _fold_status_log(self, df, log):
+        """
+        Returns the CSV rows with the latest logged status of each quote applied.
+        df itself is left as it was: the result starts as a shallow copy, so
+        copy-on-write only copies the Status column.
+        """
+        df = df.copy(deep=False)
+        if log.empty or df.empty:
+            return df
+        latest = log.drop_duplicates('Quote_ID', keep='last').set_index('Quote_ID')['Status']
+        changed = df['Quote_ID'].isin(latest.index)
+        if changed.any():
+            if df['Status'].dtype.name == 'category':
+                # New statuses have to be categories before they can be assigned
+                categories = sorted(set(df['Status'].cat.categories) | set(latest))
+                df['Status'] = df['Status'].cat.set_categories(categories)
+            df.loc[changed, 'Status'] = df.loc[changed, 'Quote_ID'].map(latest)
+        return df
+
+    @_timed_operation('load_quotes')
+    def load_quotes(self, include_archived=True):
+        """
+        Returns the hot quotes, followed by the archived ones (in creation
+        order overall) unless include_archived is False.
+        """
+        return self.load_versioned(include_archived)[1]
+
+    def load_versioned(self, include_archived=True):
+        """
+        Every session shares one published frame per include_archived
+        setting. The status log is folded in (and the archive merged) only
+        when the quotes file, the status log or the archive has changed since
+        that frame was built; otherwise reading costs a shallow copy. The
+        hot and archived rows also start being indexed for search here.
+        """
+        import pandas as pd
+
+        # Taken before reading, so a rewrite racing the read only costs a rebuild next time
+        quotes_generation = self._quotes_cache.generation
+        log_generation = self._status_log_cache.generation
+        read_generation, df = self._quotes_cache.read_versioned()
+        if df is None:
+            df = categorize(pd.DataFrame(columns=QUOTE_COLUMNS))
+        elif len(df) - self._quotes_cache.base_rows >= SNAPSHOT_REFRESH_ROWS:
+            self.write_snapshot()
+        log = self._read_status_log()
+        # A missing file's cache starts a new generation on every read, so empty files key on nothing
+        hot_key = (quotes_generation if len(df) else None, len(df), log_generation if len(log) else None, len(log))
+        hot_indexes = self._hot_frame_indexes()
+        # Another thread may have re-parsed the file since; its frame gets prepared by its own load
+        if hot_indexes.key == read_generation:
+            hot_indexes.prepare(df)
+        if include_archived:
+            archived = self._archived_quotes(df)
+            if not archived.empty:
+                self._archive_frame_indexes(archived).prepare(archived)
+                return self._published.get(True, (hot_key, self._archive_view[0], len(archived)),
+                                           lambda: self._fold_status_log(self._merged_quotes(df, archived), log))
+        return self._published.get(False, hot_key, lambda: self._fold_status_log(df, log))
+
+    def _hot_frame_indexes(self):
+        with self._quotes_cache.lock:
+            if self._hot_indexes is None or self._hot_indexes.key != self._quotes_cache.generation:
+                self._hot_indexes = FrameIndexes(self._quotes_cache.generation)
+            return self._hot_indexes
+
+    def _archive_frame_indexes(self, archived):
+        # Dropping reopened quotes only ever shortens the view, so its length tells versions apart
+        archive_key = (self._archive_view[0], len(archived))
+        with self._quotes_cache.lock:
+            if self._archive_indexes is None or self._archive_indexes.key != archive_key:
+                self._archive_indexes = FrameIndexes(archive_key)
+            return self._archive_indexes
+
+    def _merged_quotes(self, hot, archived):
+        """
+        Returns the archived and hot quotes (before folding the status log) in
+        creation order. The merge is kept, and quotes saved since are just
+        added at the end, so it is only sorted again when a file is replaced.
+        """
+        key, rows, merged = self._merged
+        if key != (self._archive_view[0], len(archived)) or rows > len(hot):
+            key, rows, merged = (self._archive_view[0], len(archived)), len(hot), _in_created_order(concat_frames([archived, hot]))
+        elif rows < len(hot):
+            rows, merged = len(hot), concat_frames([merged, hot.iloc[rows:]]).reset_index(drop=True)
+        self._merged = (key, rows, merged)
+        return merged
+
+    def _archived_quotes(self, hot):
+        """
+        Returns the archived quotes, leaving out any that are also in the hot
+        frame (reopened quotes until the next compact()). Only rows appended
+        to the hot frame since the last call are checked.
+        """
+        archived, ids = self.archive.frame()
+        key = (self.archive.generation, self._quotes_cache.generation)
+        view_key, rows, view = self._archive_view
+        if view_key != key or rows > len(hot):
+            rows, view = 0, archived
+        if rows < len(hot) and len(ids):
+            copies = ids.intersection(hot['Quote_ID'].iloc[rows:].astype(str))
+            if len(copies):
+                view = view[~view['Quote_ID'].isin(copies)].reset_index(drop=True)
+        self._archive_view = (key, len(hot), view)
+        return view
+
+    def write_snapshot(self):
+        """
+        Saves the cached quotes as a columnar snapshot so the next cold load
+        memory-maps it and only parses rows appended after it.
+        Returns True if a snapshot was written.
+        """
+        if self._quotes_cache.read() is None:
+            return False
+        state = self._quotes_cache.state()
+        if state is None:
+            return False
+        df, size, fingerprint = state
+        if not write_snapshot(self.snapshot_path, df, size, fingerprint):
+            return False
+        self._quotes_cache.base_rows = len(df)
+        return True
+
+    @_timed_operation('query_quotes')
+    def query_quotes(self, search_term=None, start=None, end=None, include_archived=True, statuses=None):
+        """
+        Looks the term up in the trigram index and the dates up in the time
+        index instead of scanning every row. The hot file and the archive each
+        have their own indexes, kept in step with their frames: appended rows
+        are added, and they are rebuilt only after a full re-parse. The
+        archive (and its indexes) is only touched when include_archived is set.
+        Statuses change after indexing, so they are filtered last.
+        """
+        return _with_statuses(self._query_quotes(search_term, start, end, include_archived), statuses)
+
+    def _query_quotes(self, search_term, start, end, include_archived):
+        df, positions = self._query_rows(search_term, start, end, include_archived)
+        return df if positions is None else df.iloc[positions]
+
+    def _query_rows(self, search_term, start, end, include_archived):
+        """
+        Matches in the hot file are returned as positions in the published
+        frame, so query_page() copies only the rows of one page. Archived
+        matches are few, and have to be merged into creation order, so those
+        come back as a frame of their own together with the hot matches.
+        """
+        import numpy as np
+
+        start, end = _date_range(start, end)
+        if not normalize_search_text(search_term) and not (start or end):
+            return self.load_quotes(include_archived), None
+        hot = self.load_quotes(include_archived=False)
+        hot_indexes = self._hot_frame_indexes()
+        matches = hot_indexes.positions(hot, search_term, start, end)
+        if not include_archived:
+            return hot, matches
+
+        archived = self._archived_quotes(hot)
+        if archived.empty:
+            return hot, matches
+        archive_indexes = self._archive_frame_indexes(archived)
+        archived_positions = archive_indexes.positions(archived, search_term, start, end)
+        archived_matches = archived.iloc[archived_positions]
+        if archived_matches.empty:
+            return hot, matches
+        # Statuses are folded after matching, so only the matched archive rows are copied
+        archived_matches = self._fold_status_log(archived_matches, self._read_status_log())
+        merged = concat_frames([_trim_categories(archived_matches), _trim_categories(hot.iloc[matches])])
+        # Put into creation order with the times the indexes already hold, rather than parsing Date/Time again
+        times = np.concatenate([archive_indexes.times(archived, archived_positions), hot_indexes.times(hot, matches)])
+        return merged.iloc[np.argsort(times, kind='stable')].reset_index(drop=True), None
+
+    @_timed_operation('update_status')
+    def update_status(self, quote_id, new_status):
+        """
+        Records a status change as one small line in the status log.
+        Compacts the log into the CSV once it grows past compact_threshold.
+        Raises KeyError if there is no quote with that ID.
+        """
+        _single_result(self.write_batch([('status', quote_id, new_status)]))
+
+    def _append_quote(self, journal, record, deltas):
+        record = dict(record)
+        record['Quote_ID'] = record.get('Quote_ID') or new_quote_id()
+        # A bad price has to fail before the row is written, or the totals would miss a stored quote
+        status, price, day = record.get('Status') or 'Sent', float(record['Price']), day_key(record.get('Date'))
+        record['Status'] = status
+        offset, line = journal.append(_csv_record(record), defer_sync=True)
+        self._quotes_cache.apply_append(offset, line)
+        self._recent_quotes[record['Quote_ID']] = (status, price, day)
+        deltas.append((day, status, 1, price))
+        return record['Quote_ID']
+
+    def _append_status(self, journal, log, quote_id, new_status, deltas):
+        """
+        Returns True if the quote's status changed.
+        """
+        from datetime import datetime
+
+        current = self._lookup(quote_id)
+        if current is None:
+            raise KeyError(f"No quote with ID '{quote_id}'")
+        old_status, price, day = current
+        if old_status == new_status:
+            return False
+        if new_status not in ARCHIVE_STATUSES and quote_id not in self._positions and quote_id not in self._recent_quotes:
+            # Reopening an archived quote copies it back into the CSV, where reads
+            # prefer it; the next compact() drops the archived copy
+            df, ids = self.archive.frame()
+            record = _row_to_record(df.iloc[ids.get_indexer([quote_id])[0]])
+            offset, line = journal.append(_csv_record(dict(record, Status=new_status)), defer_sync=True)
+            self._quotes_cache.apply_append(offset, line)
+            self._recent_quotes[quote_id] = (new_status, price, day)
+
+        offset, line = log.append({'Quote_ID': quote_id, 'Status': new_status, 'Changed_At': datetime.now().isoformat(timespec='seconds')}, defer_sync=True)
+        self._status_log_cache.apply_append(offset, line)
+        self._logged_status[quote_id] = new_status
+        generation, seen = self._logged_status_key
+        self._logged_status_key = (generation, seen + 1)
+        deltas.extend([(day, old_status, -1, -price), (day, new_status, 1, price)])
+        return True
+
+    def _append_statuses(self, journal, log, changes, deltas):
+        # Every ID is checked before the first line is appended, so a bad ID changes nothing
+        changes = list(changes)
+        _raise_if_missing([quote_id for quote_id, _ in changes if self._lookup(quote_id) is None])
+        return sum(self._append_status(journal, log, quote_id, new_status, deltas) for quote_id, new_status in changes)
+
+    @_timed_operation('write_batch')
+    def write_batch(self, operations):
+        """
+        Group commit: appends every record and status change, then fsyncs the
+        CSV, the status log, the totals and the daily rollups once for the whole batch.
+        """
+        journal = get_journal(self.path)
+        log = self._status_log()
+        results = []
+        deltas = []
+        with log.lock, journal.lock:
+            self._refresh_lookup()
+            for operation in operations:
+                try:
+                    if operation[0] == 'save':
+                        results.append(self._append_quote(journal, operation[1], deltas))
+                    elif operation[0] == 'status':
+                        self._append_status(journal, log, operation[1], operation[2], deltas)
+                        results.append(None)
+                    elif operation[0] == 'statuses':
+                        results.append(self._append_statuses(journal, log, operation[1], deltas))
+                    else:
+                        raise ValueError(f"Unknown write operation '{operation[0]}'")
+                except Exception as e:
+                    results.append(e)
+
+            journal.sync()
+            log.sync()
+            if deltas:
+                self.aggregates.apply([(status, count, value) for _, status, count, value in deltas])
+                self.daily.apply(deltas)
+            if self._logged_status_key[1] >= self.compact_threshold or self._archive_due():
+                self.compact()
+        return results
+
+    def _archive_due(self):
+        """
+        Returns True once a new month has started since closed quotes were last archived.
+        The manifest is only re-read until this process has seen the current month archived.
+        """
+        month = _current_month()
+        if self._archived_before != month:
+            self._archived_before = self.archive.manifest()['archived_before']
+        return self._archived_before < month
+
+    @_timed_operation('compact')
+    def compact(self):
+        """
+        Folds the status log into the CSV and the archive, then empties the log.
+        Closed quotes created before the current month move from the CSV to
+        their month's archive partition, and archived quotes whose status was
+        changed back to an open one move back into the CSV.
+        Every file is replaced atomically, in an order where a crash can only
+        leave a quote in both places (reads then keep the CSV copy), never in
+        neither; folding the same log again on the next read is harmless.
+        Returns the number of quotes moved into the archive.
+        """
+        import pandas as pd
+
+        journal = get_journal(self.path)
+        log = self._status_log()
+        with log.lock, journal.lock:
+            changes = self._read_status_log()
+            cutoff = _current_month()
+            manifest = self.archive.manifest()
+            partitions = dict(manifest['partitions'])
+            moved = 0
+
+            if os.path.exists(self.path):
+                hot = self._fold_status_log(pd.read_csv(self.path, dtype=QUOTE_DTYPES), changes)
+                months = month_keys(hot['Date'])
+                closing = hot['Status'].isin(ARCHIVE_STATUSES) & (months != '') & (months < cutoff)
+                outgoing = hot[closing]
+
+                # Partitions to rewrite: those gaining quotes, and those holding
+                # archived quotes whose status changed
+                touched = set(months[closing])
+                # Older quotes in the CSV with a logged change may be reopened copies of archived ones
+                copied = hot['Quote_ID'].isin(changes['Quote_ID']) & (months != '') & (months < manifest['archived_before'])
+                touched |= set(months[copied]) & set(self.archive.months())
+                archived_changes = changes[~changes['Quote_ID'].isin(hot['Quote_ID'])]
+                if not archived_changes.empty and self.archive.months():
+                    archived, ids = self.archive.frame()
+                    found = ids.get_indexer(archived_changes['Quote_ID'].astype(str))
+                    touched |= set(month_keys(archived['Date'].iloc[found[found >= 0]]))
+
+                # 1. Write the partitions with their new quotes (reopened ones still included)
+                updated, reopened = {}, []
+                for month in sorted(touched):
+                    part = self._fold_status_log(self.archive.read_partition(month), changes)
+                    part = part[~part['Quote_ID'].isin(hot['Quote_ID'][~closing])]
+                    part = pd.concat([part, outgoing[months[closing] == month].astype(object)], ignore_index=True)
+                    part = part.drop_duplicates('Quote_ID', keep='last')
+                    still_closed = part['Status'].isin(ARCHIVE_STATUSES)
+                    self.archive.write_partition(month, part)
+                    if not still_closed.all():
+                        reopened.append(part[~still_closed])
+                        updated[month] = part[still_closed]
+                    partitions[month] = len(part)
+                moved = len(outgoing)
+
+                # 2. Rewrite the CSV without the archived quotes, plus the reopened ones
+                kept = hot[~closing]
+                if reopened:
+                    kept = pd.concat([kept.astype(object)] + [part.astype(object) for part in reopened], ignore_index=True)
+                # Reopened quotes go back to their place in creation order
+                kept = _in_created_order(kept)
+                if moved or reopened or not changes.empty:
+                    journal.rewrite(lambda f: kept.to_csv(f, index=False, lineterminator='\n'))
+
+                # 3. Drop the reopened quotes from their partitions
+                for month, part in updated.items():
+                    self.archive.write_partition(month, part)
+                    partitions[month] = len(part)
+
+            self.archive.write_manifest(cutoff, {month: rows for month, rows in partitions.items() if rows})
+            self._archived_before = cutoff
+            log.rewrite(lambda f: csv.writer(f, lineterminator='\n').writerow(STATUS_LOG_COLUMNS))
+            self._quotes_cache.invalidate()
+            self._status_log_cache.invalidate()
+
+            # The CSV was just rewritten, so the old snapshot no longer matches it
+            self.write_snapshot()
+        return moved
+
+    def archive_closed(self):
+        return self.compact()
+
+    @_timed_operation('status_summary')
+    def status_summary(self, start=None, end=None):
+        start, end = _date_range(start, end)
+        if start or end:
+            return summarize_days(self.daily.read(start, end))
+        return self.aggregates.read()
+
+    @_timed_operation('daily_summary')
+    def daily_summary(self, start=None, end=None):
+        start, end = _date_range(start, end)
+        return self.daily.read(start, end)
+
+    def rebuild_status_summary(self):
+        self.aggregates.replace(self.compute_status_summary())
+        self.daily.replace(self.compute_daily_summary())
+
+
+# Function to keep only the quotes in some statuses
+def _with_statuses(df, statuses):
+    """
+    Returns df unchanged when statuses is None, else the rows whose Status is in it.
+    """
+    if statuses is None:
+        return df
+    return df[df['Status'].isin(list(statuses))]
+
+
+# Function to pick one sorted page out of the matching rows of a frame
+def _page_rows(df, positions, statuses, sort_by, descending, offset, limit):
+    """
+    Returns (page, total) for the rows of df at positions (see
+    QuoteStore._query_rows) whose status is in statuses (if given). Only
+    the page's rows are copied out of df; with no filter at all the page is a
+    slice of it.
+    """
+    import numpy as np
+
+    if positions is None and statuses is None and sort_by == 'created':
+        if not descending:
+            return df.iloc[offset:offset + limit], len(df)
+        # Reversing all of df would copy every Arrow-backed column, so only the page is reversed
+        stop = max(0, len(df) - offset)
+        return df.iloc[max(0, stop - limit):stop].iloc[::-1], len(df)
+
+    if positions is None:
+        positions = np.arange(len(df))
+    elif isinstance(positions, slice):
+        positions = np.arange(*positions.indices(len(df)))
+    if statuses is not None:
+        positions = positions[df['Status'].take(positions).isin(list(statuses)).to_numpy()]
+    if sort_by == 'created':
+        if descending:
+            positions = positions[::-1]
+    else:
+        key = (lambda col: col.str.lower()) if sort_by == 'Customer_Name' else None
+        values = df[sort_by].take(positions).reset_index(drop=True)
+        positions = positions[values.sort_values(ascending=not descending, kind='stable', key=key).index.to_numpy()]
+    return df.iloc[positions[offset:offset + limit]], len(positions)
+
+
+# Function to reject a batch that names unknown quotes
+def _raise_if_missing(quote_ids):
+    if len(quote_ids) == 1:
+        raise KeyError(f"No quote with ID '{quote_ids[0]}'")
+    if quote_ids:
+        raise KeyError(f"No quotes with IDs {', '.join(repr(str(quote_id)) for quote_id in quote_ids)}")
+
+
+# Function to unwrap the result of a one-operation batch
+def _single_result(results):
+    if isinstance(results[0], Exception):
+        raise results[0]
+    return results[0]
+
+
+# Maps the app's column names to the SQLite column names
+SQLITE_COLUMNS = {
+    'Quote_ID': 'quote_id',
+    'Date': 'date',
+    'Time': 'time',
+    'Customer_Name': 'customer_name',
+    'Customer_Email': 'customer_email',
+    'Customer_Address': 'customer_address',
+    'Service': 'service',
+    'Price': 'price',
+    'Status': 'status',
+    'Items': 'items',
+    'Service_ID': 'service_id',
+    'Catalog_Version': 'catalog_version',
+    'Customer_ID': 'customer_id',
+    'Customer_Version': 'customer_version',
+}
+
+# Columns added since the first release; init() adds any an older database lacks
+SQLITE_ADDED_COLUMNS = {
+    'items': "TEXT NOT NULL DEFAULT ''",
+    'service_id': "TEXT NOT NULL DEFAULT ''",
+    'catalog_version': "TEXT NOT NULL DEFAULT ''",
+    'archived': 'INTEGER NOT NULL DEFAULT 0',
+    'customer_id': "TEXT NOT NULL DEFAULT ''",
+    'customer_version': "TEXT NOT NULL DEFAULT ''",
+}
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    quote_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    customer_name TEXT NOT NULL,
+    customer_email TEXT NOT NULL DEFAULT '',
+    customer_address TEXT NOT NULL,
+    service TEXT NOT NULL,
+    price REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'Sent',
+    items TEXT NOT NULL DEFAULT '',
+    service_id TEXT NOT NULL DEFAULT '',
+    catalog_version TEXT NOT NULL DEFAULT '',
+    -- 1 for closed quotes from before the current month (left out of the default history view)
+    archived INTEGER NOT NULL DEFAULT 0,
+    customer_id TEXT NOT NULL DEFAULT '',
+    -- The customer fields are kept in full here too: the search triggers index them
+    customer_version TEXT NOT NULL DEFAULT ''
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_quotes_quote_id ON quotes (quote_id);
+CREATE INDEX IF NOT EXISTS idx_quotes_status ON quotes (status);
+CREATE INDEX IF NOT EXISTS idx_quotes_customer_name ON quotes (customer_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_quotes_created_at ON quotes (created_at);
+CREATE INDEX IF NOT EXISTS idx_quotes_hot ON quotes (archived, id);
+CREATE INDEX IF NOT EXISTS idx_quotes_customer_id ON quotes (customer_id);
+
+-- Trigram full-text index over the normalized customer fields (substring search)
+CREATE VIRTUAL TABLE IF NOT EXISTS quotes_search USING fts5(doc, tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS trg_quotes_search_insert AFTER INSERT ON quotes BEGIN
+    INSERT INTO quotes_search (rowid, doc) VALUES (NEW.id, {new_doc});
+END;
+CREATE TRIGGER IF NOT EXISTS trg_quotes_search_update AFTER UPDATE OF customer_name, customer_email, customer_address ON quotes BEGIN
+    UPDATE quotes_search SET doc = {new_doc} WHERE rowid = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_quotes_search_delete AFTER DELETE ON quotes BEGIN
+    DELETE FROM quotes_search WHERE rowid = OLD.id;
+END;
+
+-- Per-status totals, kept up to date by triggers in the same transaction as the write
+CREATE TABLE IF NOT EXISTS status_stats (
+    status TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    value REAL NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS trg_quotes_stats_insert AFTER INSERT ON quotes BEGIN
+    INSERT INTO status_stats (status, count, value) VALUES (NEW.status, 1, NEW.price)
+        ON CONFLICT (status) DO UPDATE SET count = count + 1, value = value + NEW.price;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_quotes_stats_update AFTER UPDATE OF status, price ON quotes BEGIN
+    UPDATE status_stats SET count = count - 1, value = value - OLD.price WHERE status = OLD.status;
+    INSERT INTO status_stats (status, count, value) VALUES (NEW.status, 1, NEW.price)
+        ON CONFLICT (status) DO UPDATE SET count = count + 1, value = value + NEW.price;
+    DELETE FROM status_stats WHERE count <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_quotes_stats_delete AFTER DELETE ON quotes BEGIN
+    UPDATE status_stats SET count = count - 1, value = value - OLD.price WHERE status = OLD.status;
+    DELETE FROM status_stats WHERE count <= 0;
+END;
+
+-- The same totals per day created ('YYYY-MM-DD', the start of created_at), for trends and date ranges
+CREATE TABLE IF NOT EXISTS daily_stats (
+    day TEXT NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    value REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, status)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS trg_quotes_daily_insert AFTER INSERT ON quotes BEGIN
+    INSERT INTO daily_stats (day, status, count, value) VALUES (substr(NEW.created_at, 1, 10), NEW.status, 1, NEW.price)
+        ON CONFLICT (day, status) DO UPDATE SET count = count + 1, value = value + NEW.price;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_quotes_daily_update AFTER UPDATE OF status, price, created_at ON quotes BEGIN
+    UPDATE daily_stats SET count = count - 1, value = value - OLD.price
+        WHERE day = substr(OLD.created_at, 1, 10) AND status = OLD.status;
+    INSERT INTO daily_stats (day, status, count, value) VALUES (substr(NEW.created_at, 1, 10), NEW.status, 1, NEW.price)
+        ON CONFLICT (day, status) DO UPDATE SET count = count + 1, value = value + NEW.price;
+    DELETE FROM daily_stats WHERE count <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_quotes_daily_delete AFTER DELETE ON quotes BEGIN
+    UPDATE daily_stats SET count = count - 1, value = value - OLD.price
+        WHERE day = substr(OLD.created_at, 1, 10) AND status = OLD.status;
+    DELETE FROM daily_stats WHERE count <= 0;
+END;
+"""
+
+
+# Function to build the SQL that normalizes a text column like normalize_search_text
+def _sql_normalized(expr):
+    """
+    Lower-cases the expression and collapses runs of up to 16 whitespace characters.
+    """
+    expr = f"replace(replace(replace(coalesce({expr}, ''), char(9), ' '), char(10), ' '), char(13), ' ')"
+    for _ in range(4):
+        expr = f"replace({expr}, '  ', ' ')"
+    return f"lower(trim({expr}))"
+
+
+# Function to build the SQL for one search document (the customer fields joined by newlines)
+def _sql_search_doc(prefix):
+    return ' || char(10) || '.join(_sql_normalized(f'{prefix}.{SQLITE_COLUMNS[column]}') for column in SEARCH_COLUMNS)
+
+
+SQLITE_SCHEMA = SQLITE_SCHEMA.format(new_doc=_sql_search_doc('NEW'))
+
+
+# ORDER BY expressions for each of SORT_FIELDS
+SQLITE_SORT_ORDERS = {
+    'created': 'id',
+    'Customer_Name': 'customer_name COLLATE NOCASE',
+    'Price': 'price',
+    'Status': 'status',
+}
+
+
+# Function to turn the app's dd/mm/YYYY + HH:MM:SS strings into a sortable timestamp
+def _created_at(date_str, time_str):
+    """
+    Returns an ISO 8601 timestamp so the date index sorts chronologically.
+    Falls back to the raw strings if they can't be parsed.
+    """
+    from datetime import datetime
+
+    try:
+        return datetime.strptime(f"{date_str} {time_str}", "%d/%m/%Y %H:%M:%S").isoformat()
+    except (TypeError, ValueError):
+        return f"{date_str} {time_str}"
+
+
+# SQLite backend with indexes on the columns the history tab filters by
+class SQLiteQuoteStore(QuoteStore):
+    """
+    Stores quotes in an indexed SQLite database.
+    Every quote gets an integer primary key plus a unique Quote_ID, so a status
+    update is one indexed lookup touching exactly one row inside a transaction.
+    Closed quotes from earlier months are flagged archived rather than moved,
+    and the (archived, id) index keeps the hot-only view from reading them.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # Month up to which closed quotes were archived by this process
+        self._archived_before = None
+        # Quotes as handed to every session, rebuilt when the database's data version moves on
+        self._published = PublishedQuotes()
+        self._version_conn = None
+        self._version_lock = threading.Lock()
+
+    def _connect(self):
+        """
+        Returns this thread's connection (Streamlit runs each session in its own thread).
+        """
+        import sqlite3
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def init(self):
+        conn = self._connect()
+        with conn:
+            # Databases created before quotes had IDs get the column and a backfill
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(quotes)')]
+            if columns and 'quote_id' not in columns:
+                conn.execute('ALTER TABLE quotes ADD COLUMN quote_id TEXT')
+                ids = [(new_quote_id(), row_id) for (row_id,) in conn.execute('SELECT id FROM quotes')]
+                conn.executemany('UPDATE quotes SET quote_id = ? WHERE id = ?', ids)
+            for column, definition in SQLITE_ADDED_COLUMNS.items():
+                if columns and column not in columns:
+                    conn.execute(f'ALTER TABLE quotes ADD COLUMN {column} {definition}')
+            has_stats = bool(conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'status_stats'").fetchone())
+            has_daily = bool(conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'daily_stats'").fetchone())
+            has_search = bool(conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'quotes_search'").fetchone())
+            conn.executescript(SQLITE_SCHEMA)
+            if not has_search:
+                # Index the quotes that were saved before the search table existed
+                conn.execute(f'INSERT INTO quotes_search (rowid, doc) SELECT id, {_sql_search_doc("quotes")} FROM quotes')
+        if not (has_stats and has_daily):
+            # A stats table is new (fresh or older database), so fill them from the quotes
+            self.rebuild_status_summary()
+
+    def _insert_rows(self, conn, records):
+        conn.executemany(
+            'INSERT INTO quotes (quote_id, created_at, date, time, customer_name, customer_email, '
+            'customer_address, service, price, status, items, service_id, catalog_version, customer_id, customer_version) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [
+                (
+                    r['Quote_ID'],
+                    _created_at(r['Date'], r['Time']),
+                    r['Date'],
+                    r['Time'],
+                    r['Customer_Name'],
+                    r.get('Customer_Email') or '',
+                    r['Customer_Address'],
+                    r['Service'],
+                    float(r['Price']),
+                    r.get('Status') or 'Sent',
+                    r.get('Items') or '',
+                    r.get('Service_ID') or '',
+                    str(r.get('Catalog_Version') or ''),
+                    r.get('Customer_ID') or '',
+                    r.get('Customer_Version') or '',
+                )
+                for r in records
+            ],
+        )
+
+    @_timed_operation('save_quote')
+    def save_quote(self, record):
+        record = dict(record)
+        record['Quote_ID'] = record.get('Quote_ID') or new_quote_id()
+        conn = self._connect()
+        with conn:
+            self._insert_rows(conn, [record])
+        return record['Quote_ID']
+
+    @_timed_operation('write_batch')
+    def write_batch(self, operations):
+        """
+        Group commit: runs the whole batch in one transaction (one sync).
+        Each operation gets its own savepoint so a failure only undoes itself.
+        """
+        conn = self._connect()
+        results = []
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for operation in operations:
+                conn.execute('SAVEPOINT operation')
+                try:
+                    if operation[0] == 'save':
+                        record = dict(operation[1])
+                        record['Quote_ID'] = record.get('Quote_ID') or new_quote_id()
+                        self._insert_rows(conn, [record])
+                        result = record['Quote_ID']
+                    elif operation[0] == 'status':
+                        self._update_status_row(conn, operation[1], operation[2])
+                        result = None
+                    elif operation[0] == 'statuses':
+                        result = self._update_status_rows(conn, operation[1])
+                    else:
+                        raise ValueError(f"Unknown write operation '{operation[0]}'")
+                except Exception as e:
+                    conn.execute('ROLLBACK TO operation')
+                    result = e
+                conn.execute('RELEASE operation')
+                results.append(result)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        if self._archived_before != _current_month():
+            self.archive_closed()
+        return results
+
+    @_timed_operation('archive_closed')
+    def archive_closed(self):
+        """
+        Flags closed quotes created before the current month as archived.
+        Only rows not yet flagged are touched, so running it again is cheap.
+        """
+        month = _current_month()
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE quotes SET archived = 1 WHERE archived = 0 AND created_at < ? "
+                f"AND status IN ({', '.join('?' for _ in ARCHIVE_STATUSES)})",
+                (f'{month}-01', *ARCHIVE_STATUSES),
+            )
+        self._archived_before = month
+        return cursor.rowcount
+
+    def _select(self, where='', params=(), order_by='id', limit=None, offset=0):
+        """
+        Runs a SELECT over the quotes table and returns it in the app's column layout.
+        """
+        import pandas as pd
+
+        select_list = ', '.join(f'{sql} AS {col}' for col, sql in SQLITE_COLUMNS.items())
+        query = f'SELECT id, {select_list} FROM quotes {where} ORDER BY {order_by}'
+        if limit is not None:
+            query += ' LIMIT ? OFFSET ?'
+            params = tuple(params) + (int(limit), int(offset))
+        df = pd.read_sql_query(query, self._connect(), params=params, index_col='id')
+        df.index.name = None
+        return df
+
+    @_timed_operation('load_quotes')
+    def load_quotes(self, include_archived=True):
+        return self.load_versioned(include_archived)[1]
+
+    def load_versioned(self, include_archived=True):
+        """
+        Every session shares one published frame per include_archived
+        setting, read again only after a commit to the database.
+        """
+        where = '' if include_archived else 'WHERE archived = 0'
+        return self._published.get(include_archived, self._data_version(), lambda: self._select(where))
+
+    def _data_version(self):
+        """
+        Returns PRAGMA data_version from a connection kept just for asking: it
+        changes whenever any other connection, in this process or another,
+        commits. Read before the quotes, so a commit in between only costs a
+        rebuild on the next read.
+        """
+        import sqlite3
+
+        with self._version_lock:
+            if self._version_conn is None:
+                self._version_conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            return self._version_conn.execute('PRAGMA data_version').fetchone()[0]
+
+    @_timed_operation('get_quote')
+    def get_quote(self, quote_id):
+        """
+        Fetches the row through the unique quote_id index (no pandas needed).
+        """
+        select_list = ', '.join(SQLITE_COLUMNS.values())
+        row = self._connect().execute(f'SELECT {select_list} FROM quotes WHERE quote_id = ?', (quote_id,)).fetchone()
+        return _row_to_record(dict(zip(SQLITE_COLUMNS, row))) if row else None
+
+    def _search_clause(self, search_term, start=None, end=None, include_archived=True, statuses=None):
+        """
+        Returns (WHERE clause, params) matching the customer fields against search_term,
+        created_at against the date range and status against statuses (if given),
+        leaving out archived quotes unless include_archived is set.
+        Terms of three or more characters use the trigram index; shorter ones
+        can't, so they fall back to LIKE. Dates use the created_at index.
+        """
+        start, end = _date_range(start, end)
+        conditions, params = [], []
+        term = normalize_search_text(search_term)
+        if len(term) >= 3:
+            conditions.append('id IN (SELECT rowid FROM quotes_search WHERE quotes_search MATCH ?)')
+            params.append('"' + term.replace('"', '""') + '"')
+        elif term:
+            conditions.append("id IN (SELECT rowid FROM quotes_search WHERE doc LIKE ? ESCAPE '\\')")
+            params.append(f'%{_escape_like(term)}%')
+        if start:
+            conditions.append('created_at >= ?')
+            params.append(start)
+        if end:
+            conditions.append('created_at < ?')
+            params.append(next_day(end))
+        if not include_archived:
+            conditions.append('archived = 0')
+        if statuses is not None:
+            statuses = list(statuses)
+            conditions.append(f"status IN ({', '.join('?' * len(statuses))})" if statuses else '0')
+            params.extend(statuses)
+        if not conditions:
+            return '', ()
+        return 'WHERE ' + ' AND '.join(conditions), tuple(params)
+
+    @_timed_operation('query_quotes')
+    def query_quotes(self, search_term=None, start=None, end=None, include_archived=True, statuses=None):
+        where, params = self._search_clause(search_term, start, end, include_archived, statuses)
+        return self._select(where, params)
+
+    @_timed_operation('query_page')
+    def query_page(self, search_term=None, sort_by='created', descending=True, offset=0, limit=25, start=None, end=None,
+                   include_archived=True, statuses=None):
+        if sort_by not in SQLITE_SORT_ORDERS:
+            raise ValueError(f"Can't sort quotes by '{sort_by}' (expected one of: {', '.join(SORT_FIELDS)})")
+
+        where, params = self._search_clause(search_term, start, end, include_archived, statuses)
+        total = self._connect().execute(f'SELECT COUNT(*) FROM quotes {where}', params).fetchone()[0]
+
+        # id breaks ties so pages don't overlap when many rows share a value
+        direction = 'DESC' if descending else 'ASC'
+        order_by = f'{SQLITE_SORT_ORDERS[sort_by]} {direction}, id {direction}'
+        return self._select(where, params, order_by=order_by, limit=limit, offset=offset), total
+
+    def iter_quotes(self, search_term=None, start=None, end=None, include_archived=True, statuses=None,
+                    chunk_rows=ITER_CHUNK_ROWS):
+        """
+        Streams the matching rows off a cursor chunk_rows at a time, so only
+        one chunk is in memory. Uses its own connection: under WAL the long
+        read sees one consistent version and doesn't hold up writers.
+        """
+        import sqlite3
+
+        import pandas as pd
+
+        where, params = self._search_clause(search_term, start, end, include_archived, statuses)
+        select_list = ', '.join(f'{sql} AS {col}' for col, sql in SQLITE_COLUMNS.items())
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield from pd.read_sql_query(f'SELECT {select_list} FROM quotes {where} ORDER BY id', conn,
+                                         params=params, chunksize=chunk_rows)
+        finally:
+            conn.close()
+
+    def _update_status_row(self, conn, quote_id, new_status):
+        # Reopening an archived quote brings it back into the hot view
+        archived = 1 if new_status in ARCHIVE_STATUSES else 0
+        cursor = conn.execute(
+            'UPDATE quotes SET status = ?, archived = MIN(archived, ?) WHERE quote_id = ?',
+            (new_status, archived, quote_id),
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(f"No quote with ID '{quote_id}'")
+
+    def _update_status_rows(self, conn, changes):
+        """
+        Returns how many quotes changed. Unchanged rows aren't touched, so the
+        stats triggers only fire for real changes.
+        """
+        changed, missing = 0, []
+        for quote_id, new_status in changes:
+            archived = 1 if new_status in ARCHIVE_STATUSES else 0
+            cursor = conn.execute(
+                'UPDATE quotes SET status = ?, archived = MIN(archived, ?) WHERE quote_id = ? AND status != ?',
+                (new_status, archived, quote_id, new_status),
+            )
+            if cursor.rowcount == 0 and conn.execute('SELECT 1 FROM quotes WHERE quote_id = ?', (quote_id,)).fetchone() is None:
+                missing.append(quote_id)
+            changed += cursor.rowcount
+        # Raising rolls the operation's savepoint back, undoing the rows already updated
+        _raise_if_missing(missing)
+        return changed
+
+    @_timed_operation('update_status')
+    def update_status(self, quote_id, new_status):
+        conn = self._connect()
+        with conn:
+            self._update_status_row(conn, quote_id, new_status)
+
+    def _day_clause(self, start, end):
+        """
+        Returns (WHERE clause, params) selecting daily_stats rows between start and end.
+        """
+        start, end = _date_range(start, end)
+        conditions, params = [], []
+        if start:
+            conditions.append('day >= ?')
+            params.append(start)
+        if end:
+            conditions.append('day <= ?')
+            params.append(end)
+        return ('WHERE ' + ' AND '.join(conditions) if conditions else ''), tuple(params)
+
+    @_timed_operation('status_summary')
+    def status_summary(self, start=None, end=None):
+        if start or end:
+            where, params = self._day_clause(start, end)
+            rows = self._connect().execute(
+                f'SELECT status, SUM(count), SUM(value) FROM daily_stats {where} GROUP BY status', params
+            ).fetchall()
+        else:
+            rows = self._connect().execute('SELECT status, count, value FROM status_stats').fetchall()
+        return {status: {'count': count, 'value': round(value, 2)} for status, count, value in rows if count > 0}
+
+    @_timed_operation('daily_summary')
+    def daily_summary(self, start=None, end=None):
+        where, params = self._day_clause(start, end)
+        daily = {}
+        for day, status, count, value in self._connect().execute(
+            f'SELECT day, status, count, value FROM daily_stats {where} ORDER BY day', params
+        ):
+            daily.setdefault(day, {})[status] = {'count': count, 'value': round(value, 2)}
+        return daily
+
+    @_timed_operation('compute_daily_summary')
+    def compute_daily_summary(self):
+        daily = {}
+        for day, status, count, value in self._connect().execute(
+            'SELECT substr(created_at, 1, 10), status, COUNT(*), COALESCE(SUM(price), 0) FROM quotes GROUP BY 1, 2'
+        ):
+            daily.setdefault(day, {})[status] = {'count': count, 'value': round(float(value), 2)}
+        return daily
+
+    @_timed_operation('compute_status_summary')
+    def compute_status_summary(self):
+        rows = self._connect().execute(
+            'SELECT status, COUNT(*), COALESCE(SUM(price), 0) FROM quotes GROUP BY status'
+        ).fetchall()
+        return {status: {'count': count, 'value': float(value)} for status, count, value in rows}
+
+    def rebuild_status_summary(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM status_stats')
+            conn.execute(
+                'INSERT INTO status_stats (status, count, value) '
+                'SELECT status, COUNT(*), COALESCE(SUM(price), 0) FROM quotes GROUP BY status'
+            )
+            conn.execute('DELETE FROM daily_stats')
+            conn.execute(
+                'INSERT INTO daily_stats (day, status, count, value) '
+                'SELECT substr(created_at, 1, 10), status, COUNT(*), COALESCE(SUM(price), 0) FROM quotes GROUP BY 1, 2'
+            )
+
+
+# Function to escape LIKE wildcards in user-typed search terms
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+# Available storage backends, selected by name
+STORE_BACKENDS = {
+    'csv': CSVQuoteStore,
+    'sqlite': SQLiteQuoteStore,
+}
+
+# Stores are shared across Streamlit reruns and sessions
+_stores = {}
+
+
+# Function to get the shared store for a backend and path
+def open_store(backend, path):
+    """
+    Returns the process-wide store for the given backend name and file path.
+    Raises ValueError for an unknown backend name.
+    """
+    if backend not in STORE_BACKENDS:
+        raise ValueError(f"Unknown quote store backend '{backend}' (expected one of: {', '.join(STORE_BACKENDS)})")
+    key = (backend, os.path.abspath(path))
+    with _registry_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = STORE_BACKENDS[backend](path)
+            _stores[key] = store
+        return store
+
+
+# Function to copy an existing CSV database into SQLite
+def migrate_csv_to_sqlite(csv_path, db_path):
+    """
+    One-shot import of every quote in csv_path into the SQLite database at db_path.
+    Refuses to run if the database already holds quotes, so it can't import twice.
+    Returns the number of quotes migrated.
+    """
+    import pandas as pd
+
+    store = SQLiteQuoteStore(db_path)
+    store.init()
+    conn = store._connect()
+    existing = conn.execute('SELECT COUNT(*) FROM quotes').fetchone()[0]
+    if existing:
+        raise RuntimeError(f"{db_path} already contains {existing} quotes; refusing to migrate again")
+
+    # Fold any pending status changes in first so the database gets current statuses
+    csv_store = CSVQuoteStore(csv_path)
+    csv_store.init()
+    df = csv_store.load_quotes()
+    optional = ['Customer_Email', 'Items', 'Service_ID', 'Catalog_Version', 'Customer_ID', 'Customer_Version']
+    df[optional] = df[optional].astype(object).fillna('')
+    with conn:
+        store._insert_rows(conn, df.to_dict('records'))
+    return len(df)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Quote store maintenance commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = subparsers.add_parser('migrate', help='Copy quotes from the CSV database into SQLite')
+    migrate_parser.add_argument('--csv', default='quotes_database.csv', help='Source CSV file')
+    migrate_parser.add_argument('--db', default='quotes_database.db', help='Destination SQLite file')
+
+    compact_parser = subparsers.add_parser('compact', help='Fold the CSV status log back into the CSV database')
+    compact_parser.add_argument('--csv', default='quotes_database.csv', help='CSV database file')
+
+    stats_parser = subparsers.add_parser('stats', help='Check or rebuild the stored per-status totals and daily rollups')
+    stats_parser.add_argument('--backend', default='csv', choices=list(STORE_BACKENDS), help='Storage backend')
+    stats_parser.add_argument('--path', default=None, help='Database file (defaults to quotes_database.csv/.db)')
+    stats_parser.add_argument('--rebuild', action='store_true', help='Recompute the totals from the raw quotes')
+
+    archive_parser = subparsers.add_parser('archive', help='Move closed quotes from earlier months to the archive')
+    archive_parser.add_argument('--backend', default='csv', choices=list(STORE_BACKENDS), help='Storage backend')
+    archive_parser.add_argument('--path', default=None, help='Database file (defaults to quotes_database.csv/.db)')
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='Write a columnar snapshot of the CSV database')
+    snapshot_parser.add_argument('--csv', default='quotes_database.csv', help='CSV database file')
+
+    args = parser.parse_args()
+    if args.command == 'migrate':
+        try:
+            count = migrate_csv_to_sqlite(args.csv, args.db)
+        except RuntimeError as e:
+            parser.exit(1, f"{e}\n")
+        print(f"Migrated {count} quotes from {args.csv} to {args.db}")
+    elif args.command == 'compact':
+        from quote_writer import file_lock
+
+        with file_lock(f"{args.csv}.lock"):
+            CSVQuoteStore(args.csv).compact()
+        print(f"Compacted status changes into {args.csv}")
+    elif args.command == 'stats':
+        path = args.path or ('quotes_database.db' if args.backend == 'sqlite' else 'quotes_database.csv')
+        store = STORE_BACKENDS[args.backend](path)
+        store.init()
+        if args.rebuild:
+            from quote_writer import file_lock
+
+            with file_lock(f"{path}.lock"):
+                store.rebuild_status_summary()
+            print(f"Rebuilt per-status totals for {path}")
+        else:
+            ok, stored, actual = store.verify_status_summary()
+            mismatched_days = store.verify_daily_summary()
+            if ok and not mismatched_days:
+                print(f"Per-status totals and daily rollups for {path} match the quotes")
+            elif ok:
+                print(f"Daily rollups for {path} are out of date on {len(mismatched_days)} days "
+                      f"({', '.join(mismatched_days[:5])}{', ...' if len(mismatched_days) > 5 else ''})")
+                print("Run with --rebuild to fix them")
+                parser.exit(1)
+            else:
+                print(f"Per-status totals for {path} are out of date")
+                print(f"  stored: {stored}")
+                print(f"  actual: {actual}")
+                print("Run with --rebuild to fix them")
+                parser.exit(1)
+    elif args.command == 'archive':
+        from quote_writer import file_lock
+
+        path = args.path or ('quotes_database.db' if args.backend == 'sqlite' else 'quotes_database.csv')
+        store = STORE_BACKENDS[args.backend](path)
+        store.init()
+        with file_lock(f"{path}.lock"):
+            moved = store.archive_closed()
+        print(f"Archived {moved} closed quotes from before this month in {path}")
+    elif args.command == 'snapshot':
+        csv_store = CSVQuoteStore(args.csv)
+        if csv_store.write_snapshot():
+            print(f"Wrote {csv_store.snapshot_path}")
+        else:
+            parser.exit(1, "Couldn't write a snapshot (is pyarrow installed and every Date/Time valid?)\n")
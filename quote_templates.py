@@ -0,0 +1,178 @@
+import os
+import string
+import threading
+import urllib.parse
+
+# Folder holding the editable quote texts (quote letter, email body, ...)
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+TEMPLATE_SUFFIX = '.txt'
+
+# Placeholders use str.format syntax: {customer_name}, {price:.2f}.
+# {>name} pulls in another template file (e.g. shared Terms & Conditions).
+# As in Jinja, a single newline at the very end of a file is dropped, so a
+# partial can be included mid-line (e.g. the email subject).
+PARTIAL_PREFIX = '>'
+
+_formatter = string.Formatter()
+
+
+class TemplateError(ValueError):
+    """
+    Raised when a template file is missing, malformed or includes itself.
+    """
+
+
+# Pre-rendered quote text with slots for the per-quote fields
+class QuoteTemplate:
+    """
+    A template parsed once into alternating static text and field slots.
+    Static sections (after partials are inlined) are stored both as plain
+    text and already URL-encoded, so rendering a quote only formats and
+    encodes the handful of fields that actually change.
+    """
+
+    def __init__(self, parts, sources=None):
+        # Static sections are (None, text, encoded_text, None),
+        # fields are (name, None, format_spec, conversion)
+        self._parts = []
+        for part in parts:
+            if not isinstance(part, str):
+                self._parts.append(part)
+                continue
+            if self._parts and self._parts[-1][0] is None:
+                # Merge neighbouring static pieces into one section
+                part = self._parts.pop()[1] + part
+            self._parts.append((None, part, urllib.parse.quote(part), None))
+        self.fields = sorted({part[0] for part in self._parts if part[0] is not None})
+        # File path -> mtime_ns of every file this template was built from
+        self.sources = sources or {}
+
+    def _values(self, fields):
+        for name, text, spec_or_encoded, conversion in self._parts:
+            if name is None:
+                yield text, spec_or_encoded
+            else:
+                value = fields[name]
+                if conversion:
+                    value = _formatter.convert_field(value, conversion)
+                yield format(value, spec_or_encoded), None
+
+    def render(self, **fields):
+        """
+        Returns the template text with the given fields filled in.
+        """
+        return ''.join(text for text, _ in self._values(fields))
+
+    def render_quoted(self, **fields):
+        """
+        Same as urllib.parse.quote(render(**fields)), but only the fields are
+        encoded; static sections use the form encoded at compile time.
+        """
+        return ''.join(
+            encoded if encoded is not None else urllib.parse.quote(text)
+            for text, encoded in self._values(fields)
+        )
+
+
+# Function to split template text into static text and field slots
+def _parse(text, load_partial, including=()):
+    parts = []
+    try:
+        parsed = list(_formatter.parse(text))
+    except ValueError as e:
+        raise TemplateError(f"Malformed template: {e}") from e
+    for literal, field, spec, conversion in parsed:
+        if literal:
+            parts.append(literal)
+        if field is None:
+            continue
+        if field.startswith(PARTIAL_PREFIX):
+            name = field[len(PARTIAL_PREFIX):].strip()
+            if name in including:
+                raise TemplateError(f"Template {name!r} includes itself")
+            parts.extend(_parse(load_partial(name), load_partial, including + (name,)))
+        elif not field.isidentifier():
+            raise TemplateError(f"Unsupported placeholder {{{field}}}")
+        else:
+            parts.append((field, None, spec or '', conversion))
+    return parts
+
+
+# Function to compile template text
+def compile_template(text, partials=None):
+    """
+    Compiles template text. partials maps names used in {>name} to their text.
+    """
+    partials = partials or {}
+
+    def load_partial(name):
+        if name not in partials:
+            raise TemplateError(f"Unknown partial {name!r}")
+        return partials[name]
+
+    return QuoteTemplate(_parse(text, load_partial))
+
+
+# Function to compile a template file along with the partials it includes
+def _compile_file(name, template_dir):
+    sources = {}
+
+    def load(name):
+        path = os.path.join(template_dir, name + TEMPLATE_SUFFIX)
+        try:
+            with open(path, encoding='utf-8', newline='') as f:
+                text = f.read()
+            if text.endswith('\n'):
+                text = text[:-1]
+            sources[path] = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            raise TemplateError(f"No template named {name!r} in {template_dir}") from None
+        return text
+
+    parts = _parse(load(name), load, (name,))
+    return QuoteTemplate(parts, sources)
+
+
+# Compiled templates shared by every session in this process
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+# Function to check whether a compiled template's files were edited
+def _is_stale(template):
+    try:
+        return any(os.stat(path).st_mtime_ns != mtime for path, mtime in template.sources.items())
+    except FileNotFoundError:
+        return True
+
+
+# Function to get a compiled template by name
+def get_template(name, template_dir=TEMPLATE_DIR):
+    """
+    Returns the compiled template templates/<name>.txt, compiling it on first
+    use. It is recompiled only if one of its files has been edited since.
+    """
+    key = (template_dir, name)
+    template = _templates.get(key)
+    if template is None or _is_stale(template):
+        with _templates_lock:
+            template = _templates.get(key)
+            if template is None or _is_stale(template):
+                template = _compile_file(name, template_dir)
+                _templates[key] = template
+    return template
+
+
+# Function to compile every template up front
+def preload_templates(template_dir=TEMPLATE_DIR):
+    """
+    Compiles all templates in template_dir so the first quote doesn't pay for it.
+    Returns the names that were compiled.
+    """
+    names = sorted(
+        entry[:-len(TEMPLATE_SUFFIX)] for entry in os.listdir(template_dir)
+        if entry.endswith(TEMPLATE_SUFFIX)
+    )
+    for name in names:
+        get_template(name, template_dir)
+    return names
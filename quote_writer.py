@@ -0,0 +1,170 @@
+import atexit
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes are still serialized within this process
+    fcntl = None
+
+# Upper bound on how many queued writes are committed together
+MAX_BATCH_SIZE = 500
+
+
+# Function to hold an exclusive lock on a file shared with other processes
+@contextmanager
+def file_lock(path):
+    """
+    Holds an exclusive flock() on path for the duration of the with-block.
+    Every process writing the same quote database takes this lock first,
+    so their read-modify-write steps can't interleave.
+    """
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+# Single background writer that group-commits concurrent writes
+class WriteQueue:
+    """
+    Funnels every save and status change for one store through one thread.
+    Sessions queue their write and wait; the writer takes everything that
+    queued up while the previous commit was running and hands it to the store
+    as one batch, under the cross-process file lock, with a single fsync.
+    Each session's wait ends once its own write is durable on disk.
+    """
+
+    def __init__(self, store, lock_path=None, max_batch_size=MAX_BATCH_SIZE):
+        self.store = store
+        self.lock_path = lock_path or f"{store.path}.lock"
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._closed = False
+
+        # Counters for the stress test and the debug view
+        self.batches = 0
+        self.operations = 0
+        self.largest_batch = 0
+
+        self._thread = threading.Thread(target=self._run, name='quote-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, *operation):
+        """
+        Queues one operation (see QuoteStore.write_batch) and returns a Future
+        that resolves to its result once the batch containing it is on disk.
+        """
+        if self._closed:
+            raise RuntimeError('The quote write queue has been closed')
+        future = Future()
+        self._queue.put((operation, future))
+        return future
+
+    def save_quote(self, record, timeout=None):
+        """
+        Saves a quote and blocks until it is durable. Returns its Quote_ID.
+        """
+        return self.submit('save', record).result(timeout)
+
+    def update_status(self, quote_id, new_status, timeout=None):
+        """
+        Changes a quote's status and blocks until the change is durable.
+        """
+        return self.submit('status', quote_id, new_status).result(timeout)
+
+    def update_statuses(self, changes, timeout=None):
+        """
+        Applies a list of (quote_id, new_status) changes as one all-or-nothing
+        operation and blocks until it is durable. Returns how many quotes changed.
+        """
+        return self.submit('statuses', list(changes)).result(timeout)
+
+    def _take_batch(self):
+        """
+        Waits for one write, then grabs whatever else is already queued.
+        Returns None once the queue is closed and drained.
+        """
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the stop marker back so the loop ends after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            self._commit(batch)
+
+    def _commit(self, batch):
+        operations = [operation for operation, _ in batch]
+        try:
+            with file_lock(self.lock_path):
+                results = self.store.write_batch(operations)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        self.batches += 1
+        self.operations += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def close(self, timeout=10):
+        """
+        Stops accepting writes and waits for the queued ones to be committed.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+# One queue per store, shared by every session in this process
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+# Function to get the shared write queue for a store
+def get_write_queue(store):
+    """
+    Returns the process-wide write queue for store, starting it on first use.
+    """
+    key = os.path.abspath(store.path)
+    with _queues_lock:
+        write_queue = _queues.get(key)
+        if write_queue is None or write_queue._closed:
+            write_queue = WriteQueue(store)
+            _queues[key] = write_queue
+        return write_queue
+
+
+# Commit anything still queued when the server shuts down
+@atexit.register
+def _close_queues():
+    for write_queue in list(_queues.values()):
+        write_queue.close()
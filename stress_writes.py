@@ -0,0 +1,143 @@
+"""
+Stress test for concurrent quote writes.
+
+Simulates many Streamlit sessions (threads, optionally spread over several
+processes) saving quotes and changing statuses against one quote database
+at the same time, then checks that no write was lost or misapplied.
+
+    python stress_writes.py --backend csv --sessions 50 --writes 40 --processes 2
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+from quote_store import STORE_BACKENDS
+from quote_writer import WriteQueue
+
+STATUSES = ['Sent', 'Approved', 'Won', 'Lost']
+
+
+# Function to run one simulated session
+def run_session(write_queue, session_number, writes, expected, expected_lock):
+    """
+    Saves `writes` quotes and gives some of them one or more status changes.
+    Records the status each quote should end up with in `expected`.
+    """
+    rng = random.Random(session_number)
+    for i in range(writes):
+        record = {
+            'Date': time.strftime('%d/%m/%Y'),
+            'Time': time.strftime('%H:%M:%S'),
+            'Customer_Name': f"Session {session_number} Customer {i}",
+            'Customer_Email': f"s{session_number}.c{i}@example.com",
+            'Customer_Address': f"{i} Test Street, Gold Coast QLD 4217",
+            'Service': 'Power Point Install',
+            'Price': 165.0,
+            'Status': 'Sent',
+        }
+        quote_id = write_queue.save_quote(record)
+        status = 'Sent'
+        for _ in range(rng.randint(0, 2)):
+            status = rng.choice(STATUSES)
+            write_queue.update_status(quote_id, status)
+        with expected_lock:
+            expected[quote_id] = status
+
+
+# Function to run a group of sessions in one process
+def run_process(backend, path, sessions, writes, first_session):
+    """
+    Starts `sessions` threads sharing one WriteQueue, like one Streamlit server.
+    Returns (expected statuses, batches committed, largest batch).
+    """
+    store = STORE_BACKENDS[backend](path)
+    store.init()
+    write_queue = WriteQueue(store)
+    expected = {}
+    expected_lock = threading.Lock()
+
+    threads = [
+        threading.Thread(target=run_session, args=(write_queue, first_session + n, writes, expected, expected_lock))
+        for n in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    write_queue.close()
+    return expected, write_queue.batches, write_queue.largest_batch
+
+
+# Function to check the database against what the sessions wrote
+def verify(backend, path, expected):
+    """
+    Returns a list of problems found (empty if every write landed correctly).
+    """
+    store = STORE_BACKENDS[backend](path)
+    store.init()
+    df = store.load_quotes()
+    problems = []
+
+    if len(df) != len(expected):
+        problems.append(f"expected {len(expected)} quotes, found {len(df)}")
+    if df['Quote_ID'].duplicated().any():
+        problems.append(f"{int(df['Quote_ID'].duplicated().sum())} duplicate Quote_IDs")
+
+    actual = dict(zip(df['Quote_ID'], df['Status'].astype(str)))
+    wrong = [quote_id for quote_id, status in expected.items() if actual.get(quote_id) != status]
+    if wrong:
+        problems.append(f"{len(wrong)} quotes missing or with the wrong status (e.g. {wrong[0]})")
+
+    ok, stored, recount = store.verify_status_summary()
+    if not ok:
+        problems.append(f"per-status totals drifted: stored {stored}, actual {recount}")
+    mismatched_days = store.verify_daily_summary()
+    if mismatched_days:
+        problems.append(f"daily rollups drifted on {len(mismatched_days)} days (e.g. {mismatched_days[0]})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress-test concurrent quote writes')
+    parser.add_argument('--backend', default='csv', choices=list(STORE_BACKENDS))
+    parser.add_argument('--sessions', type=int, default=50, help='Simulated sessions per process')
+    parser.add_argument('--writes', type=int, default=40, help='Quotes saved per session')
+    parser.add_argument('--processes', type=int, default=1, help='Server processes sharing the database')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'quotes_database.db' if args.backend == 'sqlite' else 'quotes_database.csv')
+        STORE_BACKENDS[args.backend](path).init()
+
+        jobs = [(args.backend, path, args.sessions, args.writes, p * args.sessions) for p in range(args.processes)]
+        started = time.perf_counter()
+        if args.processes == 1:
+            outcomes = [run_process(*jobs[0])]
+        else:
+            with multiprocessing.Pool(args.processes) as pool:
+                outcomes = pool.starmap(run_process, jobs)
+        elapsed = time.perf_counter() - started
+
+        expected = {}
+        for process_expected, _, _ in outcomes:
+            expected.update(process_expected)
+        batches = sum(outcome[1] for outcome in outcomes)
+        largest = max(outcome[2] for outcome in outcomes)
+        problems = verify(args.backend, path, expected)
+
+    sessions = args.sessions * args.processes
+    print(f"{args.backend}: {sessions} sessions in {args.processes} process(es), {len(expected)} quotes")
+    print(f"  {elapsed:.2f}s, {len(expected) / elapsed:.0f} quotes/s, {batches} group commits (largest {largest} writes)")
+    if problems:
+        for problem in problems:
+            print(f"  FAIL: {problem}")
+        raise SystemExit(1)
+    print("  OK: no lost or misapplied writes")
+
+
+if __name__ == '__main__':
+    main()